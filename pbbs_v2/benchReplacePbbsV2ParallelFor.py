@@ -0,0 +1,360 @@
+##########################################
+# synthetic inputs and scaling benchmark of replacePbbsV2ParallelFor.py
+# example run:
+# python benchReplacePbbsV2ParallelFor.py --callsites 1e4,1e5,1e6 --records 1e6,1e7 --rounds 10,100
+# python benchReplacePbbsV2ParallelFor.py -GEN -o /tmp/synth --callsites 1e6 --records 1e9   (inputs only)
+##########################################
+from __future__ import print_function
+
+import os
+import sys
+import json
+import gzip
+import time
+import random
+import shutil
+import argparse
+import tempfile
+import contextlib
+import multiprocessing
+import multiprocessing.forkserver
+from concurrent.futures import ProcessPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import replacePbbsV2ParallelFor as pv
+
+###############################################################################
+# synthetic inputs: a basedir laid out like the real one for test 'synth'
+###############################################################################
+#   synth-cp/bench/synth.{cg,scc,cilkfor,instr}.json       (-A)
+#   synth-test/bench/synth-perf.{cg,scc}.json, synth.perf.log.gz  (-PROFILE, -A ranking)
+#   data/synth/<id>.{parlaytime,icache}.{orig,test}.*      (-PARLAY)
+# Functions f<i> are spread over depth+1 levels; every function below level 0 is
+# called from ~fanin functions of shallower levels (mostly the one right above),
+# so the number of call paths grows like fanin^depth. A `cycles` share of each
+# level is chained into rings of scc_size functions, which become recursive
+# SCCs. pfor<p> cilkfors are called from the deepest level; in the -test tree's
+# synth-perf.cg.json they are functions too, called from their instrumented
+# callsites, and the perf log's src_callers are taken from those nodes. Names are
+# mangled like plain functions (_Z2f7v), so demangling and matching work as usual.
+SYNTH_TEST = 'synth'
+SYNTH_DIR = 'bench'
+SYNTH_ID = '2024-01-01.00:00:00'
+PRR_WEIGHTS = {'defef': 5, 'defdac': 2, 'both': 2, 'untouched': 1}
+# perf log lines are drawn from this many distinct blocks of PERF_LOG_BLOCK lines,
+# which keeps generating billions of records bound by gzip, not by python
+PERF_LOG_BLOCKS = 16
+PERF_LOG_BLOCK = 1 << 15
+
+def mangled(name):
+    return '_Z{}{}v'.format(len(name), name)
+
+def func_name(f):
+    return 'f{}'.format(f)
+
+def pfor_name(p):
+    return 'pfor{}'.format(p)
+
+# 64 functions per source file, 10 lines apart
+def func_file(f, tree='cp'):
+    return '{}-{}/{}/src/f{}.h'.format(SYNTH_TEST, tree, SYNTH_DIR, f // 64)
+
+def func_line(f):
+    return 10 + (f % 64) * 10
+
+def weighted_choice(rng, weights):
+    return rng.choices(list(weights), weights=list(weights.values()))[0]
+
+# <test>.cg.json and <test>.scc.json with about ncallsites callsites; returns the levels
+def write_call_graph(cg_path, scc_path, ncallsites, fanin=4, depth=8, cycles=0.01, scc_size=3, rng=None):
+    nfuncs = max(depth + 1, -(-ncallsites * (depth + 1) // (depth * fanin)))
+    levels = [ list(range(nfuncs * l // (depth + 1), nfuncs * (l + 1) // (depth + 1))) for l in range(depth + 1) ]
+    # rings within a level: ring[i] calls ring[i+1]
+    ring_callers = {}
+    scc_groups = []
+    for level in levels:
+        members = rng.sample(level, int(len(level) * cycles) // scc_size * scc_size)
+        for i in range(0, len(members), scc_size):
+            ring = members[i:i + scc_size]
+            for a, b in zip(ring, ring[1:] + ring[:1]):
+                ring_callers[b] = a
+            scc_groups.append({'scc': [ {'id': mangled(func_name(f))} for f in ring ]})
+
+    def callsite(caller, prr):
+        return {'caller_mangled_name': mangled(func_name(caller)), 'caller_name': func_name(caller), 'col': 5 + rng.randrange(20),
+                'file': func_file(caller), 'inlineHistory': [], 'ln': func_line(caller) + rng.randrange(10), 'prr': prr}
+
+    with open(cg_path, 'w') as f:
+        writer = pv.JsonListWriter(f)
+        for l, level in enumerate(levels):
+            for callee in level:
+                callsites = []
+                if l > 0:
+                    for _ in range(rng.randint(1, 2 * fanin - 1)):
+                        upper = levels[l - 1] if rng.random() < 0.75 else levels[rng.randrange(l)]
+                        callsites.append(callsite(upper[rng.randrange(len(upper))], weighted_choice(rng, PRR_WEIGHTS)))
+                if callee in ring_callers:
+                    callsites.append(callsite(ring_callers[callee], 'both'))
+                writer.append({'callsites': callsites, 'func': mangled(func_name(callee)), 'name': func_name(callee), 'prr': 'untouched'})
+        writer.close()
+    with open(scc_path, 'w') as f:
+        json.dump(scc_groups, f)
+    return levels
+
+# <test>.cilkfor.json and its <test>.instr.json: every instrumented cilkfor has 1-3
+# callsites in deepest-level functions, on the ef/dac side its static prr allows.
+# Returns the instrumented callsites as (pfor, file, ln, col, caller mangled name).
+def write_cilkfors(static_path, instr_path, levels, npfors, coverage=0.6, rng=None):
+    deepest = levels[-1]
+    callsites = []
+    with open(static_path, 'w') as fs, open(instr_path, 'w') as fi:
+        static, instr = pv.JsonListWriter(fs), pv.JsonListWriter(fi)
+        for p in range(npfors):
+            ID = mangled(pfor_name(p))
+            prr = weighted_choice(rng, PRR_WEIGHTS)
+            static.append({'ID': ID, 'col': 5, 'file': '{}-cp/{}/parlay/parallel.h'.format(SYNTH_TEST, SYNTH_DIR), 'inlineHistories': [],
+                           'line': 100 + p, 'prr': prr})
+            if prr == 'untouched' or rng.random() >= coverage:
+                continue
+            ef, dac = [], []
+            for _ in range(rng.randint(1, 3)):
+                caller = deepest[rng.randrange(len(deepest))]
+                js_callsite = {'caller': func_name(caller), 'col': 9, 'file': func_file(caller), 'inlineHistory': '',
+                               'ln': func_line(caller) + 5, 'mangled_name': mangled(func_name(caller))}
+                side = 'ef' if prr == 'defef' else 'dac' if prr == 'defdac' else rng.choice(['ef', 'dac'])
+                (ef if side == 'ef' else dac).append(js_callsite)
+                callsites.append((p, js_callsite['file'], js_callsite['ln'], js_callsite['col'], js_callsite['mangled_name']))
+            instr.append({'ID': ID, 'caller_DAC': dac or None, 'caller_EF': ef or None, 'col': 5,
+                          'dac': len(dac), 'ef': len(ef), 'file': '{}-cp/{}/parlay/parallel.h'.format(SYNTH_TEST, SYNTH_DIR), 'ln': 100 + p})
+        static.close()
+        instr.close()
+    return callsites
+
+# <test>-perf.cg.json of the -test tree: the -cp call graph plus a function per
+# instrumented cilkfor, called from its instrumented callsites. Returns the
+# cilkfor nodes as (mangled name, [(file, ln, col, caller mangled name)])
+def write_perf_call_graph(cg_path, perf_cg_path, callsites):
+    pfors = {}
+    for p, file, ln, col, caller in callsites:
+        pfors.setdefault(p, []).append((file.replace('-cp/', '-test/', 1), ln, col, caller))
+    with open(cg_path, 'r') as f:
+        cg = json.load(f)
+    callers = dict( (js['func'], js['name']) for js in cg )
+    nodes = []
+    with open(perf_cg_path, 'w') as f:
+        writer = pv.JsonListWriter(f)
+        for js in cg:
+            for js_callsite in js['callsites']:
+                js_callsite['file'] = js_callsite['file'].replace('-cp/', '-test/', 1)
+            writer.append(js)
+        for p, sites in sorted(pfors.items()):
+            name = mangled(pfor_name(p))
+            writer.append({'callsites': [ {'caller_mangled_name': caller, 'caller_name': callers[caller], 'col': col, 'file': file,
+                                           'inlineHistory': [], 'ln': ln, 'prr': 'untouched'} for file, ln, col, caller in sites ],
+                           'func': name, 'name': pfor_name(p), 'prr': 'untouched'})
+            nodes.append((name, sites))
+        writer.close()
+    return nodes
+
+# <test>.perf.log.gz of nrecords lines over ncallers distinct (version, src_loc,
+# src_caller, inline_loc, inline_caller) tails: src_caller is a cilkfor node of
+# the -test call graph, inlined at one of its callsites
+def write_perf_log(path, nrecords, pfor_nodes, ncallers=1000, level=1, rng=None):
+    tails = []
+    for t in range(ncallers):
+        name, sites = pfor_nodes[rng.randrange(len(pfor_nodes))]
+        file, ln, col, caller = sites[rng.randrange(len(sites))]
+        version = rng.choice([0, 0, 1, 2])
+        tails.append((version, '{}-test/{}/parlay/primitives.h:{}:{},{},{}:{}:{},{}'.format(
+            SYNTH_TEST, SYNTH_DIR, 50 + t % 900, 5, name, file, ln, col, caller)))
+
+    def record():
+        version, tail = tails[int(rng.paretovariate(1.2)) % len(tails)]
+        tripcount = int(2 ** (rng.random() * 16))
+        depth = int(rng.expovariate(0.7)) if version == 2 else (1 if rng.random() < 0.1 else 0)
+        return '{},{},{},{},{}\n'.format(version, tripcount, 1 + int(rng.random() * 64), depth, tail)
+    blocks = [ [ record() for _ in range(PERF_LOG_BLOCK) ] for _ in range(min(PERF_LOG_BLOCKS, -(-nrecords // PERF_LOG_BLOCK))) ]
+    encoded = [ ''.join(block).encode() for block in blocks ]
+    with gzip.open(path, 'wb', compresslevel=level) as f:
+        left = nrecords
+        while left >= PERF_LOG_BLOCK:
+            f.write(encoded[rng.randrange(len(encoded))])
+            left -= PERF_LOG_BLOCK
+        if left:
+            f.write(''.join(blocks[0][:left]).encode())
+
+# prr.sh style parlaytime log: rounds 'Parlay time:' samples per CILK_WORKERS section
+def write_parlaytime_log(path, workers, rounds, seconds=10.0, speedup=1.0, rng=None):
+    with open(path, 'w') as f:
+        for w in workers:
+            print('== CILK_WORKERS = {} ==================================='.format(w), file=f)
+            mean = seconds / speedup / w ** 0.8
+            for _ in range(rounds):
+                print('Parlay time: {:.4f}'.format(mean * rng.gauss(1.0, 0.02)), file=f)
+            print('', file=f)
+
+# perf stat icache counters per CILK_WORKERS section
+def write_icache_log(path, workers, seconds=10.0, rng=None):
+    with open(path, 'w') as f:
+        for w in workers:
+            print('== CILK_WORKERS = {} ==================================='.format(w), file=f)
+            print('\n Performance counter stats for \'./{}\':\n'.format(SYNTH_TEST), file=f)
+            misses = int(4e6 * (1 + 0.1 * w.bit_length()) * rng.gauss(1.0, 0.02))
+            print('{:>18,}      icache.misses:u'.format(misses), file=f)
+            print('{:>18,}      icache.hit:u'.format(int(9e8 * rng.gauss(1.0, 0.02))), file=f)
+            print('\n{:>18.9f} seconds time elapsed\n\n'.format(seconds / w ** 0.8), file=f)
+
+# every input of test 'synth' under base; returns {input: records}
+def generate(base, callsites=10000, records=100000, rounds=10, fanin=4, depth=8, cycles=0.01, scc_size=3,
+             pfors=None, ncallers=1000, workers=(1, 2, 4, 8, 14, 28), level=1, seed=0):
+    rng = random.Random(seed)
+    cp = os.path.join(base, '{}-cp'.format(SYNTH_TEST), SYNTH_DIR)
+    test_dir = os.path.join(base, '{}-test'.format(SYNTH_TEST), SYNTH_DIR)
+    data = os.path.join(base, 'data', SYNTH_TEST)
+    for d in [cp, test_dir, data, os.path.join(base, 'perf', SYNTH_TEST)]:
+        if not os.path.exists(d):
+            os.makedirs(d)
+    start = time.time()
+    levels = write_call_graph(os.path.join(cp, '{}.cg.json'.format(SYNTH_TEST)), os.path.join(cp, '{}.scc.json'.format(SYNTH_TEST)),
+                              callsites, fanin=fanin, depth=depth, cycles=cycles, scc_size=scc_size, rng=rng)
+    instrumented = write_cilkfors(os.path.join(cp, '{}.cilkfor.json'.format(SYNTH_TEST)), os.path.join(cp, '{}.instr.json'.format(SYNTH_TEST)),
+                                  levels, pfors or max(1, callsites // 100), rng=rng)
+    # -PROFILE's call graph of the -test tree: the same one, plus the cilkfors
+    pfor_nodes = write_perf_call_graph(os.path.join(cp, '{}.cg.json'.format(SYNTH_TEST)), os.path.join(test_dir, '{}-perf.cg.json'.format(SYNTH_TEST)),
+                                       instrumented)
+    shutil.copyfile(os.path.join(cp, '{}.scc.json'.format(SYNTH_TEST)), os.path.join(test_dir, '{}-perf.scc.json'.format(SYNTH_TEST)))
+    print('>> write to {} ({} functions, {:.1f}s)'.format(cp, sum( len(level) for level in levels ), time.time() - start))
+    start = time.time()
+    write_perf_log(os.path.join(test_dir, '{}.perf.log.gz'.format(SYNTH_TEST)), records, pfor_nodes, ncallers=ncallers, level=level, rng=rng)
+    print('>> write to {} ({} records, {:.1f}s)'.format(os.path.join(test_dir, '{}.perf.log.gz'.format(SYNTH_TEST)), records, time.time() - start))
+    for build, speedup in [('orig', 1.0), ('test', 1.05)]:
+        write_parlaytime_log(os.path.join(data, '{}.parlaytime.{}.log'.format(SYNTH_ID, build)), workers, rounds, speedup=speedup, rng=rng)
+        write_icache_log(os.path.join(data, '{}.icache.{}.txt'.format(SYNTH_ID, build)), workers, rng=rng)
+    print('>> write to {}'.format(data))
+    return {'callsites': callsites, 'records': records, 'samples': 2 * rounds * len(workers)}
+
+###############################################################################
+# benchmark harness
+###############################################################################
+# Every (mode, size) runs in a fresh process forked from a forkserver started
+# before any input is generated (rss high-water marks survive fork and exec), so
+# its peak rss is its own and nothing is warm from an earlier run:
+#   A        over --callsites, its profile summary already up to date
+#   PROFILE  over --records, from scratch (no .perf.short.json, no caches)
+#   PARLAY   over --rounds
+# Throughput is records (callsites, perf log lines, parlaytime samples) per wall second.
+MODES = ['A', 'PROFILE', 'PARLAY']
+
+# the replacePbbsV2ParallelFor.py options the modes read, at their defaults
+def mode_options(**overrides):
+    options = dict(v=False, test=SYNTH_TEST, k=10, cache=False, heaviest=False, jobs=1, line_parser=False, sample=None, sample_mode='stride',
+                   seed=0, recommend=False, workers='1,2,4,8,14,28', spawn_cost=50.0, gzip=False, experiment_id=SYNTH_ID, ece='1',
+                   alpha=0.05, store=None)
+    options.update(overrides)
+    return options
+
+# one run of mode over the inputs in base (in the forked process)
+def run_mode(mode, base, options, phases=False):
+    pv.basedir = base
+    args = argparse.Namespace(**options)
+    cp = os.path.join(base, '{}-cp'.format(SYNTH_TEST), SYNTH_DIR)
+    test_dir = os.path.join(base, '{}-test'.format(SYNTH_TEST), SYNTH_DIR)
+    if phases:
+        pv.self_profile.start()
+    status = 'ok'
+    wall, cpu = time.perf_counter(), time.process_time()
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull), contextlib.redirect_stderr(devnull):
+        try:
+            if mode == 'A':
+                pv.compileAnalysisAndInstrumentResults(args, workdir=cp, test=SYNTH_TEST, profile_workdir=test_dir)
+            elif mode == 'PROFILE':
+                pv.interpretProfilingResults(args, workdir=test_dir, test=SYNTH_TEST, major_files=[], major_funcs=[])
+            elif mode == 'PARLAY':
+                pv.interpretPerfTestResults(args, test=SYNTH_TEST, res_dir=os.path.join(base, 'data', SYNTH_TEST), id=SYNTH_ID)
+        except SystemExit as e:
+            if e.code:
+                status = 'exit({})'.format(e.code)
+    return {'status': status, 'wall': time.perf_counter() - wall, 'cpu': time.process_time() - cpu, 'max_rss': pv.max_rss(),
+            'phases': pv.self_profile.take()}
+
+def bench(mode, base, records, options, phases=False):
+    summary = os.path.join(base, '{}-test'.format(SYNTH_TEST), SYNTH_DIR, '{}.perf.short.json'.format(SYNTH_TEST))
+    log = os.path.join(base, '{}-test'.format(SYNTH_TEST), SYNTH_DIR, '{}.perf.log.gz'.format(SYNTH_TEST))
+    if mode == 'PROFILE' and os.path.exists(summary):
+        os.remove(summary)
+    if mode == 'A':
+        with open(os.devnull, 'w') as devnull, contextlib.redirect_stderr(devnull):
+            pv.update_perf_summary(summary, log)
+    with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context('forkserver')) as pool:
+        res = pool.submit(run_mode, mode, base, options, phases).result()
+    res.update(mode=mode, records=records, throughput=records / res['wall'] if res['wall'] else None)
+    return res
+
+def parse_sizes(text):
+    return [ int(float(size)) for size in text.split(',') if size ]
+
+if __name__ == "__main__":
+    dt = pv.datetime_utcnow_strftime()
+    argParser = argparse.ArgumentParser()
+    argParser.add_argument('-o', '--out', dest='out', default=None, help='directory of the generated inputs and the report (default: a temporary one, removed afterwards, and the report in .)')
+    argParser.add_argument('-GEN', '--generate-only', dest='generate_only', action='store_true', help='only write the inputs of the first size of each list to -o')
+    argParser.add_argument('--modes', dest='modes', default=','.join(MODES), help='modes to time ({})'.format(', '.join(MODES)))
+    argParser.add_argument('--callsites', dest='callsites', default='1e3,1e4,1e5', help='call graph sizes in callsites (-A)')
+    argParser.add_argument('--records', dest='records', default='1e5,1e6', help='perf log sizes in records (-PROFILE)')
+    argParser.add_argument('--rounds', dest='rounds', default='10,100', help='parlaytime rounds per worker count (-PARLAY)')
+    argParser.add_argument('--base-callsites', dest='base_callsites', type=float, default=1e4, help='call graph size while the other sizes vary')
+    argParser.add_argument('--base-records', dest='base_records', type=float, default=1e5, help='perf log size while the other sizes vary')
+    argParser.add_argument('--fanin', dest='fanin', type=int, default=4, help='mean callers per function')
+    argParser.add_argument('--depth', dest='depth', type=int, default=8, help='levels of callers above the leaf functions')
+    argParser.add_argument('--cycles', dest='cycles', type=float, default=0.01, help='share of the functions of a level in recursive rings')
+    argParser.add_argument('--scc-size', dest='scc_size', type=int, default=3, help='functions per recursive ring')
+    argParser.add_argument('--callers', dest='ncallers', type=int, default=1000, help='distinct (src_caller, inline location) tails of the perf log')
+    argParser.add_argument('--gzip-level', dest='level', type=int, default=1, help='compression level of the generated perf log')
+    argParser.add_argument('-j', '--jobs', dest='jobs', type=int, default=1, help='worker processes parsing the perf log (-PROFILE)')
+    argParser.add_argument('-k', dest='k', type=int, default=10, help='number of call paths shown per callsite (-A)')
+    argParser.add_argument('--phases', dest='phases', action='store_true', help='also record --self-profile phases (tracemalloc slows the runs down)')
+    argParser.add_argument('--seed', dest='seed', type=int, default=0, help='random seed of the generators')
+    args = argParser.parse_args()
+
+    out = args.out or tempfile.mkdtemp(prefix='pbbs_v2.bench.')
+    gen_options = dict(fanin=args.fanin, depth=args.depth, cycles=args.cycles, scc_size=args.scc_size, ncallers=args.ncallers, level=args.level, seed=args.seed)
+    callsites, records, rounds = parse_sizes(args.callsites), parse_sizes(args.records), parse_sizes(args.rounds)
+    if args.generate_only:
+        generate(out, callsites=callsites[0], records=records[0], rounds=rounds[0], **gen_options)
+        exit(0)
+
+    # (mode, inputs directory, generate() sizes, which of its counts is the mode's records)
+    points = []
+    for mode in args.modes.split(','):
+        if mode == 'A':
+            points += [ (mode, 'callsites{}'.format(n), dict(callsites=n, records=int(args.base_records), rounds=rounds[0]), 'callsites') for n in callsites ]
+        elif mode == 'PROFILE':
+            points += [ (mode, 'records{}'.format(n), dict(callsites=int(args.base_callsites), records=n, rounds=rounds[0]), 'records') for n in records ]
+        elif mode == 'PARLAY':
+            points += [ (mode, 'rounds{}'.format(n), dict(callsites=int(args.base_callsites), records=int(args.base_records), rounds=n), 'samples') for n in rounds ]
+        else:
+            print('Error: unknown mode {}!'.format(mode))
+            exit(1)
+
+    multiprocessing.forkserver.ensure_running()
+    results = []
+    try:
+        generated = {}
+        for mode, name, sizes, kind in points:
+            base = os.path.join(out, name)
+            if name not in generated:
+                generated[name] = generate(base, **dict(gen_options, **sizes))
+            # -v: -PROFILE unfolds the call history of every src_caller
+            res = bench(mode, base, generated[name][kind], mode_options(k=args.k, jobs=args.jobs, v=(mode == 'PROFILE')), phases=args.phases)
+            res.update(inputs=name, sizes=generated[name])
+            print('-- {:<8}{:<20}{:<8}{:>10.2f}s wall{:>10.2f}s cpu{:>10.1f} MiB max rss{:>14.0f} {}/s'.format(
+                  mode, name, res['status'], res['wall'], res['cpu'], res['max_rss'] / 2**20, res['throughput'] or 0, kind))
+            results.append(res)
+    finally:
+        # the report stays next to the inputs, or in the current directory when they are removed
+        report_path = os.path.join(args.out or '.', 'bench.{}.json'.format(dt))
+        with open(report_path, 'w') as f:
+            json.dump({'datetime': dt, 'argv': sys.argv[1:], 'results': results}, f, indent=2)
+        print("write benchmark report to --> {}".format(report_path))
+        if not args.out:
+            shutil.rmtree(out)
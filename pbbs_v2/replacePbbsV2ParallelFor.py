@@ -3,21 +3,93 @@
 # source /afs/ece/project/seth_group/ziqiliu/test-cp/venv/bin/activate
 # python replacePbbsV2ParallelFor.py -T=delaunayTriangulation -A (-D)
 # python replacePbbsV2ParallelFor.py -T=delaunayTriangulation -P -id=<id like: 2024-05-15.20:04:10> -ece=014
+# python replacePbbsV2ParallelFor.py -T=all -A -PROFILE   (every registered test, concurrently)
 ##########################################
 from __future__ import print_function
 
 import os 
+import sys
 import re
 import json
+import csv
 import argparse
 import gzip
 import datetime
-import pandas as pd
-from tqdm import tqdm
-from collections import defaultdict, Counter
+import time
+import contextlib
+import atexit
+import heapq
+import math
+import hashlib
+import mmap
+import pickle
+import struct
+import multiprocessing
+from array import array
+from bisect import bisect_left
+from itertools import islice
+import importlib
+from collections import defaultdict, Counter, deque
+# modules of a single mode (sqlite3, socketserver, subprocess, tracemalloc, ...)
+# are imported in the functions that use them
+
+# numpy/pandas/tqdm are imported on first use: together they take most of the
+# start-up time, which the one-shot -A path and the -Q client don't need
+class LazyModule(object):
+    def __init__(self, name):
+        self._name = name
+        self._module = None
+
+    def __getattr__(self, attr):
+        if self._module is None:
+            self._module = importlib.import_module(self._name)
+        return getattr(self._module, attr)
+
+np = LazyModule('numpy')
+pd = LazyModule('pandas')
+
+def tqdm(*args, **kwargs):
+    from tqdm import tqdm
+    return tqdm(*args, **kwargs)
 
 # base directory for handy path specification
 basedir = r'/afs/ece/project/seth_group/ziqiliu/test-cp/pbbs_v2'
+gcc_libdir = r'/afs/ece/project/seth_group/ziqiliu/GCC-12.2.0/lib64'
+
+# registered benchmarks: sources in <test>-cp/<dir> (orig) and <test>-test/<dir>
+# (substituted), both building <exe> run on test_data; call histories stop at
+# callsites in major_files/major_funcs
+BENCHMARKS = {
+    'delaunayTriangulation': {
+        'dir': 'incrementalDelaunay',
+        'exe': 'delaunay',
+        'test_data': r'/afs/ece/project/seth_group/pakha/pbbsbench/testData/geometryData/data/2DinCube_100000',
+        'major_files': ['delaunay.C', 'delaunayTime.C'],
+        'major_funcs': ['delaunay']
+    },
+    'wordCounts': {
+        'dir': 'histogram',
+        'exe': 'wc',
+        'test_data': r'/afs/ece/project/seth_group/pakha/pbbsbench/testData/sequenceData/data/wikipedia250M.txt',
+        'major_files': ['wc.C', 'wcTime.C'],
+        'major_funcs': ['wordCounts', 'timeWordCounts']
+    },
+    'classify': {
+        'dir': 'decisionTree',
+        'exe': 'classify',
+        'test_data': r'/afs/ece/project/seth_group/pakha/pbbsbench/testData/sequenceData/data/covtype.data',
+        'major_files': ['classify.C', 'classifyTime.C'],
+        'major_funcs': ['classify']
+    }
+}
+
+# <test>-cp/<dir> for tree 'cp', <test>-test/<dir> for tree 'test'
+def benchmark_dir(test, tree):
+    return os.path.join(basedir, '{}-{}'.format(test, tree), BENCHMARKS[test]['dir'])
+
+# parlaytime/icache logs of prr.sh performance experiments
+def parlaytime_result_dir(test):
+    return os.path.join(basedir, 'data/{}'.format(test))
 
 ###############################################################################
 # helper function shared by all 
@@ -41,359 +113,2744 @@ def jsonstr(json):
     return json.dumps(json, sort_keys=True)
 
 ###############################################################################
-# main functionality 
+# binary cache written next to parsed inputs as <input>.cache
+###############################################################################
+# layout: magic | u64 header length | json header | sections, each 8-byte aligned.
+# The header records the fingerprint (size, mtime, sha1) of every source file the
+# cache was derived from and, per section, its array typecode/offset/size. Sections
+# are handed out as memoryviews over a read-only mmap, so loading copies nothing.
+CACHE_MAGIC = b'PBBSV2C\x00'
+CACHE_VERSION = 1
+
+def cache_path(path):
+    return path + '.cache'
+
+def file_sha1(path):
+    h = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            h.update(block)
+    return h.hexdigest()
+
+def file_fingerprint(path, sha1=True):
+    st = os.stat(path)
+    fingerprint = { 'path': os.path.abspath(path), 'size': st.st_size, 'mtime_ns': st.st_mtime_ns }
+    if sha1:
+        fingerprint['sha1'] = file_sha1(path)
+    return fingerprint
+
+# same size and mtime is trusted, otherwise fall back to the content hash
+def fingerprint_matches(fingerprint, path):
+    if not os.path.exists(path):
+        return False
+    st = os.stat(path)
+    if st.st_size != fingerprint['size']:
+        return False
+    return st.st_mtime_ns == fingerprint['mtime_ns'] or file_sha1(path) == fingerprint['sha1']
+
+def write_cache(path, sources, meta, sections):
+    header = { 'version': CACHE_VERSION, 'sources': [ file_fingerprint(src) for src in sources ], 'meta': meta, 'sections': {} }
+    payload, offset = [], 0
+    for name, data in sections.items():
+        if isinstance(data, (bytes, bytearray)):
+            typecode, raw = 'B', bytes(data)
+        else:
+            typecode, raw = data.typecode, array(data.typecode, data).tobytes()
+        header['sections'][name] = [typecode, offset, len(raw)]
+        pad = (-len(raw)) % 8
+        payload.append(raw + b'\0' * pad)
+        offset += len(raw) + pad
+    header_bytes = json.dumps(header).encode('utf-8')
+    header_bytes += b' ' * ((-len(header_bytes)) % 8)
+    tmp_path = '{}.{}.tmp'.format(cache_path(path), os.getpid())
+    try:
+        with open(tmp_path, 'wb') as f:
+            f.write(CACHE_MAGIC)
+            f.write(struct.pack('<Q', len(header_bytes)))
+            f.write(header_bytes)
+            for raw in payload:
+                f.write(raw)
+        os.replace(tmp_path, cache_path(path))
+    except (IOError, OSError) as e:
+        print('<!> cannot write cache {}: {}'.format(cache_path(path), e))
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+# (meta, sections) of a fresh cache for path, or None when missing/stale
+def read_cache(path, sources):
+    try:
+        with open(cache_path(path), 'rb') as f:
+            mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    except (IOError, OSError, ValueError):
+        return None
+    if mm[:len(CACHE_MAGIC)] != CACHE_MAGIC:
+        return None
+    header_len, = struct.unpack_from('<Q', mm, len(CACHE_MAGIC))
+    base = len(CACHE_MAGIC) + 8
+    header = json.loads(mm[base:base + header_len].decode('utf-8'))
+    if header['version'] != CACHE_VERSION:
+        return None
+    if [ src['path'] for src in header['sources'] ] != [ os.path.abspath(src) for src in sources ]:
+        return None
+    if not all( fingerprint_matches(src, src['path']) for src in header['sources'] ):
+        return None
+    view = memoryview(mm)
+    base += header_len
+    sections = {}
+    for name, (typecode, offset, size) in header['sections'].items():
+        section = view[base + offset:base + offset + size]
+        sections[name] = section if typecode == 'B' else section.cast(typecode)
+    return header['meta'], sections
+
+# json.load (of plain or .gz input) through a pickled copy in <input>.cache
+def load_json(path, cache=True):
+    if cache:
+        cached = read_cache(path, [path])
+        if cached is not None:
+            return pickle.loads(cached[1]['pickle'])
+    with (gzip.open(path, 'rt') if path.endswith('.gz') else open(path, 'r')) as f:
+        js = json.load(f)
+    if cache:
+        write_cache(path, [path], {}, { 'pickle': pickle.dumps(js, protocol=pickle.HIGHEST_PROTOCOL) })
+    return js
+
+# text output, written to <path>.gz instead with --gzip
+def output_path(path, compress=False):
+    return path + '.gz' if compress else path
+
+def open_output(path, compress=False):
+    if compress:
+        return gzip.open(output_path(path, compress), 'wt')
+    return open(path, 'w')
+
+# json array written an element at a time; same text as json.dump(list, f, indent=indent)
+class JsonListWriter(object):
+    def __init__(self, f, indent=None):
+        self.f, self.indent, self.n = f, indent, 0
+
+    def append(self, js):
+        text = json.dumps(js, indent=self.indent)
+        if self.indent is None:
+            self.f.write(('[' if self.n == 0 else ', ') + text)
+        else:
+            pad = ' ' * self.indent
+            self.f.write(('[\n' if self.n == 0 else ',\n') + pad + text.replace('\n', '\n' + pad))
+        self.n += 1
+
+    def close(self):
+        if self.n == 0:
+            self.f.write('[]')
+        else:
+            self.f.write(']' if self.indent is None else '\n]')
+
+###############################################################################
+# self-profile: --self-profile
+###############################################################################
+# Per phase of a run (json load, graph build, consistency check, call history,
+# log ingestion, aggregation, output): wall and cpu time, cpu of reaped child
+# processes, the tracemalloc peak of python allocations inside the phase, the
+# process' peak rss after it, and the records it processed. Phases nest and are
+# reported by path (e.g. 'output/call history'); entering the same path again
+# adds to it. Without --self-profile a phase costs a no-op context manager.
+class SelfProfile(object):
+    def __init__(self):
+        self.enabled = False
+        self.phases = {}
+        self.stack = []
+
+    def start(self):
+        import tracemalloc
+        self.enabled = True
+        tracemalloc.start()
+        self.started = (time.perf_counter(), time.process_time())
+
+    # `with self_profile.phase(name) as counters:` and set counters['records']
+    @contextlib.contextmanager
+    def phase(self, name):
+        counters = {'records': 0}
+        if not self.enabled:
+            yield counters
+            return
+        import tracemalloc
+        path = self.stack[-1]['path'] + '/' + name if self.stack else name
+        # tracemalloc has one peak: the enclosing phase keeps its own so far
+        current, peak = tracemalloc.get_traced_memory()
+        if self.stack:
+            self.stack[-1]['peak'] = max(self.stack[-1]['peak'], peak)
+        tracemalloc.reset_peak()
+        frame = {'path': path, 'peak': current}
+        self.stack.append(frame)
+        wall, cpu, children = time.perf_counter(), time.process_time(), os.times()
+        try:
+            yield counters
+        finally:
+            end = os.times()
+            self.stack.pop()
+            peak = max(frame['peak'], tracemalloc.get_traced_memory()[1])
+            tracemalloc.reset_peak()
+            if self.stack:
+                self.stack[-1]['peak'] = max(self.stack[-1]['peak'], peak)
+            self.add({'phase': path, 'calls': 1, 'wall': time.perf_counter() - wall, 'cpu': time.process_time() - cpu,
+                      'cpu_children': end.children_user + end.children_system - children.children_user - children.children_system,
+                      'peak_traced': peak, 'max_rss': max_rss(), 'records': counters['records']})
+
+    def add(self, rec):
+        entry = self.phases.get(rec['phase'])
+        if entry is None:
+            self.phases[rec['phase']] = dict(rec)
+            return
+        for key in ['calls', 'wall', 'cpu', 'cpu_children', 'records']:
+            entry[key] += rec[key]
+        for key in ['peak_traced', 'max_rss']:
+            entry[key] = max(entry[key], rec[key])
+
+    # phases recorded so far, handed over e.g. from a worker process, and forgotten
+    def take(self):
+        phases, self.phases = list(self.phases.values()), {}
+        return phases
+
+    # phases in tree order, each level in the order it was first left
+    def tree(self):
+        order = dict( (phase, i) for i, phase in enumerate(self.phases) )
+        def key(phase):
+            parts = phase.split('/')
+            return [ order.get('/'.join(parts[:i + 1]), order[phase]) for i in range(len(parts)) ]
+        return [ self.phases[phase] for phase in sorted(self.phases, key=key) ]
+
+    def write(self, path, meta):
+        wall, cpu = time.perf_counter() - self.started[0], time.process_time() - self.started[1]
+        print('\n-- self-profile: {:.2f}s wall, {:.2f}s cpu, {:.1f} MiB max rss'.format(wall, cpu, max_rss() / 2**20))
+        for rec in self.tree():
+            print('\t{:<40}{:>6} calls{:>10.3f}s wall{:>10.3f}s cpu{:>10.1f} MiB peak{:>12} records'.format(
+                  '  ' * rec['phase'].count('/') + rec['phase'].split('/')[-1], rec['calls'], rec['wall'], rec['cpu'] + rec['cpu_children'],
+                  rec['peak_traced'] / 2**20, rec['records']))
+        if os.path.dirname(path) and not os.path.exists(os.path.dirname(path)):
+            os.makedirs(os.path.dirname(path))
+        with open(path, 'w') as f:
+            json.dump(dict(meta, wall=wall, cpu=cpu, max_rss=max_rss(), phases=self.tree()), f, indent=2)
+        print("write self-profile to --> {}".format(path))
+
+# peak resident set size of this process in bytes (ru_maxrss is in KiB on linux)
+def max_rss():
+    import resource
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+self_profile = SelfProfile()
+
+###############################################################################
+# reverse call graph shared by -A and -PROFILE
+###############################################################################
+# interning table: string <-> dense int id
+class StringTable(object):
+    def __init__(self):
+        self.strings = []
+        self.ids = {}
+
+    def __len__(self):
+        return len(self.strings)
+
+    def intern(self, s):
+        i = self.ids.get(s)
+        if i is None:
+            i = len(self.strings)
+            self.ids[s] = i
+            self.strings.append(s)
+        return i
+
+# read-only StringTable over a cached string section: utf-8 blob + offsets, plus
+# the ids sorted by string so lookups binary-search the blob instead of a dict
+class MappedStringTable(object):
+    def __init__(self, table, sections):
+        self.strings = MappedStrings(sections[table + '.blob'], sections[table + '.offsets'])
+        self.ids = MappedStringIds(self.strings, sections[table + '.order'])
+
+    def __len__(self):
+        return len(self.strings)
+
+class MappedStrings(object):
+    def __init__(self, blob, offsets):
+        self.blob, self.offsets = blob, offsets
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def raw(self, i):
+        return bytes(self.blob[self.offsets[i]:self.offsets[i + 1]])
+
+    def __getitem__(self, i):
+        if not 0 <= i < len(self):
+            raise IndexError(i)
+        return self.raw(i).decode('utf-8')
+
+class MappedStringIds(object):
+    def __init__(self, strings, order):
+        self.strings, self.order = strings, order
+
+    def get(self, s, default=None):
+        key = s.encode('utf-8')
+        order, raw = self.order, self.strings.raw
+        lo, hi = 0, len(order)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if raw(order[mid]) < key:
+                lo = mid + 1
+            else:
+                hi = mid
+        if lo < len(order) and raw(order[lo]) == key:
+            return order[lo]
+        return default
+
+    def __contains__(self, s):
+        return self.get(s) is not None
+
+def string_table_sections(table, strings):
+    encoded = [ s.encode('utf-8') for s in strings ]
+    offsets = array('q', [0])
+    for b in encoded:
+        offsets.append(offsets[-1] + len(b))
+    order = array('q', sorted(range(len(encoded)), key=encoded.__getitem__))
+    return { table + '.blob': b''.join(encoded), table + '.offsets': offsets, table + '.order': order }
+
+PRR_STATES = ['defef', 'defdac', 'both', 'untouched']
+
+# callsites of callee f are edges offsets[f] .. offsets[f+1]-1 (CSR), each edge
+# stores its caller id and the file/ln/col/prr/caller_name columns of the callsite.
+# function ids [0, ndefined) are functions that have an entry in .cg.json
+class CallGraph(object):
+    def __init__(self, cg_json):
+        self.funcs = StringTable()      # mangled names
+        self.names = StringTable()      # caller (demangled) names
+        self.files = StringTable()      # normalized callsite files
+        # last entry wins on duplicated func, same as the old dict construction
+        entries = {}
+        for js in cg_json:
+            entries[self.funcs.intern(js['func'])] = js
+        self.ndefined = len(self.funcs)
+
+        self.offsets = array('q', [0])
+        self.callee = array('q')
+        self.callers = array('q')
+        self.file = array('q')
+        self.ln = array('q')
+        self.col = array('q')
+        self.prr = array('b')
+        self.caller_name = array('q')
+        file_ids = {}
+        for f in range(self.ndefined):
+            # callsites only differing in inlineHistory print identically, keep one
+            seen = set()
+            for js_callsite in entries[f]['callsites']:
+                file = js_callsite['file']
+                if file not in file_ids:
+                    file_ids[file] = self.files.intern(normpath(file))
+                callsite = (self.funcs.intern(js_callsite['caller_mangled_name']), file_ids[file], js_callsite['ln'], js_callsite['col'],
+                            PRR_STATES.index(js_callsite['prr']), self.names.intern(js_callsite['caller_name']))
+                if callsite in seen:
+                    continue
+                seen.add(callsite)
+                caller, file, ln, col, prr, caller_name = callsite
+                self.callee.append(f)
+                self.callers.append(caller)
+                self.file.append(file)
+                self.ln.append(ln)
+                self.col.append(col)
+                self.prr.append(prr)
+                self.caller_name.append(caller_name)
+            self.offsets.append(len(self.callers))
+        self._loc = {}
+
+    # parse .cg.json (and condense with .scc.json), going through <cg.json>.cache when fresh
+    @classmethod
+    def load(cls, path, scc_path=None, cache=True):
+        sources = [ p for p in [path, scc_path] if p and os.path.exists(p) ]
+        if cache:
+            cached = read_cache(path, sources)
+            if cached is not None:
+                return cls.from_cache(*cached)
+        with open(path, 'r') as f:
+            cg = cls(json.load(f))
+        if scc_path is not None:
+            cg.load_scc(scc_path)
+        if cache:
+            write_cache(path, sources, *cg.to_cache())
+        return cg
+
+    CACHE_COLUMNS = ['offsets', 'callee', 'callers', 'file', 'ln', 'col', 'prr', 'caller_name']
+    CACHE_COMP_COLUMNS = ['comp', 'comp_size', 'comp_offsets', 'comp_edges']
+
+    def to_cache(self):
+        meta = { 'ndefined': self.ndefined }
+        sections = { col: getattr(self, col) for col in self.CACHE_COLUMNS }
+        for table in ['funcs', 'names', 'files']:
+            sections.update(string_table_sections(table, getattr(self, table).strings))
+        if hasattr(self, 'comp'):
+            meta['ncomp'] = self.ncomp
+            sections.update({ col: getattr(self, col) for col in self.CACHE_COMP_COLUMNS })
+        return meta, sections
+
+    @classmethod
+    def from_cache(cls, meta, sections):
+        cg = cls.__new__(cls)
+        cg.ndefined = meta['ndefined']
+        for col in cls.CACHE_COLUMNS:
+            setattr(cg, col, sections[col])
+        for table in ['funcs', 'names', 'files']:
+            setattr(cg, table, MappedStringTable(table, sections))
+        if 'ncomp' in meta:
+            cg.ncomp = meta['ncomp']
+            for col in cls.CACHE_COMP_COLUMNS:
+                setattr(cg, col, sections[col])
+        cg._loc = {}
+        return cg
+
+    def __len__(self):
+        return len(self.funcs)
+
+    def lookup(self, func_name):
+        return self.funcs.ids.get(func_name)
+
+    def is_defined(self, f):
+        return f is not None and f < self.ndefined
+
+    def callsites(self, f):
+        if f >= self.ndefined:
+            return range(0)
+        return range(self.offsets[f], self.offsets[f + 1])
+
+    # "<file>:<ln>:<col>\tcaller: <caller_name>", formatted once per edge
+    def callsite_loc(self, e):
+        loc = self._loc.get(e)
+        if loc is None:
+            loc = '{}:{}:{}\tcaller: {}'.format(self.files.strings[self.file[e]], self.ln[e], self.col[e], self.names.strings[self.caller_name[e]])
+            self._loc[e] = loc
+        return loc
+
+    def callsite_prr(self, e):
+        return PRR_STATES[self.prr[e]]
+
+    def caller_mangled_name(self, e):
+        return self.funcs.strings[self.callers[e]]
+
+    # mark callsites that sit in one of major_files or whose caller is one of major_funcs
+    def major_callsites(self, major_files=(), major_funcs=()):
+        major_file_ids = { i for i, file in enumerate(self.files.strings) if os.path.basename(file) in major_files }
+        major_name_ids = { i for i, name in enumerate(self.names.strings) if name in major_funcs }
+        return bytearray( (self.file[e] in major_file_ids or self.caller_name[e] in major_name_ids) for e in range(len(self.callers)) )
+
+    # strongly connected components over the caller edges, forcing each group of
+    # mangled names from <test>.scc.json into a single component. comp[f] numbers
+    # components in Tarjan emit order, i.e. every caller component comes first
+    def condense(self, scc_groups=()):
+        n = len(self.funcs)
+        ring = defaultdict(list)
+        for group in scc_groups:
+            ids = [ f for f in (self.lookup(name) for name in group) if f is not None ]
+            for a, b in zip(ids, ids[1:] + ids[:1]):
+                if a != b:
+                    ring[a].append(b)
+
+        def successors(v):
+            succ = list(self.callers[self.offsets[v]:self.offsets[v + 1]]) if v < self.ndefined else []
+            if v in ring:
+                succ.extend(ring[v])
+            return succ
+
+        index = array('q', [-1]) * n
+        low = array('q', [0]) * n
+        comp = array('q', [-1]) * n
+        onstack = bytearray(n)
+        stack = []
+        counter = 0
+        ncomp = 0
+        for root in range(n):
+            if index[root] != -1:
+                continue
+            index[root] = low[root] = counter
+            counter += 1
+            stack.append(root)
+            onstack[root] = 1
+            work = [(root, successors(root), 0)]
+            while work:
+                v, succ, i = work[-1]
+                if i < len(succ):
+                    work[-1] = (v, succ, i + 1)
+                    w = succ[i]
+                    if index[w] == -1:
+                        index[w] = low[w] = counter
+                        counter += 1
+                        stack.append(w)
+                        onstack[w] = 1
+                        work.append((w, successors(w), 0))
+                    elif onstack[w] and index[w] < low[v]:
+                        low[v] = index[w]
+                    continue
+                work.pop()
+                if work and low[v] < low[work[-1][0]]:
+                    low[work[-1][0]] = low[v]
+                if low[v] == index[v]:
+                    while True:
+                        w = stack.pop()
+                        onstack[w] = 0
+                        comp[w] = ncomp
+                        if w == v:
+                            break
+                    ncomp += 1
+
+        # component DAG in CSR form, keeping the .cg.json callsite order inside each component
+        comp_size = array('q', [0]) * ncomp
+        for f in range(n):
+            comp_size[comp[f]] += 1
+        comp_offsets = array('q', [0]) * (ncomp + 1)
+        for e in range(len(self.callers)):
+            if comp[self.callee[e]] != comp[self.callers[e]]:
+                comp_offsets[comp[self.callee[e]] + 1] += 1
+        for c in range(ncomp):
+            comp_offsets[c + 1] += comp_offsets[c]
+        comp_edges = array('q', [0]) * comp_offsets[ncomp]
+        fill = array('q', comp_offsets[:ncomp])
+        for e in range(len(self.callers)):
+            c = comp[self.callee[e]]
+            if c != comp[self.callers[e]]:
+                comp_edges[fill[c]] = e
+                fill[c] += 1
+
+        self.comp, self.ncomp, self.comp_size = comp, ncomp, comp_size
+        self.comp_offsets, self.comp_edges = comp_offsets, comp_edges
+        return self
+
+    def load_scc(self, path):
+        scc_groups = []
+        if os.path.exists(path):
+            with open(path, 'r') as f:
+                scc_groups = [ [ js_func['id'] for js_func in js['scc'] ] for js in json.load(f) ]
+        return self.condense(scc_groups)
+
+    def comp_callsites(self, c):
+        return self.comp_edges[self.comp_offsets[c]:self.comp_offsets[c + 1]]
+
 ###############################################################################
-def compileAnalysisAndInstrumentResults(args, workdir=None, test=None):
-    def print_call_history(func_name, cg, res_limit=10, indent=0):
-        res = set()
-        def traversal(f, callpath, res, visited):
-            if f not in cg:
-                res.add('\n'.join([ '{}{}'.format('\t'*indent, p) for p in callpath ]))
-                return (len(res) < res_limit)
-            if f in visited:
-                return (len(res) < res_limit)
-            continued = True
-            visited.add(f)
-            js = cg[f]
-            for js_callsite in js['callsites']:
-                file = normpath(js_callsite['file'])
-                ln = js_callsite['ln']
-                col = js_callsite['col']
-                prr = js_callsite['prr']
-                caller_name = js_callsite['caller_name']
-                # push new path
-                new_path = "{}  {}:{}:{}\tcaller: {}".format(prr, file, str(ln), str(col), caller_name)
-                if args.v:
-                    new_path += '\t{}'.format(js_callsite['caller_mangled_name'])
-                callpath.append(new_path)
-                continued &= traversal(js_callsite['caller_mangled_name'], callpath, res, visited)
-                callpath.pop()
-                if not continued: 
+# call history: call paths over the condensed call graph
+###############################################################################
+# A call path leaves the queried function and follows callsites between distinct
+# SCCs until it reaches a component without callers, or a callsite flagged in
+# stop. Calls inside a recursive SCC are collapsed, which keeps the number of
+# paths finite and lets both quantities below be computed by DP over the DAG:
+#   count(f): exact number of distinct call paths
+#   best(f):  the k best call paths, shortest first, or heaviest first when a
+#             per-function weight (e.g. profiled entry count) is supplied
+# Results are memoized per component, so every query after the first touching
+# a component is O(k) and a full pass is linear in graph size for fixed k.
+class CallHistory(object):
+    def __init__(self, cg, k=10, stop=None, weight=None):
+        self.cg, self.k, self.stop = cg, k, stop
+        # cost of a callsite: (path length) or (-caller weight, path length); ties
+        # are broken by callsite order in .cg.json, so results are deterministic
+        if weight is None:
+            self.edge_cost = lambda e: (1, 0)
+        else:
+            self.edge_cost = lambda e: (-weight.get(cg.caller_mangled_name(e), 0), 1)
+        self._count = {}
+        self._best = {}
+
+    def _ends_at(self, e):
+        return self.stop is not None and self.stop[e]
+
+    # postorder over components reachable from c whose table is still missing
+    def _solve(self, c, table, compute):
+        if c in table:
+            return table[c]
+        cg = self.cg
+        work = [(c, 0)]
+        while work:
+            c, i = work[-1]
+            edges = cg.comp_callsites(c)
+            while i < len(edges):
+                e = edges[i]
+                i += 1
+                d = cg.comp[cg.callers[e]]
+                if not self._ends_at(e) and d not in table:
+                    work[-1] = (c, i)
+                    work.append((d, 0))
                     break
-            
-            # shrink current visit set
-            visited.remove(f)
-            return continued
+            else:
+                work.pop()
+                table[c] = compute(c, edges)
+        return table[c]
 
-        normal_exit = traversal(func_name, [], res, visited=set())
+    def _compute_count(self, c, edges):
+        if not edges:
+            return 1
+        return sum( 1 if self._ends_at(e) else self._count[self.cg.comp[self.cg.callers[e]]] for e in edges )
 
-        return res, normal_exit
+    # best[c]: up to k (cost, edge, rank) sorted ascending, rank indexes best[] of
+    # the caller's component (-1 terminates the path)
+    def _compute_best(self, c, edges):
+        if not edges:
+            return [((0, 0), -1, -1)]
+        def candidates(e):
+            cost = self.edge_cost(e)
+            if self._ends_at(e):
+                return iter([(cost, e, -1)])
+            tail = self._best[self.cg.comp[self.cg.callers[e]]]
+            return ( ((cost[0] + t[0][0], cost[1] + t[0][1]), e, j) for j, t in enumerate(tail) )
+        return list(islice(heapq.merge(*[ candidates(e) for e in edges ]), self.k))
 
-    # print calling history of a callsite
-    with open(os.path.join(workdir, r'{}.cg.json'.format(test)), 'r') as f:
-        cg_json = json.load(f)
-        cg = { js['func'] : js for js in cg_json}
-        if args.v: print('<< read from {}'.format(os.path.join(workdir, r'{}.cg.json'.format(test))))
-
-    # static analysis result in json
-    with open(os.path.join(workdir, r'{}.cilkfor.json'.format(test)), 'r') as f:
-        static_analysis_json = json.load(f) 
-        static_analysis = { js['ID'] : js for js in static_analysis_json }
-        assert(len(static_analysis_json) == len(static_analysis))
-        if args.v: print('<< read from {}'.format(os.path.join(workdir, r'{}.cilkfor.json'.format(test))))
-        print("{} static cilkfor results".format(len(static_analysis)))
-        print("\t{} ef results".format(len([ js for js in static_analysis_json if js['prr'] == 'defef' ])))
-        print("\t{} dac results".format(len([ js for js in static_analysis_json if js['prr'] == 'defdac' ])))
-        print("\t{} both results".format(len([ js for js in static_analysis_json if js['prr'] == 'both' ])))
-        print("\t{} untouched results".format(len([ js for js in static_analysis_json if js['prr'] == 'untouched' ])))
-
-    # instrumentation result in json 
-    with open(os.path.join(workdir, r'{}.instr.json'.format(test)), 'r') as f:
-        lazyd_instrument_json = json.load(f)
-        lazyd_instrument = { js['ID'] : js for js in lazyd_instrument_json }
-        assert(len(lazyd_instrument_json) == len(lazyd_instrument))
-        if args.v: print('<< read from {}'.format(os.path.join(workdir, r'{}.instr.json'.format(test))))
-        print("{} instrumentation cilkfor results".format(len(lazyd_instrument)))
+    def count(self, func_name):
+        f = self.cg.lookup(func_name)
+        if f is None:
+            return 1
+        return self._solve(self.cg.comp[f], self._count, self._compute_count)
+
+    # list of call paths, each a tuple of callsite edges ordered from callee upwards
+    def best(self, func_name):
+        f = self.cg.lookup(func_name)
+        if f is None:
+            return [()]
+        best = self._solve(self.cg.comp[f], self._best, self._compute_best)
+        paths = []
+        for _, e, j in best:
+            path = []
+            while e != -1:
+                path.append(e)
+                entry = self._best[self.cg.comp[self.cg.callers[e]]][j] if j != -1 else (None, -1, -1)
+                _, e, j = entry
+            paths.append(tuple(path))
+        return paths
+
+    # textual hop between two consecutive callsites of a path through a recursive SCC
+    def scc_hop(self, e, e_next):
+        if self.cg.callers[e] == self.cg.callee[e_next]:
+            return None
+        return '(via recursive scc of {} functions)'.format(self.cg.comp_size[self.cg.comp[self.cg.callers[e]]])
+
+# lines of a call path, with a marker wherever consecutive callsites are joined through an scc
+def format_call_path(call_history, path, callsite_line):
+    lines = []
+    for i, e in enumerate(path):
+        lines.append(callsite_line(e))
+        if i + 1 < len(path):
+            hop = call_history.scc_hop(e, path[i + 1])
+            if hop:
+                lines.append(hop)
+    return lines
+
+###############################################################################
+# perf log ingestion: <test>.perf.log.gz
+###############################################################################
+# one line per parallel_for entry:
+#   version,tripcount,granularity,depth,src_loc,src_caller,inline_loc,inline_caller
+# aggregated per (version, src_caller). Location sets are insertion-ordered dicts,
+# so the summary lists come out in first-seen order and chunked parsing merged in
+# stream order reproduces the serial result exactly.
+def new_perf_logs():
+    return {0: {}, 1: {}, 2: {}}
+
+# runtime argument distributions: log-binned histogram + exact min/max per field.
+# values below 2**SKETCH_BITS get their own bin, larger ones keep their top
+# SKETCH_BITS bits (<4% relative error), so a sketch never has more than
+# ~64 * 2**(SKETCH_BITS-1) bins whatever the log size, and merging is addition.
+SKETCH_BITS = 5
+SKETCH_FIELDS = ['tripcount', 'granularity', 'depth']
+
+def sketch_bin(value):
+    value = max(value, 0)
+    shift = value.bit_length() - SKETCH_BITS
+    if shift <= 0:
+        return value
+    return (shift << (SKETCH_BITS - 1)) + (value >> shift)
+
+# vectorized sketch_bin over an int64 column
+def sketch_bins(values):
+    values = np.maximum(values, 0)
+    shift = np.maximum(np.frexp(values.astype(np.float64))[1].astype(np.int64) - SKETCH_BITS, 0)
+    # above 2**53 the float can round up to the next power of two
+    shift -= (shift > 0) & ((values >> np.maximum(shift - 1, 0)) < (1 << SKETCH_BITS))
+    # shift 0 keeps the value as its own bin
+    return (shift << (SKETCH_BITS - 1)) + (values >> shift)
+
+# [lo, hi] range of values that land in bin b
+def sketch_bin_range(b):
+    if b < (1 << SKETCH_BITS):
+        return b, b
+    shift = (b >> (SKETCH_BITS - 1)) - 1
+    lo = (b - (shift << (SKETCH_BITS - 1))) << shift
+    return lo, lo + (1 << shift) - 1
+
+def new_sketch():
+    return {'min': None, 'max': None, 'hist': {}}
+
+def sketch_add(sketch, value):
+    if sketch['min'] is None or value < sketch['min']:
+        sketch['min'] = value
+    if sketch['max'] is None or value > sketch['max']:
+        sketch['max'] = value
+    b = sketch_bin(value)
+    sketch['hist'][b] = sketch['hist'].get(b, 0) + 1
+
+def merge_sketch(sketch, other):
+    if other['min'] is None:
+        return sketch
+    if sketch['min'] is None or other['min'] < sketch['min']:
+        sketch['min'] = other['min']
+    if sketch['max'] is None or other['max'] > sketch['max']:
+        sketch['max'] = other['max']
+    hist = sketch['hist']
+    for b, n in other['hist'].items():
+        hist[b] = hist.get(b, 0) + n
+    return sketch
+
+# q-quantile of a sketch (hist as dict or as the [[bin, count], ...] list of
+# .perf.short.json): midpoint of the bin holding the rank, clamped to [min, max]
+def sketch_quantile(sketch, q):
+    hist = sketch['hist']
+    hist = sorted(hist.items() if isinstance(hist, dict) else hist)
+    total = sum(n for _, n in hist)
+    if total == 0:
+        return None
+    rank = max(1, int(np.ceil(q * total)))
+    seen = 0
+    for b, n in hist:
+        seen += n
+        if seen >= rank:
+            lo, hi = sketch_bin_range(b)
+            return min(max((lo + hi) / 2.0, sketch['min']), sketch['max'])
+
+def new_perf_log_entry(version, src_caller):
+    return {
+        'src_caller': src_caller,
+        'src_locs': {},
+        'inline_locs': {},
+        'inline_callers': {},
+        'version': version,
+        'entry': 0,
+        'ef_entry': 0,
+        'dac_entry': 0,
+        'tripcount_sum': 0.0,
+        'granularity_sum': 0.0,
+        'depth_sum': 0.0,
+        'tripcount_sketch': new_sketch(),
+        'granularity_sketch': new_sketch(),
+        'depth_sketch': new_sketch()
+    }
+
+def parse_perf_log(line, perfLogsDict=None):
+    # break apart log line
+    line = line.split(',')
+
+    version = int(line[0])
+    tripcount = int(line[1])
+    granularity = int(line[2])
+    depth = int(line[3])
+    src_loc = line[4]
+    src_caller = line[5]
+    inline_loc = line[6]
+    inline_caller = line[7]
+    # check version 
+    perfLogsDict_vers = perfLogsDict[version]
+    if src_caller not in perfLogsDict_vers:
+        perfLogsDict_vers[src_caller] = new_perf_log_entry(version, src_caller)
+    log = perfLogsDict_vers[src_caller]
+    # add caller (mangled) name
+    log['inline_locs'][inline_loc] = None
+    log['src_locs'][src_loc] = None
+    log['inline_callers'][inline_caller] = None
+    # update runtime argument distribution
+    log['tripcount_sum'] += tripcount
+    log['granularity_sum'] += granularity
+    log['depth_sum'] += depth
+    sketch_add(log['tripcount_sketch'], tripcount)
+    sketch_add(log['granularity_sketch'], granularity)
+    sketch_add(log['depth_sketch'], depth)
+    # incr entry count
+    log['entry'] += 1 
+    if (depth > 0):
+        log['dac_entry'] += 1
+    else: 
+        log['ef_entry'] += 1
+
+# fold perfLogsDict `other` (from a later part of the log) into perfLogsDict
+def merge_perf_logs(perfLogsDict, other):
+    for version, other_vers in other.items():
+        perfLogsDict_vers = perfLogsDict[version]
+        for src_caller, other_log in other_vers.items():
+            if src_caller not in perfLogsDict_vers:
+                perfLogsDict_vers[src_caller] = other_log
+                continue
+            log = perfLogsDict_vers[src_caller]
+            for key in ['src_locs', 'inline_locs', 'inline_callers']:
+                log[key].update(other_log[key])
+            for key in ['entry', 'ef_entry', 'dac_entry', 'tripcount_sum', 'granularity_sum', 'depth_sum']:
+                log[key] += other_log[key]
+            for field in SKETCH_FIELDS:
+                merge_sketch(log[field + '_sketch'], other_log[field + '_sketch'])
+    return perfLogsDict
+
+# perfLogsDict of one block given as columns: group[i] is the (version, tail)
+# group of line i, numbered in first-seen order, keys[g] = (version, tail string)
+# of group g. Groups are mapped to their (version, src_caller) record, then sums
+# are bincounts over records, sketch min/max ufunc.at reductions and sketch
+# histograms one bincount over the combined (record, bin) index.
+def perf_logs_from_columns(group, keys, tripcount, granularity, depth):
+    records, record_of, locs = {}, [], []
+    for version, tail in keys:
+        src_loc, src_caller, inline_loc, inline_caller = tail.rstrip().split(',')[:4]
+        record_of.append(records.setdefault((version, src_caller), len(records)))
+        locs.append((src_loc, inline_loc, inline_caller))
+    record = np.array(record_of)[group]
+    nrecords = len(records)
+
+    entry = np.bincount(record, minlength=nrecords).tolist()
+    dac_entry = np.bincount(record[depth > 0], minlength=nrecords).tolist()
+    sums = [ np.bincount(record, weights=col, minlength=nrecords).tolist() for col in [tripcount, granularity, depth] ]
+    sketches = []
+    for col in [tripcount, granularity, depth]:
+        lo = np.full(nrecords, np.iinfo(np.int64).max)
+        hi = np.full(nrecords, np.iinfo(np.int64).min)
+        np.minimum.at(lo, record, col)
+        np.maximum.at(hi, record, col)
+        bins = sketch_bins(col)
+        nbins = int(bins.max()) + 1
+        if nrecords * nbins <= 4 * len(col) + (1 << 16):
+            hist = np.bincount(record * nbins + bins, minlength=nrecords * nbins)
+            pairs = np.flatnonzero(hist)
+            counts = hist[pairs]
+        else:
+            # many records in a small block: count the pairs that occur only
+            pairs, counts = np.unique(record * nbins + bins, return_counts=True)
+        bounds = np.searchsorted(pairs // nbins, np.arange(nrecords + 1)).tolist()
+        pair_bins, counts = (pairs % nbins).tolist(), counts.tolist()
+        hists = [ dict(zip(pair_bins[a:b], counts[a:b])) for a, b in zip(bounds[:-1], bounds[1:]) ]
+        sketches.append((lo.tolist(), hi.tolist(), hists))
+
+    perfLogsDict = new_perf_logs()
+    logs = []
+    for r, (version, src_caller) in enumerate(records):
+        log = perfLogsDict[version][src_caller] = new_perf_log_entry(version, src_caller)
+        log['tripcount_sum'] += sums[0][r]
+        log['granularity_sum'] += sums[1][r]
+        log['depth_sum'] += sums[2][r]
+        log['entry'] = entry[r]
+        log['dac_entry'] = dac_entry[r]
+        log['ef_entry'] = entry[r] - dac_entry[r]
+        for field, (lo, hi, hists) in zip(SKETCH_FIELDS, sketches):
+            log[field + '_sketch'] = {'min': lo[r], 'max': hi[r], 'hist': hists[r]}
+        logs.append(log)
+    for r, (src_loc, inline_loc, inline_caller) in zip(record_of, locs):
+        log = logs[r]
+        log['inline_locs'][inline_loc] = None
+        log['src_locs'][src_loc] = None
+        log['inline_callers'][inline_caller] = None
+    return perfLogsDict
+
+# same result as parse_perf_log line by line: the loop only splits off the four
+# numbers and looks up the (version, tail) group, the aggregation is columnar
+def parse_perf_log_chunk(chunk):
+    groups = {}
+    keys, group, tripcount, granularity, depth = [], [], [], [], []
+    for line in chunk.decode('utf-8').split('\n'):
+        line = line.strip()
+        if not line:
+            continue
+        version, t, g, d, tail = line.split(',', 4)
+        key = (version, tail)
+        code = groups.get(key)
+        if code is None:
+            code = groups[key] = len(keys)
+            keys.append((int(version), tail))
+        group.append(code)
+        tripcount.append(int(t))
+        granularity.append(int(g))
+        depth.append(int(d))
+    if not keys:
+        return new_perf_logs()
+    return perf_logs_from_columns(np.array(group), keys, np.array(tripcount, dtype=np.int64),
+                                  np.array(granularity, dtype=np.int64), np.array(depth, dtype=np.int64))
+
+# index of the first element of each code, for codes numbered in first-seen order
+def first_occurrences(codes):
+    seen = np.maximum.accumulate(codes)
+    return np.flatnonzero(np.concatenate(([True], seen[1:] > seen[:-1])))
+
+# rows of `width` bytes of buf starting at each of pos, zero-filled past its end
+def byte_windows(buf, pos, width):
+    last = len(buf) - width
+    if last < 0:
+        buf, last = np.concatenate((buf, np.zeros(-last, dtype=np.uint8))), 0
+    rows = np.lib.stride_tricks.sliding_window_view(buf, width)[np.minimum(pos, last)]
+    over = np.flatnonzero(pos > last)
+    if len(over):
+        lo = int(pos[over].min())
+        end = np.zeros(len(buf) - lo + width, dtype=np.uint8)
+        end[:len(buf) - lo] = buf[lo:]
+        rows[over] = np.lib.stride_tricks.sliding_window_view(end, width)[pos[over] - lo]
+    return rows
+
+# unsigned decimal fields buf[s:e] as int64, None if any field is not plain digits.
+# Each field is read as the right-aligned window of the widest one.
+def parse_uint_fields(buf, s, e):
+    width = e - s
+    if len(width) == 0:
+        return np.zeros(0, dtype=np.int64)
+    if width.min() <= 0 or width.max() > 18:
+        return None
+    w = int(width.max())
+    digits = buf[e[:, None] + np.arange(-w, 0)] - np.uint8(ord('0'))
+    digits[np.arange(w) < (w - width)[:, None]] = 0
+    if np.any(digits > 9):
+        return None
+    return digits.astype(np.int64) @ 10 ** np.arange(w - 1, -1, -1, dtype=np.int64)
+
+# codes of the byte spans buf[s:e] in first-seen order and the index of the first
+# span of each code. Spans are cut into 8-byte words, hashed by a dot product
+# with odd weights, factorized by hash and then checked word for word against the
+# first span of their code. Spans are windowed per 64-byte length class to bound
+# the zero padding. None on a hash collision.
+SPAN_HASH_MULT = 0x9e3779b97f4a7c15
+
+def factorize_byte_spans(buf, s, e):
+    length = e - s
+    length_class = (length + 63) >> 6
+    masks = np.array([ (1 << (8 * k)) - 1 for k in range(8) ] + [0xffffffffffffffff], dtype=np.uint64)
+    h = np.empty(len(s), dtype=np.int64)
+    spans = []
+    classes = np.flatnonzero(np.bincount(length_class)).tolist()
+    for c in classes:
+        # a single class (the usual case) needs no row index
+        rows = np.flatnonzero(length_class == c) if len(classes) > 1 else slice(None)
+        n = length[rows]
+        nwords = (int(n.max()) + 7) >> 3
+        words = byte_windows(buf, s[rows], 8 * nwords).view('<u8')
+        # zero the bytes past the end of each span
+        for j in range(int(n.min()) >> 3, nwords):
+            words[:, j] &= masks[np.clip(n - 8 * j, 0, 8)]
+        weights = (np.arange(1, nwords + 1, dtype=np.uint64) * np.uint64(SPAN_HASH_MULT)) | np.uint64(1)
+        h[rows] = words.view(np.int64) @ weights.view(np.int64) + n
+        spans.append((rows, words))
+    codes = pd.factorize(h)[0]
+    firsts = first_occurrences(codes)
+    rep = firsts[codes]
+    if np.any(length[rep] != length):
+        return None
+    slot = np.empty(len(s), dtype=np.int64)
+    for rows, words in spans:
+        slot[rows] = np.arange(len(words))
+        if not np.array_equal(words[slot[rep[rows]]], words):
+            return None
+    return codes, firsts
+
+# same result as parse_perf_log_chunk without a python loop per line: newline and
+# comma offsets come from numpy scans, the four numeric fields from
+# parse_uint_fields, and the string tail of each line (src_loc, src_caller,
+# inline_loc, inline_caller) gets a code from factorize_byte_spans, so only the
+# first tail of each (version, tail) group is ever decoded. The first four commas
+# must be within the first PERF_LOG_PREFIX bytes of a line. Blocks with anything
+# else (empty or short lines, signs, non-digits, over-long numbers, unknown
+# versions, a hash collision) go to parse_perf_log_chunk.
+PERF_LOG_PREFIX = 32
+
+def parse_perf_log_chunk_columnar(chunk):
+    buf = np.frombuffer(chunk, dtype=np.uint8)
+    ends = np.flatnonzero(buf == ord('\n'))
+    if len(buf) and buf[-1] != ord('\n'):
+        ends = np.append(ends, len(buf))
+    if len(ends) == 0:
+        return new_perf_logs()
+    starts = np.concatenate(([0], ends[:-1] + 1))
+
+    # first four commas of each line
+    rows, cols = np.nonzero(byte_windows(buf, starts, PERF_LOG_PREFIX) == ord(','))
+    count = np.bincount(rows, minlength=len(starts))
+    first = np.cumsum(count) - count
+    if np.any(count < 4):
+        return parse_perf_log_chunk(chunk)
+    commas = [ starts + cols[first + k] for k in range(4) ]
+    # the window may run into the next line
+    if np.any(commas[3] >= ends):
+        return parse_perf_log_chunk(chunk)
+    bounds = [ starts - 1 ] + commas
+    fields = []
+    for k in range(4):
+        fields.append(parse_uint_fields(buf, bounds[k] + 1, bounds[k + 1]))
+        if fields[k] is None:
+            return parse_perf_log_chunk(chunk)
+    version, tripcount, granularity, depth = fields
+    if np.any(version > 2):
+        return parse_perf_log_chunk(chunk)
+
+    tail_start = commas[3] + 1
+    tails = factorize_byte_spans(buf, tail_start, ends)
+    if tails is None:
+        return parse_perf_log_chunk(chunk)
+    group = pd.factorize(tails[0] * 3 + version)[0]
+    firsts = first_occurrences(group)
+    keys = [ (int(version[i]), chunk[s:e].decode('utf-8'))
+             for i, s, e in zip(firsts.tolist(), tail_start[firsts].tolist(), ends[firsts].tolist()) ]
+    return perf_logs_from_columns(group, keys, tripcount, granularity, depth)
+
+# decompressed blocks of ~chunk_size bytes, always cut at a line boundary
+def read_perf_log_chunks(f, chunk_size=1 << 24):
+    while True:
+        chunk = f.read(chunk_size)
+        if not chunk:
+            return
+        if not chunk.endswith(b'\n'):
+            chunk += f.readline()
+        yield chunk
+
+# parse <test>.perf.log.gz into perfLogsDict, with `jobs` worker processes when jobs > 1.
+# Chunks are merged back in log order and at most 2*jobs of them are in flight.
+# resume=(size, offset) parses only what follows the first `size` compressed /
+# `offset` decompressed bytes. Returns perfLogsDict and the decompressed end offset.
+def ingest_perf_log(path, jobs=1, chunk_size=1 << 24, parser=parse_perf_log_chunk_columnar, resume=None):
+    file_size = os.path.getsize(path)
+    perfLogsDict = new_perf_logs()
+    with open(path, 'rb') as raw:
+        start, base, skip = 0, 0, 0
+        if resume is not None:
+            # appended data starts a new gzip member: seek right to it,
+            # otherwise decompress from the top and drop the parsed prefix
+            raw.seek(resume[0])
+            if raw.read(2) == b'\x1f\x8b':
+                start, base = resume
+            else:
+                skip = resume[1]
+            raw.seek(start)
+        with gzip.GzipFile(fileobj=raw, mode='rb') as f, \
+             tqdm(total=file_size - start, desc='Processing', unit='B', unit_scale=True, unit_divisor=1024) as pbar:
+            f.seek(skip)
+            def progress():
+                pbar.update(raw.tell() - start - pbar.n)
+            if jobs <= 1:
+                for chunk in read_perf_log_chunks(f, chunk_size):
+                    merge_perf_logs(perfLogsDict, parser(chunk))
+                    progress()
+                return perfLogsDict, base + f.tell()
+            pool = multiprocessing.Pool(jobs)
+            try:
+                pending = deque()
+                for chunk in read_perf_log_chunks(f, chunk_size):
+                    pending.append(pool.apply_async(parser, (chunk,)))
+                    if len(pending) >= 2 * jobs:
+                        merge_perf_logs(perfLogsDict, pending.popleft().get())
+                    progress()
+                while pending:
+                    merge_perf_logs(perfLogsDict, pending.popleft().get())
+            finally:
+                pool.terminate()
+            return perfLogsDict, base + f.tell()
+
+# flatten perfLogsDict into the .perf.short.json records, in perfLogsDict order
+def flatten_perf_logs(perfLogsDict):
+    perfLogs = []
+    for _, perfLogs_vers in perfLogsDict.items(): 
+        for log in perfLogs_vers.values():
+            log['inline_locs'] = list(log['inline_locs'])
+            log['inline_callers'] = list(log['inline_callers'])
+            log['src_locs'] = list(log['src_locs'])
+            for field in SKETCH_FIELDS:
+                sketch = log[field + '_sketch']
+                sketch['hist'] = [ [b, n] for b, n in sorted(sketch['hist'].items()) ]
+            perfLogs.append(log)
+    return perfLogs
+
+# .perf.short.json records ordered by entry count
+def summarize_perf_logs(perfLogsDict):
+    return sorted(flatten_perf_logs(perfLogsDict), key=lambda js:js['entry'])
+
+# inverse of summarize_perf_logs, for merging more records into a summary
+def perf_logs_from_summary(perfLogs):
+    perfLogsDict = new_perf_logs()
+    for log in perfLogs:
+        log = dict(log)
+        for key in ['src_locs', 'inline_locs', 'inline_callers']:
+            log[key] = dict.fromkeys(log[key])
+        for field in SKETCH_FIELDS:
+            sketch = log.get(field + '_sketch') or new_sketch()
+            log[field + '_sketch'] = {'min': sketch['min'], 'max': sketch['max'], 'hist': dict( (b, n) for b, n in sketch['hist'] )}
+        perfLogsDict[log['version']][log['src_caller']] = log
+    return perfLogsDict
+
+###############################################################################
+# incremental .perf.short.json: {'schema', 'source', 'perfLogs'}
+###############################################################################
+# `source` fingerprints the .perf.log.gz the summary was built from (size, mtime,
+# sha1 of its first and last PERF_LOG_PROBE bytes) and the decompressed offset
+# parsed so far. perfLogs are stored in perfLogsDict order (readers sort by entry)
+# so that merging appended records reproduces a full parse exactly.
+PERF_SUMMARY_SCHEMA = 1
+PERF_LOG_PROBE = 1 << 16
+
+def range_sha1(path, start, size):
+    with open(path, 'rb') as f:
+        f.seek(start)
+        return hashlib.sha1(f.read(size)).hexdigest()
+
+def perf_log_fingerprint(path, offset):
+    st = os.stat(path)
+    probe = min(st.st_size, PERF_LOG_PROBE)
+    return {
+        'size': st.st_size,
+        'mtime_ns': st.st_mtime_ns,
+        'head_sha1': range_sha1(path, 0, probe),
+        'tail_sha1': range_sha1(path, st.st_size - probe, probe),
+        'offset': offset
+    }
+
+# 'fresh', 'grown' (the summarized bytes are untouched and more follow) or 'stale'
+def perf_log_status(source, path):
+    st = os.stat(path)
+    size = source['size']
+    if st.st_size < size:
+        return 'stale'
+    if st.st_size == size and st.st_mtime_ns == source['mtime_ns']:
+        return 'fresh'
+    probe = min(size, PERF_LOG_PROBE)
+    if range_sha1(path, 0, probe) != source['head_sha1'] or range_sha1(path, size - probe, probe) != source['tail_sha1']:
+        return 'stale'
+    return 'fresh' if st.st_size == size else 'grown'
+
+# summary dict, or None when missing/unreadable. Pre-schema summaries (a bare list) have no source.
+def read_perf_summary(path):
+    try:
+        with open(path, 'r') as f:
+            summary = json.load(f)
+    except (IOError, OSError, ValueError):
+        return None
+    if isinstance(summary, list):
+        return {'schema': None, 'source': None, 'perfLogs': summary}
+    return summary
+
+def write_perf_summary(path, summary):
+    tmp_path = '{}.{}.tmp'.format(path, os.getpid())
+    with open(tmp_path, 'w') as f:
+        json.dump(summary, f, indent=2)
+    os.replace(tmp_path, path)
+
+# bring summary_path up to date with log_path and return its records sorted by entry:
+# reuse it when the log is unchanged, parse only the appended part when the log just
+# grew, and rebuild it otherwise. Without the log, whatever summary exists is used.
+def update_perf_summary(summary_path, log_path, jobs=1, parser=parse_perf_log_chunk_columnar):
+    summary = read_perf_summary(summary_path)
+    if summary is not None and not os.path.exists(log_path):
+        return sorted(summary['perfLogs'], key=lambda js:js['entry'])
+    status = 'stale'
+    if summary is not None and summary['schema'] == PERF_SUMMARY_SCHEMA:
+        status = perf_log_status(summary['source'], log_path)
+    if status == 'fresh':
+        return sorted(summary['perfLogs'], key=lambda js:js['entry'])
+
+    if status == 'grown':
+        source = summary['source']
+        print('<!> {} grew by {} bytes, resuming at decompressed offset {}'.format(log_path, os.path.getsize(log_path) - source['size'], source['offset']))
+        perfLogsDict, offset = ingest_perf_log(log_path, jobs=jobs, parser=parser, resume=(source['size'], source['offset']))
+        perfLogsDict = merge_perf_logs(perf_logs_from_summary(summary['perfLogs']), perfLogsDict)
+    else:
+        if summary is not None:
+            print('<!> {} is out of date, rebuilding it'.format(summary_path))
+        perfLogsDict, offset = ingest_perf_log(log_path, jobs=jobs, parser=parser)
+    perfLogs = flatten_perf_logs(perfLogsDict)
+    write_perf_summary(summary_path, {
+        'schema': PERF_SUMMARY_SCHEMA,
+        'source': perf_log_fingerprint(log_path, offset),
+        'perfLogs': perfLogs
+    })
+    return sorted(perfLogs, key=lambda js:js['entry'])
+
+###############################################################################
+# sampled perf log estimates (-PROFILE --sample)
+###############################################################################
+# The log is cut into ~chunk_size blocks and only a fraction of them is parsed,
+# either every 1/fraction-th block from a random start (stride) or each block
+# independently with probability fraction (random). A plain gzip stream can't be
+# entered mid-way, so skipped blocks are still inflated, just never parsed.
+# Each block is a cluster sample: per (version, src_caller), entry counts are
+# scaled up by nblocks/nsampled and mean tripcount/granularity are ratio estimates,
+# both with normal-approximation confidence intervals and finite population correction.
+SAMPLE_Z = 1.96
+
+# --sample: a fraction in (0, 1]
+def sample_fraction(text):
+    fraction = float(text)
+    if not 0 < fraction <= 1:
+        raise argparse.ArgumentTypeError('must be in (0, 1], got {}'.format(text))
+    return fraction
+
+# (estimate, ci half width) of the population total of per-block values x
+def sample_total(x, nblocks):
+    n = len(x)
+    total = nblocks * np.mean(x)
+    if n < 2:
+        return total, float('inf')
+    return total, SAMPLE_Z * nblocks * math.sqrt((1.0 - float(n) / nblocks) * np.var(x, ddof=1) / n)
+
+# (estimate, ci half width) of sum(y) / sum(x) over all blocks. The interval is
+# unknown (inf) below 2 blocks with x > 0: a single one always gives zero residuals.
+def sample_ratio(y, x, nblocks):
+    n = len(x)
+    ratio = np.sum(y) / np.sum(x)
+    if np.count_nonzero(x) < 2:
+        return ratio, float('inf')
+    resid = y - ratio * x
+    return ratio, SAMPLE_Z * math.sqrt((1.0 - float(n) / nblocks) * np.var(resid, ddof=1) / n) / np.mean(x)
+
+# (perfLogs, nsampled, nblocks): perfLogs as summarize_perf_logs but estimated from a
+# sample of the log's blocks (None if no block got sampled); each record carries
+# 'sample': {key: [estimate, ci half width]}
+def sample_perf_log(path, fraction, mode='stride', chunk_size=1 << 20, parser=parse_perf_log_chunk_columnar, seed=None):
+    if not 0 < fraction <= 1:
+        raise ValueError('sample fraction must be in (0, 1], got {}'.format(fraction))
+    import random
+    rng = random.Random(seed)
+    period = max(1, int(round(1.0 / fraction)))
+    phase = rng.randrange(period)
+    samples = []
+    nblocks = 0
+    with open(path, 'rb') as raw, gzip.GzipFile(fileobj=raw, mode='rb') as f:
+        with tqdm(total=os.path.getsize(path), desc='Sampling', unit='B', unit_scale=True, unit_divisor=1024) as pbar:
+            for i, chunk in enumerate(read_perf_log_chunks(f, chunk_size)):
+                nblocks += 1
+                if (i % period == phase) if mode == 'stride' else (rng.random() < fraction):
+                    samples.append(parser(chunk))
+                pbar.update(raw.tell() - pbar.n)
+    if not samples:
+        return None, 0, nblocks
+
+    # per-block totals of every (version, src_caller) seen in the sample
+    keys = {}
+    for perfLogsDict in samples:
+        for version, perfLogs_vers in perfLogsDict.items():
+            for src_caller in perfLogs_vers:
+                keys[(version, src_caller)] = None
+    columns = ['entry', 'ef_entry', 'dac_entry', 'tripcount_sum', 'granularity_sum']
+    blocks = dict( (key, np.zeros((len(columns), len(samples)))) for key in keys )
+    for i, perfLogsDict in enumerate(samples):
+        for version, perfLogs_vers in perfLogsDict.items():
+            for src_caller, log in perfLogs_vers.items():
+                blocks[(version, src_caller)][:, i] = [ log[col] for col in columns ]
+
+    merged = new_perf_logs()
+    for perfLogsDict in samples:
+        merge_perf_logs(merged, perfLogsDict)
+    perfLogs = flatten_perf_logs(merged)
+    for log in perfLogs:
+        x = blocks[(log['version'], log['src_caller'])]
+        sample = dict( (col, sample_total(x[j], nblocks)) for j, col in enumerate(columns[:3]) )
+        sample['tripcount_mean'] = sample_ratio(x[3], x[0], nblocks)
+        sample['granularity_mean'] = sample_ratio(x[4], x[0], nblocks)
+        for col in columns[:3]:
+            log[col] = int(round(sample[col][0]))
+        log['tripcount_sum'] = sample['tripcount_mean'][0] * log['entry']
+        log['granularity_sum'] = sample['granularity_mean'][0] * log['entry']
+        log['sample'] = dict( (key, [float(est), float(ci)]) for key, (est, ci) in sample.items() )
+    return sorted(perfLogs, key=lambda js:js['entry']), len(samples), nblocks
+
+###############################################################################
+# parlaytime / icache logs: data/<test>/<id>.{parlaytime,icache}.{orig,test}.*
+###############################################################################
+# prr.sh writes one '== CILK_WORKERS = <n> ===...' section per worker count
+# (again per round in multi-round logs). Both logs are read line by line,
+# samples go into typed arrays per worker count, and each frame is built once.
+CILK_WORKERS_PATTERN = re.compile(r'CILK_WORKERS\s*=\s*(\d+)')
+PARLAY_TIME_PATTERN = re.compile(r'\d+.\d+')
+
+# CILK_WORKERS -> array('d') of its 'Parlay time: ' samples, in log order
+def read_parlaytime_samples(lines):
+    samples = {}
+    times = None
+    for line in lines:
+        if line.startswith('== CILK_WORKERS = '):
+            times = samples.setdefault(int(CILK_WORKERS_PATTERN.search(line).group(1)), array('d'))
+        elif line.startswith('Parlay time: ') and times is not None:
+            times.append(float(PARLAY_TIME_PATTERN.search(line).group(0)))
+    return samples
+
+# (df, r): avg/std parlaytime per cilk_workers, and the most repetitions of any worker count
+def parlaytime_frame(samples):
+    df = pd.DataFrame({
+        'cilk_workers': np.array(list(samples), dtype=np.int64),
+        'avg_parlaytime': np.array([ np.mean(times) if len(times) else np.nan for times in samples.values() ]),
+        'std_parlaytime': np.array([ np.std(times, ddof=1) if len(times) > 1 else np.nan for times in samples.values() ])
+    }, columns=['cilk_workers', 'avg_parlaytime', 'std_parlaytime'])
+    return df, max([ len(times) for times in samples.values() ] or [0])
+
+###############################################################################
+# perf stat counters: data/<test>/<id>.icache.{orig,test}.txt
+###############################################################################
+# any events perf stat printed per CILK_WORKERS section, e.g.
+#        3,890,574      icache.misses:u                        (66.67%)
+#    <not counted>      LLC-load-misses:u                       (0.00%)
+#         2,345.67 msec task-clock:u       #    0.999 CPUs utilized
+#    149.594716155 seconds time elapsed
+# Event names drop their :u/:k modifiers; counts of repeated sections add up.
+# Uncounted or unsupported events are NaN, and <event>.multiplex keeps the
+# smallest share of time an event was actually counted when that's under 100%.
+PERF_STAT_LINE = re.compile(r'^\s*(?P<value>\d[\d,]*(?:\.\d+)?|<not counted>|<not supported>)\s+(?:(?P<unit>msec|seconds)\s+)?(?P<event>\S+)(?P<rest>.*)$')
+PERF_STAT_MULTIPLEX = re.compile(r'\((\d+(?:\.\d+)?)%\)\s*$')
+# (misses, accesses, accesses also counted as hits only)
+PERF_STAT_MISS_RATES = [
+    ('icache.misses', 'icache.hit', True),
+    ('L1-icache-load-misses', 'L1-icache-loads', False),
+    ('L1-dcache-load-misses', 'L1-dcache-loads', False),
+    ('LLC-load-misses', 'LLC-loads', False),
+    ('LLC-store-misses', 'LLC-stores', False),
+    ('cache-misses', 'cache-references', False),
+    ('branch-misses', 'branches', False),
+    ('dTLB-load-misses', 'dTLB-loads', False),
+    ('dTLB-store-misses', 'dTLB-stores', False),
+    ('iTLB-load-misses', 'iTLB-loads', False),
+]
+
+# CILK_WORKERS -> {event: [count, multiplex %]} of its perf stat sections
+def read_perf_stat(lines):
+    stats = {}
+    section = None
+    for line in lines:
+        if line.startswith('== '):
+            m = CILK_WORKERS_PATTERN.search(line)
+            if m:
+                section = stats.setdefault(int(m.group(1)), {})
+            continue
+        m = PERF_STAT_LINE.match(line) if section is not None else None
+        if not m:
+            continue
+        if m.group('unit') == 'seconds':
+            event = '_'.join(('seconds ' + m.group('event') + m.group('rest')).split())
+        else:
+            event = re.sub(r':[ukhHGp]+$', '', m.group('event'))
+        value = m.group('value')
+        value = np.nan if value.startswith('<') else float(value.replace(',', ''))
+        multiplex = PERF_STAT_MULTIPLEX.search(m.group('rest'))
+        multiplex = float(multiplex.group(1)) if multiplex else 100.0
+        merge_perf_stat_counter(section, event, value, multiplex)
+    return stats
+
+def merge_perf_stat_counter(section, event, value, multiplex):
+    if event in section:
+        section[event][0] += value
+        section[event][1] = min(section[event][1], multiplex)
+    else:
+        section[event] = [value, multiplex]
+
+# stats with every counter of a worker count divided by rounds[cilk_workers],
+# e.g. the rounds its sections ran, so that builds run a different number of
+# rounds compare per round
+def perf_stat_per_round(stats, rounds):
+    return dict( (cilk_workers, dict( (event, [value / rounds[cilk_workers] if rounds.get(cilk_workers) else float('nan'), multiplex])
+                                      for event, (value, multiplex) in section.items() ))
+                 for cilk_workers, section in stats.items() )
+
+# fold the perf stat sections of `other` into stats
+def merge_perf_stat(stats, other):
+    for cilk_workers, other_section in other.items():
+        section = stats.setdefault(cilk_workers, {})
+        for event, (value, multiplex) in other_section.items():
+            merge_perf_stat_counter(section, event, value, multiplex)
+    return stats
+
+# cilk_workers, every event, its multiplexing where partial, and derived metrics:
+# ipc, <misses>.mpki per thousand instructions and <misses>.miss_rate
+def perf_stat_frame(stats):
+    events = []
+    for section in stats.values():
+        events += [ event for event in section if event not in events ]
+    df = pd.DataFrame({'cilk_workers': np.array(list(stats), dtype=np.int64)})
+    for event in events:
+        df[event] = np.array([ section.get(event, [np.nan])[0] for section in stats.values() ], dtype=np.float64)
+        multiplex = np.array([ section.get(event, [0, 100.0])[1] for section in stats.values() ])
+        if (multiplex < 100).any():
+            df[event + '.multiplex'] = multiplex
+    with np.errstate(divide='ignore', invalid='ignore'):
+        if 'instructions' in df and 'cycles' in df:
+            df['ipc'] = df['instructions'] / df['cycles']
+        for event in events:
+            if 'instructions' in df and (event.endswith('-misses') or event.endswith('.misses')):
+                df[event + '.mpki'] = 1000 * df[event] / df['instructions']
+        for misses, accesses, hits_only in PERF_STAT_MISS_RATES:
+            if misses in df and accesses in df:
+                df[misses.replace('-misses', '').replace('.misses', '') + '.miss_rate'] = df[misses] / (df[accesses] + df[misses] if hits_only else df[accesses])
+    return df
+
+# the icache.csv columns out of perf stat counters. Counts per round are fractional
+# and <not counted> ones NaN, so they are rounded into nullable Int64 columns.
+def icache_frame(stats):
+    misses = np.array([ section['icache.misses'][0] for section in stats.values() ], dtype=np.float64)
+    hits = np.array([ section['icache.hit'][0] for section in stats.values() ], dtype=np.float64)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        miss_rate = misses / (misses + hits)
+    return pd.DataFrame({
+        'cilk_workers': np.array(list(stats), dtype=np.int64),
+        'i$_miss': pd.array(np.round(misses), dtype='Int64'),
+        'i$_hit': pd.array(np.round(hits), dtype='Int64'),
+        'i$_miss_rate': miss_rate
+    }, columns=['cilk_workers', 'i$_miss', 'i$_hit', 'i$_miss_rate'])
+
+###############################################################################
+# orig vs test statistics on raw 'Parlay time:' samples
+###############################################################################
+# Per worker count: outliers (modified z-score of Iglewicz & Hoaglin above
+# OUTLIER_Z) are dropped, the speedup orig/test of mean parlaytime gets a
+# percentile bootstrap confidence interval, and a two-sided Mann-Whitney U test
+# (normal approximation with tie correction) checks the two samples differ.
+# Only a significant test whose interval excludes 1 counts as a win or loss.
+OUTLIER_Z = 3.5
+BOOTSTRAP_ROUNDS = 10000
+
+# (kept samples, number of outliers dropped)
+def drop_outliers(times):
+    times = np.asarray(times, dtype=np.float64)
+    median = np.median(times)
+    mad = np.median(np.abs(times - median))
+    if mad == 0:
+        return times, 0
+    keep = 0.6745 * np.abs(times - median) / mad <= OUTLIER_Z
+    return times[keep], int(len(times) - keep.sum())
+
+# two-sided p-value of the Mann-Whitney U test between samples a and b
+def mann_whitney_p(a, b):
+    n1, n2 = len(a), len(b)
+    ranks = pd.Series(np.concatenate([a, b])).rank().values
+    u = ranks[:n1].sum() - n1 * (n1 + 1) / 2.0
+    _, ties = np.unique(np.concatenate([a, b]), return_counts=True)
+    n = n1 + n2
+    var = n1 * n2 / 12.0 * ((n + 1) - (ties ** 3 - ties).sum() / float(n * (n - 1)))
+    if var <= 0:
+        return 1.0
+    z = (abs(u - n1 * n2 / 2.0) - 0.5) / math.sqrt(var)
+    return min(1.0, math.erfc(max(z, 0.0) / math.sqrt(2)))
+
+# (lo, hi) percentile bootstrap interval of mean(orig) / mean(test)
+def bootstrap_speedup(orig, test, confidence=0.95, rounds=BOOTSTRAP_ROUNDS, rng=None):
+    rng = rng or np.random.RandomState()
+    orig_means = orig[rng.randint(0, len(orig), size=(rounds, len(orig)))].mean(axis=1)
+    test_means = test[rng.randint(0, len(test), size=(rounds, len(test)))].mean(axis=1)
+    tail = (1.0 - confidence) / 2 * 100
+    lo, hi = np.percentile(orig_means / test_means, [tail, 100 - tail])
+    return float(lo), float(hi)
+
+# one row per worker count both builds ran with: speedup, its ci, p-value and verdict
+def compare_parlaytime_samples(samples_orig, samples_test, alpha=0.05, seed=None):
+    rng = np.random.RandomState(seed)
+    rows = []
+    for cilk_workers in samples_orig:
+        if cilk_workers not in samples_test:
+            continue
+        orig, outliers_orig = drop_outliers(samples_orig[cilk_workers])
+        test, outliers_test = drop_outliers(samples_test[cilk_workers])
+        row = {
+            'cilk_workers': cilk_workers,
+            'n_orig': len(orig),
+            'n_test': len(test),
+            'outliers_orig': outliers_orig,
+            'outliers_test': outliers_test,
+            'speedup': np.nan, 'speedup_lo': np.nan, 'speedup_hi': np.nan, 'p_value': np.nan,
+            'verdict': 'noise'
+        }
+        if len(orig) > 1 and len(test) > 1:
+            row['speedup'] = orig.mean() / test.mean()
+            row['speedup_lo'], row['speedup_hi'] = bootstrap_speedup(orig, test, confidence=1 - alpha, rng=rng)
+            row['p_value'] = mann_whitney_p(orig, test)
+            if row['p_value'] < alpha and row['speedup_lo'] > 1:
+                row['verdict'] = 'win'
+            elif row['p_value'] < alpha and row['speedup_hi'] < 1:
+                row['verdict'] = 'loss'
+        rows.append(row)
+    return pd.DataFrame(rows, columns=['cilk_workers', 'n_orig', 'n_test', 'outliers_orig', 'outliers_test',
+                                       'speedup', 'speedup_lo', 'speedup_hi', 'p_value', 'verdict'])
+
+###############################################################################
+# results store: every parlaytime/icache experiment in one sqlite db
+###############################################################################
+# Rows are keyed by (test, experiment_id, ece, build, cilk_workers) with build
+# 'orig' or 'test', and belong to the result file they came from: re-ingesting a
+# file replaces its rows and files with unchanged size/mtime are skipped, so the
+# store can be refreshed from all of perf/ at any time. icache counts carry their
+# unit: 'process' for the i$_miss/i$_hit totals of a whole prr.sh process in older
+# csvs, 'round' for the i$_miss_per_round/i$_hit_per_round columns written now.
+STORE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS sources (path TEXT PRIMARY KEY, size INTEGER, mtime_ns INTEGER);
+CREATE TABLE IF NOT EXISTS parlaytime (test TEXT, experiment_id TEXT, ece INTEGER, build TEXT, cilk_workers INTEGER,
+                                       repeats INTEGER, avg_parlaytime REAL, std_parlaytime REAL, source TEXT);
+CREATE TABLE IF NOT EXISTS icache (test TEXT, experiment_id TEXT, ece INTEGER, build TEXT, cilk_workers INTEGER,
+                                   icache_misses INTEGER, icache_hits INTEGER, icache_miss_rate REAL, source TEXT, unit TEXT);
+CREATE INDEX IF NOT EXISTS parlaytime_key ON parlaytime (test, ece, experiment_id, build, cilk_workers);
+CREATE INDEX IF NOT EXISTS parlaytime_source ON parlaytime (source);
+CREATE INDEX IF NOT EXISTS icache_key ON icache (test, ece, experiment_id, build, cilk_workers);
+CREATE INDEX IF NOT EXISTS icache_source ON icache (source);
+"""
+STORE_BUILDS = ['orig', 'test']
+# perf/<test>/<id>.ece<N>.r<R>.{perf,parlay,icache}.csv, written by -PARLAY
+RESULT_CSV_PATTERN = re.compile(r'^(?P<id>.+)\.ece(?P<ece>\d+)\.r(?P<r>\d+)\.(?P<kind>perf|parlay|icache)\.csv$')
+# older <test>.perf[.-]<workers>.csv summaries at the top level, without id or machine
+LEGACY_CSV_PATTERN = re.compile(r'^(?P<test>[^.-]+)\.(?P<id>perf(?:[.-].+)?)\.csv$')
+
+def store_path(args):
+    return args.store or os.path.join(basedir, 'perf', 'results.sqlite')
+
+def open_store(path):
+    import sqlite3
+    conn = sqlite3.connect(path)
+    conn.executescript(STORE_SCHEMA)
+    # a store from before icache units: drop its icache rows so they get re-ingested
+    if 'unit' not in [ col[1] for col in conn.execute('PRAGMA table_info(icache)') ]:
+        conn.execute('ALTER TABLE icache ADD COLUMN unit TEXT')
+        conn.execute('DELETE FROM sources WHERE path IN (SELECT source FROM icache)')
+        conn.execute('DELETE FROM icache')
+        conn.commit()
+    return conn
 
-    # check all instrument ID's are in analysis result 
-    weird_ids = { id for id in lazyd_instrument if id not in static_analysis }
-    if (len(weird_ids) > 0):
-        print("There are {} weird instrument entries: ".format(len(weird_ids)))
-        print('\n'.join([json.dumps(lazyd_instrument[id], indent=2) for id in weird_ids]))
+# (test, experiment_id, ece, repeats, kind) of a result csv, None if it isn't one
+def result_csv_key(path):
+    name = os.path.basename(path)
+    m = RESULT_CSV_PATTERN.match(name)
+    if m:
+        kind = 'icache' if m.group('kind') == 'icache' else 'parlaytime'
+        return os.path.basename(os.path.dirname(os.path.abspath(path))), m.group('id'), int(m.group('ece')), int(m.group('r')), kind
+    m = LEGACY_CSV_PATTERN.match(name)
+    if m:
+        return m.group('test'), m.group('id'), None, None, 'parlaytime'
+    return None
+
+# float columns of a result csv row, None when absent or empty
+def csv_float(row, col):
+    value = row.get(col)
+    return float(value) if value not in (None, '') else None
+
+# (re)load the rows of one result csv; False if it is already up to date
+def store_ingest_csv(conn, path, force=False):
+    path = os.path.abspath(path)
+    test, experiment_id, ece, repeats, kind = result_csv_key(path)
+    st = os.stat(path)
+    known = conn.execute('SELECT size, mtime_ns FROM sources WHERE path = ?', (path,)).fetchone()
+    if not force and known == (st.st_size, st.st_mtime_ns):
+        return False
+    conn.execute('DELETE FROM parlaytime WHERE source = ?', (path,))
+    conn.execute('DELETE FROM icache WHERE source = ?', (path,))
+    with open(path, 'r') as f:
+        reader = csv.DictReader(f)
+        rows = list(reader)
+    unit, counts = ('round', '_per_round_') if 'i$_miss_per_round_orig' in (reader.fieldnames or []) else ('process', '_')
+    for row in rows:
+        cilk_workers = int(float(row['cilk_workers']))
+        for build in STORE_BUILDS:
+            if kind == 'parlaytime':
+                conn.execute('INSERT INTO parlaytime VALUES (?,?,?,?,?,?,?,?,?)',
+                             (test, experiment_id, ece, build, cilk_workers, repeats,
+                              csv_float(row, 'avg_parlaytime_' + build), csv_float(row, 'std_parlaytime_' + build), path))
+            else:
+                # <not counted> counters are empty cells, stored as NULL
+                misses, hits = [ None if value is None else int(round(value))
+                                 for value in [csv_float(row, 'i$_miss' + counts + build), csv_float(row, 'i$_hit' + counts + build)] ]
+                conn.execute('INSERT INTO icache (test, experiment_id, ece, build, cilk_workers, icache_misses, icache_hits, '
+                             'icache_miss_rate, source, unit) VALUES (?,?,?,?,?,?,?,?,?,?)',
+                             (test, experiment_id, ece, build, cilk_workers,
+                              misses, hits, csv_float(row, 'i$_miss_rate_' + build), path, unit))
+    conn.execute('INSERT OR REPLACE INTO sources VALUES (?,?,?)', (path, st.st_size, st.st_mtime_ns))
+    return True
+
+# (test, sorted (cilk_workers, avg_parlaytime_orig, avg_parlaytime_test)) of a
+# parlaytime result csv: the same run saved under two names has the same one
+def parlaytime_fingerprint(path):
+    with open(path, 'r') as f:
+        rows = [ tuple( round(csv_float(row, col) or 0.0, 9) for col in ['cilk_workers', 'avg_parlaytime_orig', 'avg_parlaytime_test'] )
+                 for row in csv.DictReader(f) ]
+    return result_csv_key(path)[0], tuple(sorted(rows))
+
+# ingest every result csv under perf/<test>/ and the top-level <test>.perf*.csv.
+# A top-level csv with the same parlaytimes as a perf/ run or an earlier top-level
+# csv (wordCounts.perf.csv is a copy of wordCounts.perf-1-16-32.csv) is skipped,
+# and dropped from the store, so that no run is counted twice
+def store_ingest_all(conn, base, tests=None):
+    paths = []
+    perf_dir = os.path.join(base, 'perf')
+    for test in sorted(os.listdir(perf_dir)) if os.path.isdir(perf_dir) else []:
+        if os.path.isdir(os.path.join(perf_dir, test)) and (tests is None or test in tests):
+            paths += [ os.path.join(perf_dir, test, name) for name in sorted(os.listdir(os.path.join(perf_dir, test))) ]
+    legacy = [ os.path.join(base, name) for name in sorted(os.listdir(base)) if LEGACY_CSV_PATTERN.match(name) ]
+    # <test>.perf-1-16-32.csv ahead of a plain <test>.perf.csv copy of it
+    legacy.sort(key=lambda path: LEGACY_CSV_PATTERN.match(os.path.basename(path)).group('id') == 'perf')
+    paths = [ path for path in paths + legacy if result_csv_key(path) and (tests is None or result_csv_key(path)[0] in tests) ]
+    seen = {}
+    ingested = 0
+    for path in paths:
+        if result_csv_key(path)[4] == 'parlaytime':
+            fingerprint = parlaytime_fingerprint(path)
+            if fingerprint in seen and path in legacy:
+                print('<!> skipped {}: same results as {}'.format(path, seen[fingerprint]))
+                for table in ['parlaytime', 'icache']:
+                    conn.execute('DELETE FROM {} WHERE source = ?'.format(table), (os.path.abspath(path),))
+                conn.execute('DELETE FROM sources WHERE path = ?', (os.path.abspath(path),))
+                continue
+            seen.setdefault(fingerprint, path)
+        ingested += store_ingest_csv(conn, path)
+    conn.commit()
+    return ingested, len(paths)
+
+# test over orig speedup per experiment and cilk_workers, optionally on one ece machine
+def store_speedup(conn, test, ece=None):
+    query = """
+        SELECT o.experiment_id, o.ece, o.cilk_workers, o.repeats,
+               o.avg_parlaytime AS avg_parlaytime_orig, t.avg_parlaytime AS avg_parlaytime_test,
+               o.avg_parlaytime / t.avg_parlaytime AS speedup
+        FROM parlaytime o JOIN parlaytime t
+          ON o.source = t.source AND o.cilk_workers = t.cilk_workers AND o.build = 'orig' AND t.build = 'test'
+        WHERE o.test = ? {}
+        ORDER BY o.experiment_id, o.cilk_workers
+    """.format('AND o.ece = ?' if ece is not None else '')
+    return pd.read_sql_query(query, conn, params=(test, int(ece)) if ece is not None else (test,))
+
+def queryResultStore(args, test=None):
+    conn = open_store(store_path(args))
+    try:
+        if args.store_ingest:
+            ingested, total = store_ingest_all(conn, basedir, tests=[test] if test else None)
+            print('<< ingested {} of {} result files into {}'.format(ingested, total, store_path(args)))
+        if args.speedup:
+            if not test:
+                print("Must supply test name for speedup query!")
+                exit(1)
+            df = store_speedup(conn, test, ece=args.ece)
+            if df.empty:
+                print('no {} results{} in {}'.format(test, ' on ece{}'.format(args.ece) if args.ece else '', store_path(args)))
+                return
+            print(df.to_string(index=False))
+            # geometric mean over all runs per worker count
+            summary = df.groupby('cilk_workers')['speedup'].agg(lambda x: float(np.exp(np.log(x).mean()))).rename('geomean_speedup')
+            print('\n-- {} test over orig{}, {} runs:'.format(test, ' on ece{}'.format(args.ece) if args.ece else '', df['experiment_id'].nunique()))
+            print(summary.to_frame().reset_index().to_string(index=False))
+    finally:
+        conn.close()
+
+###############################################################################
+# scalability report from the results store
+###############################################################################
+# Per run (experiment_id, ece) and build: speedup over its own and over orig's
+# 1-worker time, efficiency, Karp-Flatt experimentally determined serial fraction
+# e = (1/S - 1/p) / (1 - 1/p), and the worker count where scaling flattens, i.e.
+# where the speedup grows by less than FLATTEN_EXPONENT of the step in workers
+# on a log-log scale. Where icache counts exist, the miss rate is correlated with
+# efficiency and serial fraction across worker counts.
+FLATTEN_EXPONENT = 0.5
+
+def store_scaling_runs(conn, test, ece=None):
+    query = """
+        SELECT p.experiment_id, p.ece, p.build, p.cilk_workers, p.avg_parlaytime, i.icache_miss_rate
+        FROM parlaytime p LEFT JOIN icache i
+          ON i.test = p.test AND i.experiment_id = p.experiment_id AND i.ece IS p.ece
+         AND i.build = p.build AND i.cilk_workers = p.cilk_workers
+        WHERE p.test = ? {}
+        ORDER BY p.experiment_id, p.build, p.cilk_workers
+    """.format('AND p.ece = ?' if ece is not None else '')
+    return pd.read_sql_query(query, conn, params=(test, int(ece)) if ece is not None else (test,))
+
+# scaling columns for the rows of one run
+def scaling_metrics(run):
+    run = run.sort_values(['build', 'cilk_workers']).copy()
+    t1 = run[run['cilk_workers'] == 1].set_index('build')['avg_parlaytime']
+    workers = run['cilk_workers'].astype(np.float64)
+    run['speedup_self'] = run['build'].map(t1) / run['avg_parlaytime']
+    run['speedup_orig'] = t1.get('orig', np.nan) / run['avg_parlaytime']
+    run['efficiency'] = run['speedup_self'] / workers
+    with np.errstate(divide='ignore', invalid='ignore'):
+        run['karp_flatt'] = np.where(workers > 1, (1 / run['speedup_self'] - 1 / workers) / (1 - 1 / workers), np.nan)
+    return run
+
+# first worker count at which scaling flattens, None if it never does
+def flattening_point(rows):
+    workers, speedup = rows['cilk_workers'].values, rows['speedup_self'].values
+    for k in range(1, len(workers)):
+        if np.log(speedup[k] / speedup[k - 1]) / np.log(float(workers[k]) / workers[k - 1]) < FLATTEN_EXPONENT:
+            return int(workers[k])
+    return None
+
+# pearson correlation over the rows where both columns are known, NaN under 3 points
+def column_corr(rows, a, b):
+    both = rows[[a, b]].dropna()
+    if len(both) < 3 or both[a].std() == 0 or both[b].std() == 0:
+        return np.nan
+    return float(np.corrcoef(both[a], both[b])[0, 1])
+
+def scalabilityReport(args, test=None):
+    if not test:
+        print("Must supply test name for scalability report!")
         exit(1)
-    
-    # correctness: instrumentation's dac/def counts must coincide with static result's prr
-    for id, jsInstr in lazyd_instrument.items():
-        jsStatic = static_analysis[id]
-        if jsStatic['prr'] == 'defef':
-            assert(jsInstr['dac'] == 0)
-        elif jsStatic['prr'] == 'defdac':
-            assert(jsInstr['ef'] == 0)
-        elif jsStatic['prr'] == 'both':
+    conn = open_store(store_path(args))
+    try:
+        store_ingest_all(conn, basedir, tests=[test])
+        conn.commit()
+        runs = store_scaling_runs(conn, test, ece=args.ece)
+    finally:
+        conn.close()
+    if runs.empty:
+        print('no {} results in {}'.format(test, store_path(args)))
+        return
+
+    reports = []
+    for (experiment_id, ece), run in runs.groupby(['experiment_id', 'ece'], dropna=False, sort=False):
+        run = scaling_metrics(run)
+        reports.append(run)
+        print('\n-- {} {}{}:'.format(test, experiment_id, '' if pd.isnull(ece) else ' ece{}'.format(int(ece))))
+        print(run.drop(columns=['experiment_id', 'ece']).to_string(index=False, float_format=lambda x: '{:.4f}'.format(x)))
+        for build, rows in run.groupby('build', sort=False):
+            best = rows.loc[rows['speedup_self'].idxmax()] if rows['speedup_self'].notnull().any() else None
+            print('\t<{}> max speedup {} at {} workers, flattens at {}, corr(i$ miss rate, efficiency)={:.2f} corr(i$ miss rate, karp-flatt)={:.2f}'.format(
+                build,
+                '{:.2f}'.format(best['speedup_self']) if best is not None else '-',
+                int(best['cilk_workers']) if best is not None else '-',
+                flattening_point(rows) or '-',
+                column_corr(rows, 'icache_miss_rate', 'efficiency'),
+                column_corr(rows, 'icache_miss_rate', 'karp_flatt')))
+
+    report_path = os.path.join(basedir, r'perf/{}/{}.scalability.csv'.format(test, test))
+    print("write scalability report to --> {}".format(report_path))
+    pd.concat(reports).to_csv(report_path, index=False)
+
+###############################################################################
+# static analysis (<test>.cilkfor.json) vs instrumentation (<test>.instr.json)
+###############################################################################
+# One keyed pass over both files puts every cilkfor ID in one class:
+#   mismatch-defef-dac    static defef, but instrumented dac callsites
+#   mismatch-defdac-ef    static defdac, but instrumented ef callsites
+#   instr-only            instrumented, but not in the static results
+#   overconservative-ef   static both, only ef callsites
+#   overconservative-dac  static both, only dac callsites
+#   accurate-both         static both, ef and dac callsites
+#   unreached-both        static both, no callsites
+#   accurate-ef, accurate-dac, untouched, static-only (not instrumented)
+# The first three are inconsistencies, as are IDs listed twice in either file.
+CONSISTENCY_ERRORS = ['mismatch-defef-dac', 'mismatch-defdac-ef', 'instr-only']
+CONSISTENCY_CLASSES = CONSISTENCY_ERRORS + ['overconservative-ef', 'overconservative-dac', 'accurate-both', 'unreached-both',
+                                            'accurate-ef', 'accurate-dac', 'untouched', 'static-only']
+
+def consistency_class(prr, ef, dac):
+    if prr is None:
+        return 'instr-only'
+    if prr == 'defef':
+        return 'mismatch-defef-dac' if dac > 0 else 'accurate-ef'
+    if prr == 'defdac':
+        return 'mismatch-defdac-ef' if ef > 0 else 'accurate-dac'
+    if prr == 'both':
+        if ef > 0 and dac > 0:
+            return 'accurate-both'
+        return 'overconservative-ef' if ef > 0 else 'overconservative-dac' if dac > 0 else 'unreached-both'
+    return 'untouched'
+
+# (instr records with the static prr added, in instr order, and the report).
+# A duplicated ID keeps the place of its first entry and the value of its last,
+# as the ID -> json dicts did, and is listed under 'duplicates'
+def join_static_instr(static_json, instr_json):
+    static_prr = {}
+    duplicates = {'static': [], 'instr': []}
+    for js in static_json:
+        if js['ID'] in static_prr:
+            duplicates['static'].append(js['ID'])
+        static_prr[js['ID']] = js['prr']
+    prr_counts = Counter(static_prr.values())
+    instr = {}
+    for js in instr_json:
+        if js['ID'] in instr:
+            duplicates['instr'].append(js['ID'])
+        instr[js['ID']] = js
+    classes = dict( (cls, []) for cls in CONSISTENCY_CLASSES )
+    combined, seen = [], set()
+    for js in instr.values():
+        seen.add(js['ID'])
+        prr = static_prr.get(js['ID'])
+        classes[consistency_class(prr, js['ef'], js['dac'])].append(js['ID'])
+        if prr is not None:
+            js['prr'] = prr
+            combined.append(js)
+    classes['static-only'] = [ ID for ID in static_prr if ID not in seen ]
+    report = {
+        'static': dict(prr_counts),
+        'instrumented': len(seen),
+        'counts': dict( (cls, len(ids)) for cls, ids in classes.items() ),
+        'errors': sum( len(classes[cls]) for cls in CONSISTENCY_ERRORS ) + len(duplicates['static']) + len(duplicates['instr']),
+        'duplicates': duplicates,
+        'classes': classes
+    }
+    return combined, report
+
+###############################################################################
+# linked IR index: <exe>Link-pr.ll
+###############################################################################
+# One pass over the memory-mapped .ll records, per define, its byte range, its
+# !dbg attachment and the offset of every basic-block label (CSR like the call
+# graph), plus the offset of every `!N = ` metadata line. The index goes to
+# <ll>.cache, so showing a function or a block later reads just those bytes.
+LL_DEFINE_PATTERN = re.compile(rb'^define [^\n]*?@("(?:[^"\\]|\\.)*"|[-\w.$]+)\(', re.M)
+LL_LABEL_PATTERN = re.compile(rb'^("(?:[^"\\]|\\.)*"|[-\w.$]+):', re.M)
+LL_DBG_PATTERN = re.compile(rb'!dbg !(\d+)')
+LL_METADATA_PATTERN = re.compile(rb'^!(\d+) = ', re.M)
+
+def ll_name(raw):
+    return raw[1:-1].decode('utf-8') if raw.startswith(b'"') else raw.decode('utf-8')
+
+class IRIndex(object):
+    CACHE_COLUMNS = ['func_start', 'func_end', 'func_dbg', 'block_offsets', 'block_start', 'md_ids', 'md_start']
+
+    def __init__(self, path):
+        self.path = path
+        self.func_start, self.func_end, self.func_dbg = array('q'), array('q'), array('q')
+        self.block_offsets, self.block_start = array('q', [0]), array('q')
+        self.md_ids, self.md_start = array('q'), array('q')
+        funcs, blocks = StringTable(), []
+        with open(path, 'rb') as f:
+            mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        with mm:
+            end = 0
+            for m in LL_DEFINE_PATTERN.finditer(mm):
+                start = m.start()
+                if start < end:
+                    continue
+                end = mm.find(b'\n}\n', start)
+                end = len(mm) if end < 0 else end + 3
+                body = mm.find(b'\n', start) + 1
+                funcs.intern(ll_name(m.group(1)))
+                self.func_start.append(start)
+                self.func_end.append(end)
+                dbg = LL_DBG_PATTERN.search(mm, m.end(), body)
+                self.func_dbg.append(int(dbg.group(1)) if dbg else -1)
+                for label in LL_LABEL_PATTERN.finditer(mm, body, end):
+                    blocks.append(ll_name(label.group(1)))
+                    self.block_start.append(label.start())
+                self.block_offsets.append(len(self.block_start))
+            for m in LL_METADATA_PATTERN.finditer(mm, end):
+                self.md_ids.append(int(m.group(1)))
+                self.md_start.append(m.start())
+        self.funcs = funcs
+        self.blocks = StringTable()
+        self.blocks.strings = blocks
+
+    @classmethod
+    def load(cls, path, cache=True):
+        if cache:
+            cached = read_cache(path, [path])
+            if cached is not None:
+                meta, sections = cached
+                index = cls.__new__(cls)
+                index.path = path
+                for col in cls.CACHE_COLUMNS:
+                    setattr(index, col, sections[col])
+                index.funcs = MappedStringTable('funcs', sections)
+                index.blocks = MappedStringTable('blocks', sections)
+                return index
+        index = cls(path)
+        if cache:
+            sections = { col: getattr(index, col) for col in cls.CACHE_COLUMNS }
+            sections.update(string_table_sections('funcs', index.funcs.strings))
+            sections.update(string_table_sections('blocks', index.blocks.strings))
+            write_cache(path, [path], {}, sections)
+        return index
+
+    def __len__(self):
+        return len(self.func_start)
+
+    def read(self, start, end):
+        with open(self.path, 'rb') as f:
+            f.seek(start)
+            return f.read(end - start).decode('utf-8')
+
+    def lookup(self, func_name):
+        return self.funcs.ids.get(func_name)
+
+    # [(label, offset)] of function f, in IR order
+    def block_labels(self, f):
+        return [ (self.blocks.strings[b], self.block_start[b]) for b in range(self.block_offsets[f], self.block_offsets[f + 1]) ]
+
+    def function_ir(self, f):
+        return self.read(self.func_start[f], self.func_end[f])
+
+    # the block's label line up to the next label (or the closing brace)
+    def block_ir(self, f, label):
+        labels = self.block_labels(f)
+        for i, (name, start) in enumerate(labels):
+            if name == label:
+                if i + 1 < len(labels):
+                    return self.read(start, labels[i + 1][1])
+                # func_end is past the function's '}' line
+                ir = self.read(start, self.func_end[f])
+                return ir[:-2] if ir.endswith('\n}\n') else ir
+        return None
+
+    # `!N = ...` line of the function's !dbg attachment, if any
+    def dbg_ir(self, f):
+        md = self.func_dbg[f]
+        i = bisect_left(self.md_ids, md) if md >= 0 else len(self.md_ids)
+        if i == len(self.md_ids) or self.md_ids[i] != md:
+            return None
+        start = self.md_start[i]
+        return self.read(start, start + 4096).split('\n', 1)[0]
+
+# default <exe>Link-pr.ll of a test: the .ll and its analysis tables sit in a
+# variant dir of the -cp (else -test) tree, e.g. wordCounts-cp/histogramStar,
+# not in BENCHMARKS' dir. The first one found, with a warning if there are others
+def ll_path(args, test):
+    if args.ll:
+        return args.ll
+    name = '{}Link-pr.ll'.format(BENCHMARKS[test]['exe'])
+    found = []
+    for tree in ['cp', 'test']:
+        tree_dir = os.path.join(basedir, '{}-{}'.format(test, tree))
+        variants = sorted(os.listdir(tree_dir)) if os.path.isdir(tree_dir) else []
+        # BENCHMARKS' dir first when it has one
+        variants.sort(key=lambda variant: variant != BENCHMARKS[test]['dir'])
+        found += [ os.path.join(tree_dir, variant, name) for variant in variants if os.path.isfile(os.path.join(tree_dir, variant, name)) ]
+    if not found:
+        return os.path.join(benchmark_dir(test, 'cp'), name)
+    if len(found) > 1:
+        print('<!> using {} (also: {}; pick one with --ll)'.format(found[0], ' '.join(found[1:])))
+    return found[0]
+
+# <dir>.{func,block,loop,ef,dac,dbg}.csv next to the .ll against its index: every
+# function, block, loop header and pfor named in the tables should be in the IR.
+# The tables come from the IR before Tapir lowering and loop passes, the -pr.ll
+# from after, so a block or loop label of a defined function that isn't there
+# any more (pfor.cond, pfor.body, ...) was most likely lowered away: that goes
+# to 'lowered', not 'missing'. .dbg.csv rows are checked against the
+# DISubprogram of the define's !dbg attachment; defines without one (IR built
+# without -g) go to 'no_dbg'.
+def check_ir_tables(index, workdir):
+    name = os.path.basename(os.path.normpath(workdir))
+    checks = [
+        ('func', lambda row: (row['funcname'], None)),
+        ('block', lambda row: (row['funcname'], row['blockname'])),
+        ('loop', lambda row: (row['funcname'], row['loopname'])),
+        ('ef', lambda row: (row['pfor_name'], None)),
+        ('dac', lambda row: (row['pfor_name'], None)),
+        ('dbg', lambda row: (row['linkage_name'] or row['sp_name'], None))
+    ]
+    labels = {}
+    report = {}
+    for kind, key in checks:
+        path = os.path.join(workdir, '{}.{}.csv'.format(name, kind))
+        if not os.path.exists(path):
+            continue
+        res = {'table': path, 'rows': 0, 'missing': [], 'lowered': [], 'no_dbg': []}
+        with open(path, 'r') as f:
+            for row in csv.DictReader(f):
+                res['rows'] += 1
+                func_name, label = key(row)
+                f_id = index.lookup(func_name)
+                if f_id is None:
+                    res['missing'].append({'funcname': func_name, 'label': label, 'reason': 'no define'})
+                    continue
+                if kind == 'dbg':
+                    dbg = index.dbg_ir(f_id)
+                    field = 'linkageName: "{}"'.format(row['linkage_name']) if row['linkage_name'] else 'name: "{}"'.format(row['sp_name'])
+                    if dbg is None:
+                        res['no_dbg'].append(func_name)
+                    elif field not in dbg:
+                        res['missing'].append({'funcname': func_name, 'label': None, 'reason': 'dbg mismatch'})
+                    continue
+                if label is None:
+                    continue
+                if f_id not in labels:
+                    labels[f_id] = set( name for name, _ in index.block_labels(f_id) )
+                if label not in labels[f_id]:
+                    res['lowered'].append({'funcname': func_name, 'label': label})
+        report[kind] = res
+    return report
+
+def showIR(args, test=None):
+    path = ll_path(args, test)
+    index = IRIndex.load(path, cache=args.cache)
+    if args.ir_check:
+        report = check_ir_tables(index, os.path.dirname(path))
+        if not report:
+            print('<!> no analysis tables next to {}'.format(path))
+        for kind, res in report.items():
+            print('{}\t{} rows, {} not in {}, {} lowered away, {} without !dbg'.format(os.path.basename(res['table']), res['rows'], len(res['missing']),
+                  os.path.basename(path), len(res['lowered']), len(res['no_dbg'])))
+            for miss in res['missing'][:len(res['missing']) if args.v else args.k]:
+                print('\t<!> {}: {}{}'.format(miss['reason'], miss['funcname'], ' ' + miss['label'] if miss['label'] else ''))
             if args.v:
-                if jsInstr['ef'] == 0 and jsInstr['dac'] > 0: 
-                    print("\toverconservative-dac: {}".format(id))
-                    # print callpaths
-                    for js_callsite in jsInstr['caller_DAC']:
-                        file = normpath(js_callsite['file'])
-                        ln = js_callsite['ln']
-                        col = js_callsite['col']
-                        caller_link_name = js_callsite['mangled_name']
-                        print('\t\t{}:{}:{}\tcaller: {}\tmangled: {}'.format(file, ln, col, js_callsite['caller'], js_callsite['mangled_name']))
-
-                        # print call history of this callsite
-                        callhistory, normal_exit = print_call_history(caller_link_name, cg, indent=2)
-                        for callpath in callhistory:
-                            print("\t- [ ] --\n{}".format(callpath))
-                        if not normal_exit:
-                            print('\t<!> only show 10 callpaths due to space!')
-                        print('\n')
-                elif jsInstr['dac'] == 0 and jsInstr['ef'] > 0:
-                    print("\toverconservative-ef: {}".format(id))
-        
-                    # print callpaths
-                    for js_callsite in jsInstr['caller_EF']:
-                        file = normpath(js_callsite['file'])
-                        ln = js_callsite['ln']
-                        col = js_callsite['col']
-                        caller_link_name = js_callsite['mangled_name']
-                        print('\t\t{}:{}:{} \tcaller: {}\tmangled: {}'.format(file, ln, col, js_callsite['caller'], js_callsite['mangled_name']))
-                        # print call history of this callsite
-                        callhistory, normal_exit = print_call_history(caller_link_name, cg, indent=2)
-                        for callpath in callhistory:
-                            print("\t- [ ] --\n{}".format(callpath))
-                        if not normal_exit:
-                            print('\t<!> only show 10 callpaths due to space!')
-                        print('\n')
-                elif jsInstr['ef'] > 0 and jsInstr['dac'] > 0: 
-                    print("\taccurate both: {}".format(id))
-
-                    # print EF callpaths
-                    for js_callsite in jsInstr['caller_EF']:
-                        file = normpath(js_callsite['file'])
-                        ln = js_callsite['ln']
-                        col = js_callsite['col']
-                        caller_link_name = js_callsite['mangled_name']
-                        print('\t\t{}:{}:{} ef \tcaller: {}\tmangled: {}'.format(file, ln, col, js_callsite['caller'], js_callsite['mangled_name']))
-                        # print call history of this callsite
-                        callhistory, normal_exit = print_call_history(caller_link_name, cg, indent=2)
-                        for callpath in callhistory:
-                            print("\t- [ ] --\n{}".format(callpath))
-                        if not normal_exit:
-                            print('\t<!> only show 10 callpaths due to space!')
-                        print('\n')
-                    # print DAC callpaths
-                    for js_callsite in jsInstr['caller_DAC']:
-                        file = normpath(js_callsite['file'])
-                        ln = js_callsite['ln']
-                        col = js_callsite['col']
-                        caller_link_name = js_callsite['mangled_name']
-                        print('\t\t{}:{}:{} dac \tcaller: {}\tmangled: {}'.format(file, ln, col, js_callsite['caller'], js_callsite['mangled_name']))
-
-                        # print call history of this callsite
-                        callhistory, normal_exit = print_call_history(caller_link_name, cg, indent=2)
-                        for callpath in callhistory:
-                            print("\t- [ ] --\n{}".format(callpath))
-                        if not normal_exit:
-                            print('\t<!> only show 10 callpaths due to space!')
-                        print('\n')
-
-    # output combined result
-    combined_json_list = []
-    for id, jsInstr in lazyd_instrument.items():
-        jsStatic = static_analysis[id]
-        jsInstr['prr'] = jsStatic['prr']
-        combined_json_list.append(jsInstr)
-
-
-    print("\t{} ef cilkfors".format(len([ js for js in combined_json_list if js['prr'] == "defef" ])))
-    print("\t{} dac cilkfors".format(len([ js for js in combined_json_list if js['prr'] == "defdac" ])))
-    print("\t{} both cilkfors".format(len([ js for js in combined_json_list if js['prr'] == "both" ])))
-    print("\t{} untouched cilkfors".format(len([ js for js in combined_json_list if js['prr'] == "untouched" ])))
-
-    # print worklist of pfors that need to be changed manually 
-    with open(os.path.join(workdir, r'{}.instr.cilkfor.json'.format(test)), 'w') as f:
-        f.write(json.dumps(combined_json_list, indent=4))
-        print('>> write to {}'.format(os.path.join(workdir, r'{}.instr.cilkfor.json'.format(test))))
-    with open(os.path.join(workdir, '{}.worklist.txt'.format(test)), 'w') as f: 
-        print("worklist: ", file=f)
-        for js in combined_json_list:
-            if js['prr'] == "both" or js['prr'] == 'untouched':
+                for low in res['lowered']:
+                    print('\tlowered: {} {}'.format(low['funcname'], low['label']))
+        report_path = path + '.check.json'
+        with open(report_path, 'w') as f:
+            json.dump(report, f, indent=2)
+        print("write IR cross-check to --> {}".format(report_path))
+    if args.ir:
+        f_id = index.lookup(args.ir[0])
+        if f_id is None:
+            print('<!> {} is not defined in {}'.format(args.ir[0], path))
+            exit(1)
+        if len(args.ir) > 1:
+            ir = index.block_ir(f_id, args.ir[1])
+            if ir is None:
+                print('<!> {} has no block {} (blocks: {})'.format(args.ir[0], args.ir[1], ' '.join( name for name, _ in index.block_labels(f_id) )))
+                exit(1)
+            print(ir)
+        else:
+            print(index.function_ir(f_id))
+            dbg = index.dbg_ir(f_id)
+            if dbg:
+                print(dbg)
+
+###############################################################################
+# profile-weighted worklist: static results joined with <test>.perf.short.json
+###############################################################################
+# A worklist item (defef/defdac cilkfor) is matched to perf records by name and by
+# source line. The profile runs the -test tree, where callers gained _ef/_dac
+# suffixes and parallel_for became parallel_for_seq/_recurse/..., so names are
+# compared by their demangled loop body: the first template argument of the
+# parallel_for (its lambda) with the suffixes dropped. Lines compare callsites
+# against src_locs/inline_locs without the <test>-{cp,test}/<dir>/ prefix.
+# Matches through inline_callers are kept, so costs are inclusive of inlined
+# inner loops. The estimated dynamic cost of an item is the sum over matched
+# records of entries x mean tripcount, i.e. of their tripcount_sum. Granularity
+# is left out: 0 (the library default) would zero a hot loop, and a grain above
+# the tripcount would inflate a loop that runs a single iteration.
+
+LOOP_SUFFIX_PATTERN = re.compile(r'\b(\w+?)_(?:ef|dac)\b')
+
+# {mangled: demangled} through one llvm-cxxfilt (or c++filt, which rejects the
+# clang $_N lambda names) process, identity without either
+DEMANGLERS = ['llvm-cxxfilt', 'c++filt']
+
+def demangle(names):
+    import subprocess
+    names = sorted(set(names))
+    for demangler in DEMANGLERS:
+        try:
+            out = subprocess.run([demangler], input='\n'.join(names), capture_output=True, text=True, check=True).stdout
+        except (OSError, subprocess.CalledProcessError):
+            continue
+        return dict(zip(names, out.split('\n')))
+    print('<!> no {} found, matching profiles by mangled names only'.format(' or '.join(DEMANGLERS)))
+    return dict(zip(names, names))
+
+# 'parlay::sequence<...>::initialize_fill(...)::{lambda(unsigned long)#1}' out of
+# 'void parlay::parallel_for_seq<parlay::sequence<...>::initialize_fill_ef(...)::{lambda(unsigned long)#1}>(...)'
+def pfor_lambda_key(demangled):
+    start = demangled.find('<')
+    if start < 0:
+        return None
+    depth = 0
+    for end in range(start, len(demangled)):
+        if demangled[end] == '<':
+            depth += 1
+        elif demangled[end] == '>':
+            depth -= 1
+            if depth == 0:
+                return LOOP_SUFFIX_PATTERN.sub(r'\1', demangled[start + 1:end])
+    return None
+
+# ('parlay/sequence.h', 570) out of 'wordCounts-cp/bench/parlay/sequence.h', 570
+def source_line_key(file, ln):
+    parts = normpath(file).split(os.sep)
+    return '/'.join(parts[2:] if len(parts) > 2 else parts), int(ln)
+
+class ProfileIndex(object):
+    # ids: worklist cilkfor IDs, demangled along with the profile names
+    def __init__(self, perfLogs, ids):
+        self.logs = perfLogs
+        names = [ name for log in perfLogs for name in [log['src_caller']] + list(log['inline_callers']) ]
+        self.demangled = demangle(names + list(ids))
+        self.by_name = defaultdict(list)
+        self.by_line = defaultdict(list)
+        for i, log in enumerate(perfLogs):
+            for name in [log['src_caller']] + list(log['inline_callers']):
+                self.by_name[name].append(i)
+                key = pfor_lambda_key(self.demangled[name])
+                if key:
+                    self.by_name[key].append(i)
+            for loc in list(log['src_locs']) + list(log['inline_locs']):
+                file, ln = loc.split(':')[:2]
+                self.by_line[source_line_key(file, ln)].append(i)
+
+    # indices of the records matching cilkfor ID, any of the mangled names or any
+    # (file, ln) line, in record order
+    def match(self, ID, names, lines):
+        key = pfor_lambda_key(self.demangled.get(ID, ID))
+        found = {}
+        for name in [ID] + list(names) + ([key] if key else []):
+            found.update(dict.fromkeys(self.by_name.get(name, [])))
+        for line in lines:
+            found.update(dict.fromkeys(self.by_line.get(line, [])))
+        return sorted(found)
+
+    # entries x mean tripcount x mean granularity per record. The grain is taken as
+    # at least 1 (0: the default grain) and at most the mean tripcount (a task
+    # can't cover more iterations than the loop has)
+    def cost(self, matches):
+        total = 0.0
+        for i in matches:
+            log = self.logs[i]
+            if not log['entry']:
                 continue
-            print("\n- [ ] ======================================", file=f)
-            print("\t{}".format(js['ID']), file=f)
-            if (js['prr'] == 'defef'):
-                for js_callsite in js['caller_EF']:
-                    file = normpath(js_callsite['file'])
-                    ln = js_callsite['ln']
-                    col = js_callsite['col']
-                    caller_link_name = js_callsite['mangled_name']
-                    print('\tef\t{}:{}:{}\tcaller: {}'.format(file, ln, col, js_callsite['caller']), file=f)
+            tripcount = log['tripcount_sum'] / log['entry']
+            grain = min(max(log['granularity_sum'] / log['entry'], 1.0), max(tripcount, 1.0))
+            total += log['tripcount_sum'] * grain
+        return total
 
-                    # print call history of this callsite
-                    callhistory, normal_exit = print_call_history(caller_link_name, cg, indent=2)
-                    for callpath in callhistory:
-                        print("\n\t- [ ] --\n{}".format(callpath), file=f)
-                    if not normal_exit:
-                        print('\t<!> only show 10 callpaths due to space!')
-                    # collect file mentioned
-            elif (js['prr'] == 'defdac'):
-                dbg = js['ID'] == '_ZN6parlay12parallel_forIZNS_8sequenceIcNS_9allocatorIcEELb1EE16initialize_rangeIPKcEEvT_S8_St26random_access_iterator_tagEUlmE_EEvmmS8_lb'
-                for js_callsite in js['caller_DAC']:
+# keys a perf record needs to be matched; summaries written before src_caller
+# (one inline_loc per record) lack them
+PROFILE_RECORD_KEYS = ['src_caller', 'src_locs', 'inline_callers', 'inline_locs']
+
+# perf records of <test>.perf.short.json in profile_workdir (brought up to date if its
+# log is there), [] without a profile. Legacy records are skipped with a warning.
+def load_profile(args, profile_workdir, test):
+    if not profile_workdir:
+        return []
+    summary_path = os.path.join(profile_workdir, '{}.perf.short.json'.format(test))
+    log_path = os.path.join(profile_workdir, '{}.perf.log.gz'.format(test))
+    if not os.path.exists(summary_path) and not os.path.exists(log_path):
+        return []
+    perfLogs = update_perf_summary(summary_path, log_path, jobs=args.jobs)
+    usable = [ logs for logs in perfLogs if all( key in logs for key in PROFILE_RECORD_KEYS ) ]
+    if len(usable) < len(perfLogs):
+        print('<!> skipped {} of {} records of {} without src_caller/src_locs (re-run -PROFILE to rebuild it from its log)'.format(
+              len(perfLogs) - len(usable), len(perfLogs), summary_path))
+    return usable
+
+# static <name>.{loop,ef,dac}.csv tables of the first dir that has them:
+# funcname -> [(loopname, state)], pfor_name -> ef_count, pfor_name -> dac_count
+def load_static_tables(dirs, name):
+    tables = {'loop': defaultdict(list), 'ef': Counter(), 'dac': Counter()}
+    for kind in tables:
+        paths = [ os.path.join(d, '{}.{}.csv'.format(name, kind)) for d in dirs if d ]
+        paths = [ path for path in paths if os.path.exists(path) ]
+        if not paths:
+            continue
+        with open(paths[0], 'r') as f:
+            for row in csv.DictReader(f):
+                if kind == 'loop':
+                    tables['loop'][row['funcname']].append((row['loopname'], row['state']))
+                else:
+                    tables[kind][row['pfor_name']] += int(row['{}_count'.format(kind)])
+    return tables
+
+# worklist entries in descending estimated cost, every profiled one ahead of the
+# unprofiled ones, which keep their order
+def rank_worklist(worklist, profile, tables):
+    items = []
+    for order, js in enumerate(worklist):
+        callsites = (js['caller_EF'] if js['prr'] == 'defef' else js['caller_DAC']) or []
+        names = [js['ID']] + [ c['mangled_name'] for c in callsites ]
+        lines = [ source_line_key(c['file'], c['ln']) for c in callsites ]
+        matches = profile.match(js['ID'], names[1:], lines) if profile else []
+        logs = [ profile.logs[i] for i in matches ]
+        entry = sum( log['entry'] for log in logs )
+        items.append({
+            'order': order,
+            'ID': js['ID'],
+            'prr': js['prr'],
+            'cost': profile.cost(matches) if profile else 0.0,
+            'entry': entry,
+            'avg_tripcount': sum( log['tripcount_sum'] for log in logs ) / entry if entry else None,
+            'avg_granularity': sum( log['granularity_sum'] for log in logs ) / entry if entry else None,
+            'profile': [ {'version': log['version'], 'src_caller': log['src_caller'], 'entry': log['entry']} for log in logs ],
+            'static': {
+                'ef_count': sum( tables['ef'][name] for name in names ),
+                'dac_count': sum( tables['dac'][name] for name in names ),
+                'loops': [ {'loopname': loop, 'state': state} for name in names for loop, state in tables['loop'].get(name, []) ]
+            },
+            'js': js
+        })
+    items.sort(key=lambda item: (not item['profile'], -item['cost'], item['order']))
+    return items
+
+###############################################################################
+# grain size and ef/dac recommendations: <test>.grain.json and <test>.grain.h
+###############################################################################
+# Per src_caller (all versions pooled), a call of tripcount n at dac depth d is
+# modeled with grain g on P workers as work/P' + span, P' = max(1, P >> d) being
+# the workers left to a loop nested d levels into a dac recursion, in units of one
+# iteration, with a spawn costing `spawn_cost` iterations:
+#   ef:  work n + s*ceil(n/g),  span g + s*ceil(n/g)      (one task forks every chunk)
+#   dac: work n + 2s*ceil(n/g), span g + s*log2(ceil(n/g)) (binary split down to g)
+# The tripcount and depth distributions are the log-binned sketches of the
+# profile, taken as independent. The recommendation is the (grain, ef/dac) pair
+# with the least expected time per call, among powers of two up to the largest
+# tripcount.
+
+# (values, counts) of a sketch, each bin at its midpoint clamped to [min, max]
+def sketch_points(sketch):
+    hist = sketch['hist']
+    hist = sorted(hist.items() if isinstance(hist, dict) else hist)
+    values = np.array([ min(max(sum(sketch_bin_range(b)) / 2.0, sketch['min']), sketch['max']) for b, _ in hist ], dtype=np.float64)
+    return values, np.array([ n for _, n in hist ], dtype=np.float64)
+
+# (values, counts) of a record field, its mean as a single point without a sketch
+def field_points(logs, field):
+    sketch = logs.get(field + '_sketch')
+    if sketch and sketch['min'] is not None:
+        return sketch_points(sketch)
+    return np.array([logs[field + '_sum'] / logs['entry']]), np.array([float(logs['entry'])])
+
+# expected time per call over the tripcount x depth distributions, for each grain
+def expected_loop_time(tripcounts, tc_weights, depths, depth_weights, grains, workers, spawn_cost, dac):
+    n = tripcounts[:, None, None]
+    g = grains[None, None, :]
+    p = np.maximum(1.0, workers / np.exp2(depths))[None, :, None]
+    chunks = np.ceil(n / g)
+    if dac:
+        t = (n + 2 * spawn_cost * chunks) / p + g + spawn_cost * np.log2(chunks)
+    else:
+        t = (n + spawn_cost * chunks) / p + g + spawn_cost * chunks
+    weights = tc_weights[:, None] * depth_weights[None, :]
+    return np.tensordot(weights, t, axes=([0, 1], [0, 1])) / weights.sum()
+
+def recommend_grain(logs, workers, spawn_cost):
+    tripcounts, tc_weights = field_points(logs, 'tripcount')
+    depths, depth_weights = field_points(logs, 'depth')
+    tripcounts = np.maximum(tripcounts, 1.0)
+    grains = np.exp2(np.arange(0, int(np.log2(tripcounts.max())) + 1))
+    times = { mode: expected_loop_time(tripcounts, tc_weights, depths, depth_weights, grains, workers, spawn_cost, mode == 'dac') for mode in ['ef', 'dac'] }
+    mode = min(times, key=lambda m: times[m].min())
+    best = int(np.argmin(times[mode]))
+    # the profiled grain (0: library default) under the same model, for reference
+    current = logs['granularity_sum'] / logs['entry']
+    current_time = None
+    if current >= 1:
+        current_time = min(float(expected_loop_time(tripcounts, tc_weights, depths, depth_weights, np.array([current]), workers, spawn_cost, m == 'dac')[0]) for m in times)
+    return {
+        'granularity': int(grains[best]),
+        'mode': mode,
+        'time': float(times[mode][best]),
+        'ef_time': float(times['ef'].min()),
+        'dac_time': float(times['dac'].min()),
+        'current_granularity': current,
+        'current_time': current_time
+    }
+
+# records of all versions pooled per key(record) (default: src_caller), in
+# descending entry count
+def pool_perf_logs(perfLogs, key=None):
+    pooled = {}
+    for logs in perfLogs:
+        if logs['entry'] == 0:
+            continue
+        k = key(logs) if key else logs['src_caller']
+        if k not in pooled:
+            pooled[k] = {'key': k, 'src_caller': logs['src_caller'], 'src_callers': {}, 'versions': [], 'version_entry': Counter(),
+                         'src_locs': {}, 'inline_locs': {}, 'entry': 0, 'ef_entry': 0, 'dac_entry': 0,
+                         'tripcount_sum': 0.0, 'granularity_sum': 0.0, 'depth_sum': 0.0}
+        pool = pooled[k]
+        pool['src_callers'][logs['src_caller']] = None
+        pool['versions'].append(logs['version'])
+        pool['version_entry'][logs['version']] += logs['entry']
+        pool['src_locs'].update(dict.fromkeys(logs['src_locs']))
+        pool['inline_locs'].update(dict.fromkeys(logs['inline_locs']))
+        for field in ['entry', 'ef_entry', 'dac_entry', 'tripcount_sum', 'granularity_sum', 'depth_sum']:
+            pool[field] += logs[field]
+        for field in SKETCH_FIELDS:
+            sketch = logs.get(field + '_sketch')
+            if not sketch or sketch['min'] is None:
+                pool[field + '_sketch'] = None
+            elif pool.get(field + '_sketch', True) is not None:
+                hist = sketch['hist']
+                merge_sketch(pool.setdefault(field + '_sketch', new_sketch()), {'min': sketch['min'], 'max': sketch['max'], 'hist': dict(hist.items() if isinstance(hist, dict) else map(tuple, hist))})
+    return sorted(pooled.values(), key=lambda pool: pool['entry'], reverse=True)
+
+def recommend_grains(perfLogs, workers, spawn_cost):
+    recs = []
+    for pool in pool_perf_logs(perfLogs):
+        rec = {'src_caller': pool['src_caller'], 'versions': pool['versions'], 'entry': pool['entry'],
+               'ef_entry': pool['ef_entry'], 'dac_entry': pool['dac_entry'],
+               'avg_tripcount': pool['tripcount_sum'] / pool['entry'], 'avg_depth': pool['depth_sum'] / pool['entry']}
+        rec.update(recommend_grain(pool, workers, spawn_cost))
+        rec['src_locs'] = list(pool['src_locs'])
+        recs.append(rec)
+    return recs
+
+# C++ table for the -test tree builds, looked up by the mangled src_caller
+def write_grain_header(path, recs, source, workers, spawn_cost):
+    with open(path, 'w') as f:
+        print('// generated by replacePbbsV2ParallelFor.py -PROFILE --recommend from {}'.format(source), file=f)
+        print('// model: {} workers, spawn cost {:g} iterations; do not edit'.format(workers, spawn_cost), file=f)
+        print('#pragma once', file=f)
+        print('#include <cstddef>\n', file=f)
+        print('namespace parlay {\nnamespace grain_table {\n', file=f)
+        print('struct entry {\n  const char *src_caller;\n  size_t granularity;\n  bool dac;\n};\n', file=f)
+        print('inline constexpr entry entries[] = {', file=f)
+        for rec in recs:
+            print('  {{"{}", {}, {}}},'.format(rec['src_caller'], rec['granularity'], 'true' if rec['mode'] == 'dac' else 'false'), file=f)
+        print('};\n', file=f)
+        print('inline constexpr size_t size = {};\n'.format(len(recs)), file=f)
+        print('} // namespace grain_table\n} // namespace parlay', file=f)
+
+###############################################################################
+# profile diff: two .perf.short.json summaries
+###############################################################################
+# Call sites are matched across the two profiles by their loop body (the
+# normalized lambda of the parallel_for, see pfor_lambda_key; the mangled
+# src_caller when it has none) together with all the user call sites it was
+# inlined at, so that a loop keeps its identity when it moves from parallel_for
+# (version 0) to parallel_for_ef/_dac or across the -cp/-test trees. The key mixes
+# versions and demangled names, so it doesn't follow the (version, src_caller)
+# order of the summaries: both sides are pooled by it and joined through a dict.
+
+# ('loop body', ('parlay/primitives.h:880', ...)) per pooled record
+def perf_diff_key(logs, demangled):
+    body = pfor_lambda_key(demangled.get(logs['src_caller'], logs['src_caller'])) or logs['src_caller']
+    sites = { '{}:{}'.format(*source_line_key(*loc.split(':')[:2])) for loc in logs['inline_locs'] }
+    return body, tuple(sorted(sites))
+
+# {field: value} of one side of the diff, None when the call site is missing there
+def perf_diff_side(pool):
+    if pool is None:
+        return None
+    entry = pool['entry']
+    side = {'entry': entry, 'ef_entry': pool['ef_entry'], 'dac_entry': pool['dac_entry'],
+            'version_entry': dict( (str(v), n) for v, n in sorted(pool['version_entry'].items()) ),
+            'src_callers': list(pool['src_callers'])}
+    for field in SKETCH_FIELDS:
+        side['avg_' + field] = pool[field + '_sum'] / entry
+        sketch = pool.get(field + '_sketch')
+        if sketch:
+            side['p50_' + field], side['p90_' + field] = sketch_quantile(sketch, 0.5), sketch_quantile(sketch, 0.9)
+    return side
+
+# moved: version 0 entries in a, parallel_for_ef/_dac entries in b and fewer version 0 ones
+def perf_diff_moved(a, b):
+    if a is None or b is None:
+        return False
+    a0, b0 = a['version_entry'].get('0', 0), b['version_entry'].get('0', 0)
+    return a0 > 0 and b0 < a0 and b['entry'] > b0
+
+def diff_perf_logs(perfLogs_a, perfLogs_b):
+    demangled = demangle( logs['src_caller'] for logs in list(perfLogs_a) + list(perfLogs_b) )
+    key = lambda logs: perf_diff_key(logs, demangled)
+    pools_a = dict( (pool['key'], pool) for pool in pool_perf_logs(perfLogs_a, key=key) )
+    pools_b = dict( (pool['key'], pool) for pool in pool_perf_logs(perfLogs_b, key=key) )
+    diffs = []
+    for k in list(pools_a) + [ k for k in pools_b if k not in pools_a ]:
+        a, b = perf_diff_side(pools_a.get(k)), perf_diff_side(pools_b.get(k))
+        diffs.append({
+            'loop': k[0],
+            'callsite': ' '.join(k[1]),
+            'status': 'removed' if b is None else 'added' if a is None else 'moved' if perf_diff_moved(a, b) else 'matched',
+            'entry_delta': (b['entry'] if b else 0) - (a['entry'] if a else 0),
+            'a': a,
+            'b': b
+        })
+    diffs.sort(key=lambda diff: abs(diff['entry_delta']), reverse=True)
+    return diffs
+
+def diffProfiles(args, path_a=None, path_b=None):
+    summaries = [ read_perf_summary(path) for path in [path_a, path_b] ]
+    for path, summary in zip([path_a, path_b], summaries):
+        if summary is None or any( 'src_caller' not in logs for logs in summary['perfLogs'] ):
+            print('<!> cannot read profile summary {} (re-run -PROFILE to rebuild it from its log)'.format(path))
+            exit(1)
+    diffs = diff_perf_logs(summaries[0]['perfLogs'], summaries[1]['perfLogs'])
+
+    def side_line(side):
+        if side is None:
+            return '-'
+        return 'entry:{} ef:{} dac:{} versions:{} avg.tc:{:.2f} avg.gran:{:.2f} avg.depth:{:.2f}'.format(
+            side['entry'], side['ef_entry'], side['dac_entry'], '/'.join( '{}={}'.format(v, n) for v, n in side['version_entry'].items() ),
+            side['avg_tripcount'], side['avg_granularity'], side['avg_depth'])
+    counts = Counter( diff['status'] for diff in diffs )
+    print('-- {} call sites: {}'.format(len(diffs), ' '.join( '{}:{}'.format(status, counts[status]) for status in ['moved', 'matched', 'added', 'removed'] )))
+    for status in ['moved', 'matched', 'added', 'removed']:
+        show = [ diff for diff in diffs if diff['status'] == status ]
+        if not (args.v or status == 'moved'):
+            show = show[:args.k]
+        if not show:
+            continue
+        print('-- {}: '.format(status))
+        for diff in show:
+            print('\t{:+d}\tat: {}\tloop: {}'.format(diff['entry_delta'], diff['callsite'], diff['loop']))
+            print('\t\ta: {}'.format(side_line(diff['a'])))
+            print('\t\tb: {}'.format(side_line(diff['b'])))
+        if len(show) < counts[status]:
+            print('\t<!> only show {} of {} {} call sites (-v for all)'.format(len(show), counts[status], status))
+
+    diff_path = re.sub(r'(\.perf\.short)?\.json$', '', path_b) + '.perf.diff.json'
+    with open(diff_path, 'w') as f:
+        json.dump({'a': path_a, 'b': path_b, 'diffs': diffs}, f, indent=2)
+    print("write profile diff to --> {}".format(diff_path))
+
+###############################################################################
+# main functionality 
+###############################################################################
+def compileAnalysisAndInstrumentResults(args, workdir=None, test=None, profile_workdir=None):
+    # cilkfors reached through the same parlay helpers share callers, so the text of
+    # a caller's call history and of each callsite line on it is built only once
+    callsite_lines = {}
+    call_history_text = {}
+    def callsite_line(e):
+        line = callsite_lines.get(e)
+        if line is None:
+            line = "{}  {}".format(cg.callsite_prr(e), cg.callsite_loc(e))
+            if args.v:
+                line += '\t{}'.format(cg.caller_mangled_name(e))
+            callsite_lines[e] = line
+        return line
+    def print_call_history(func_name, indent=0):
+        key = (func_name, indent)
+        if key not in call_history_text:
+            with self_profile.phase('call history') as counters:
+                res = [ '\n'.join([ '{}{}'.format('\t'*indent, line) for line in format_call_path(call_history, path, callsite_line) ]) for path in call_history.best(func_name) ]
+                call_history_text[key] = (res, call_history.count(func_name))
+                counters['records'] = len(res)
+        return call_history_text[key]
+
+    # print calling history of a callsite
+    with self_profile.phase('graph build') as counters:
+        cg = CallGraph.load(os.path.join(workdir, r'{}.cg.json'.format(test)),
+                            scc_path=os.path.join(workdir, r'{}.scc.json'.format(test)),
+                            cache=args.cache)
+        call_history = CallHistory(cg, k=args.k)
+        counters['records'] = len(cg)
+    if args.v: print('<< read from {}'.format(os.path.join(workdir, r'{}.cg.json'.format(test))))
+
+    # static analysis result and instrumentation result in json, joined by ID
+    with self_profile.phase('json load') as counters:
+        static_analysis_json = load_json(os.path.join(workdir, r'{}.cilkfor.json'.format(test)), cache=args.cache)
+        if args.v: print('<< read from {}'.format(os.path.join(workdir, r'{}.cilkfor.json'.format(test))))
+        lazyd_instrument_json = load_json(os.path.join(workdir, r'{}.instr.json'.format(test)), cache=args.cache)
+        if args.v: print('<< read from {}'.format(os.path.join(workdir, r'{}.instr.json'.format(test))))
+        counters['records'] = len(static_analysis_json) + len(lazyd_instrument_json)
+    with self_profile.phase('consistency check') as counters:
+        combined_json_list, report = join_static_instr(static_analysis_json, lazyd_instrument_json)
+        counters['records'] = len(lazyd_instrument_json)
+    counts = report['counts']
+    print("{} static cilkfor results".format(sum(report['static'].values())))
+    for prr in PRR_STATES:
+        print("\t{} {} results".format(report['static'].get(prr, 0), prr))
+    print("{} instrumentation cilkfor results".format(report['instrumented']))
+    for cls in CONSISTENCY_CLASSES:
+        print("\t{} {}".format(counts[cls], cls))
+
+    # every inconsistency at once: instrumentation's ef/dac callsites must agree with static prr
+    for cls in CONSISTENCY_ERRORS:
+        for ID in report['classes'][cls]:
+            print("\t<!> {}: {}".format(cls, ID))
+    for kind, ids in report['duplicates'].items():
+        for ID in ids:
+            print("\t<!> duplicate {} entry: {}".format(kind, ID))
+
+    # callpaths of the static 'both' results, by what instrumentation saw
+    if args.v:
+        def print_callsites(callsites, label=''):
+            for js_callsite in callsites or []:
+                print('\t\t{}:{}:{}{} \tcaller: {}\tmangled: {}'.format(normpath(js_callsite['file']), js_callsite['ln'], js_callsite['col'], label,
+                                                                      js_callsite['caller'], js_callsite['mangled_name']))
+                # print call history of this callsite
+                callhistory, npaths = print_call_history(js_callsite['mangled_name'], indent=2)
+                for callpath in callhistory:
+                    print("\t- [ ] --\n{}".format(callpath))
+                if npaths > len(callhistory):
+                    print('\t<!> only show {} of {} callpaths!'.format(len(callhistory), npaths))
+                print('\n')
+        lazyd_instrument = { js['ID']: js for js in combined_json_list }
+        for cls in ['overconservative-dac', 'overconservative-ef', 'accurate-both']:
+            for ID in report['classes'][cls]:
+                print("\t{}: {}".format(cls.replace('-both', ' both'), ID))
+                jsInstr = lazyd_instrument[ID]
+                if cls != 'overconservative-dac':
+                    print_callsites(jsInstr['caller_EF'], ' ef' if cls == 'accurate-both' else '')
+                if cls != 'overconservative-ef':
+                    print_callsites(jsInstr['caller_DAC'], ' dac' if cls == 'accurate-both' else '')
+
+    with self_profile.phase('output') as counters:
+        with open(os.path.join(workdir, r'{}.consistency.json'.format(test)), 'w') as f:
+            json.dump(report, f, indent=2)
+            print('>> write to {}'.format(os.path.join(workdir, r'{}.consistency.json'.format(test))))
+
+        # print worklist of pfors that need to be changed manually 
+        with open_output(os.path.join(workdir, r'{}.instr.cilkfor.json'.format(test)), args.gzip) as f:
+            writer = JsonListWriter(f, indent=4)
+            for js in combined_json_list:
+                writer.append(js)
+            writer.close()
+            counters['records'] = len(combined_json_list)
+            print('>> write to {}'.format(output_path(os.path.join(workdir, r'{}.instr.cilkfor.json'.format(test)), args.gzip)))
+    # rank the worklist by the dynamic cost profiled in the -test tree
+    worklist = [ js for js in combined_json_list if js['prr'] in ['defef', 'defdac'] ]
+    with self_profile.phase('log ingestion') as counters:
+        perfLogs = load_profile(args, profile_workdir, test)
+        counters['records'] = sum( logs['entry'] for logs in perfLogs )
+    with self_profile.phase('aggregation') as counters:
+        profile = ProfileIndex(perfLogs, [ js['ID'] for js in worklist ]) if perfLogs else None
+        tables = load_static_tables([workdir, profile_workdir], os.path.basename(workdir))
+        worklist = rank_worklist(worklist, profile, tables)
+        counters['records'] = len(worklist)
+    if profile:
+        print("{} of {} worklist cilkfors matched to profile".format(len([ item for item in worklist if item['profile'] ]), len(worklist)))
+
+    with self_profile.phase('output') as counters:
+        # worklist.txt and worklist.json are streamed side by side, one cilkfor at a time
+        with open_output(os.path.join(workdir, '{}.worklist.txt'.format(test)), args.gzip) as f, \
+             open_output(os.path.join(workdir, '{}.worklist.json'.format(test)), args.gzip) as fjs:
+            worklist_json = JsonListWriter(fjs, indent=2)
+            print("worklist: ", file=f)
+            for rank, item in enumerate(worklist):
+                js = item['js']
+                print("\n- [ ] ======================================", file=f)
+                print("\t{}".format(js['ID']), file=f)
+                if item['entry']:
+                    print("\tcost: {:.4g}\tentry:{} avg.tc:{:.2f} avg.gran:{:.2f}".format(item['cost'], item['entry'], item['avg_tripcount'], item['avg_granularity']), file=f)
+                callsites_json = []
+                for js_callsite in (js['caller_EF'] if js['prr'] == 'defef' else js['caller_DAC']) or []:
                     file = normpath(js_callsite['file'])
                     ln = js_callsite['ln']
                     col = js_callsite['col']
                     caller_link_name = js_callsite['mangled_name']
-                    print('\tdac\t{}:{}:{}\tcaller: {}\t{}'.format(file, ln, col, js_callsite['caller'], caller_link_name), file=f)
+                    if js['prr'] == 'defef':
+                        print('\tef\t{}:{}:{}\tcaller: {}'.format(file, ln, col, js_callsite['caller']), file=f)
+                    else:
+                        print('\tdac\t{}:{}:{}\tcaller: {}\t{}'.format(file, ln, col, js_callsite['caller'], caller_link_name), file=f)
                     # print call history of this callsite
-                    callhistory, normal_exit = print_call_history(caller_link_name, cg, indent=2) ## DEBUG: 
+                    callhistory, npaths = print_call_history(caller_link_name, indent=2)
                     for callpath in callhistory:
                         print("\n\t- [ ] --\n{}".format(callpath), file=f)
-                    if not normal_exit:
-                        print('\t<!> only show 10 callpaths due to space!')
-                    # collect file mentioned
-        print('>> write to {}'.format(os.path.join(workdir, '{}.worklist.txt'.format(test))))
+                    if npaths > len(callhistory):
+                        print('\t<!> only show {} of {} callpaths!'.format(len(callhistory), npaths), file=f)
+                    callsites_json.append({'file': file, 'ln': ln, 'col': col, 'caller': js_callsite['caller'], 'mangled_name': caller_link_name, 'npaths': npaths})
+                worklist_json.append(dict([('rank', rank)] + [ (key, item[key]) for key in ['ID', 'prr', 'cost', 'entry', 'avg_tripcount', 'avg_granularity'] ]
+                                          + [('callsites', callsites_json), ('static', item['static']), ('profile', item['profile'])]))
+            worklist_json.close()
+            counters['records'] = len(worklist)
+            print('>> write to {}'.format(output_path(os.path.join(workdir, '{}.worklist.txt'.format(test)), args.gzip)))
+            print('>> write to {}'.format(output_path(os.path.join(workdir, '{}.worklist.json'.format(test)), args.gzip)))
+    if args.v: print('{} call histories, {} callsite lines formatted'.format(len(call_history_text), len(callsite_lines)))
+    # outputs above are complete, but an inconsistent analysis must still fail the run
+    if report['errors']:
+        print('<!> {} static/instrumentation inconsistencies, see {}'.format(report['errors'], os.path.join(workdir, r'{}.consistency.json'.format(test))))
+        exit(1)
     return
 
 def interpretPerfTestResults(args, test=None, res_dir=None, id=None):
-    # read entire log as chunks split by double newline
-    def parse_parlaytime_log(log_text): 
-        run_texts = log_text.split("\n\n")
-            # don't process any empty lines before EOF
-        if (not run_texts[-1].strip()):
-            run_texts.pop()
-        # init dataframe
-        df = pd.DataFrame(columns=['cilk_workers', 'avg_parlaytime'])
-
-        # split into chunks begining with '== CILK_WORKERS = <d+> ==...'
-        r = None
-        run_texts = [ t.split('\n') for t in run_texts ]
-        for lines in run_texts: 
-            # find line starting with "== CILK_WORKERS = "
-            i = 0
-            while i < len(lines):
-                if lines[i].startswith('== CILK_WORKERS = '): break
-                i += 1
-            if i == len(lines):
-                continue
-            assert(lines[i].startswith('='))
-            # find CILK_WORKDERS 
-            CILK_WORKERS = int(re.findall(r'\d+', lines[i])[0])
-            # take only "Parlay time: <d+.d+>"
-            lines[:] = [ ln for ln in lines if ln.startswith('Parlay time: ') ]
-            times = [ float(re.findall(r'\d+.\d+', ln)[0]) for ln in lines ]
-
-            avg_times = pd.Series(times).mean()
-            std_times = pd.Series(times).std()
-
-            if r: 
-                assert(r == len(times))
-            r = len(times)
-            # new row of data
-            new_row = pd.Series({ 'cilk_workers': CILK_WORKERS, 'avg_parlaytime': avg_times, 'std_parlaytime': std_times })
-            df = df.append(new_row, ignore_index=True)
-        return df, r
-
-    def parse_icache_txt(icache_text):
-        sections = [sec.strip() for sec in icache_text.split('== ') if sec.strip() ]
-
-        cilk_workers_pattern = re.compile(r'CILK_WORKERS\s*=\s*(\d+)')
-        icache_misses_pattern = re.compile(r'([\d,]+)\s+icache\.misses:u')
-        icache_hits_pattern = re.compile(r'([\d,]+)\s+icache\.hit:u')
-
-        df = pd.DataFrame(columns=['cilk_workers', 'i$_miss', 'i$_hit', 'i$_miss_rate'])
-
-        for section in sections: 
-            cilk_workers = int(cilk_workers_pattern.search(section).group(1))
-            icache_misses = int(icache_misses_pattern.search(section).group(1).replace(',',''))
-            icache_hits = int(icache_hits_pattern.search(section).group(1).replace(',', ''))
-            new_row = pd.Series({
-                'cilk_workers': cilk_workers, 
-                'i$_miss': icache_misses, 
-                'i$_hit': icache_hits, 
-                'i$_miss_rate': icache_misses / float(icache_misses + icache_hits)
-            })
-            df = df.append(new_row, ignore_index=True)
-        return df
-
-    # parse control group parlaytime & icache result
-    orig_time_path = os.path.join(basedir, r'data/{}/{}.parlaytime.orig.log'.format(test, id))
-    with open(orig_time_path, 'r') as f: 
-        print('<< processed {}'.format(r'data/{}/{}.parlaytime.orig.log'.format(test, id)))
-        df_orig, r_orig = parse_parlaytime_log(f.read())
-        df_orig.rename(columns={'avg_parlaytime': 'avg_parlaytime_orig', 'std_parlaytime': 'std_parlaytime_orig'}, inplace=True)
+    with self_profile.phase('log ingestion') as counters:
+        # parse control group parlaytime & icache result
+        orig_time_path = os.path.join(basedir, r'data/{}/{}.parlaytime.orig.log'.format(test, id))
+        with open(orig_time_path, 'r') as f: 
+            print('<< processed {}'.format(r'data/{}/{}.parlaytime.orig.log'.format(test, id)))
+            samples_orig = read_parlaytime_samples(f)
     
-    orig_icache_path = os.path.join(basedir, r'data/{}/{}.icache.orig.txt'.format(test, id))
-    with open(orig_icache_path, 'r') as f:
-        print('<< processed {}'.format(r'data/{}/{}.icache.orig.txt'.format(test, id)))
-        icache_orig = parse_icache_txt(f.read())
-        icache_orig.rename(columns={'i$_miss': 'i$_miss_orig', 'i$_hit': 'i$_hit_orig', 'i$_miss_rate': 'i$_miss_rate_orig'}, inplace=True)
-    # parse test group parlaytime & icache result
-    test_time_path = os.path.join(basedir, r'data/{}/{}.parlaytime.test.log'.format(test, id))
-    with open(test_time_path, 'r') as f:
-        print('<< processed {}'.format(r'data/{}/{}.parlaytime.test.log'.format(test, id)))
-        df_test, r_test = parse_parlaytime_log(f.read())
-        df_test.rename(columns={'avg_parlaytime': 'avg_parlaytime_test', 'std_parlaytime': 'std_parlaytime_test'}, inplace=True)
+        orig_icache_path = os.path.join(basedir, r'data/{}/{}.icache.orig.txt'.format(test, id))
+        with open(orig_icache_path, 'r') as f:
+            print('<< processed {}'.format(r'data/{}/{}.icache.orig.txt'.format(test, id)))
+            perf_stat_orig = read_perf_stat(f)
+        # parse test group parlaytime & icache result
+        test_time_path = os.path.join(basedir, r'data/{}/{}.parlaytime.test.log'.format(test, id))
+        with open(test_time_path, 'r') as f:
+            print('<< processed {}'.format(r'data/{}/{}.parlaytime.test.log'.format(test, id)))
+            samples_test = read_parlaytime_samples(f)
     
-    test_icache_path = os.path.join(basedir, r'data/{}/{}.icache.test.txt'.format(test, id))
-    with open(test_icache_path, 'r') as f:
-        print('<< processed {}'.format(r'data/{}/{}.icache.test.log'.format(test, id)))
-        icache_test = parse_icache_txt(f.read())
-        icache_test.rename(columns={'i$_miss': 'i$_miss_test', 'i$_hit': 'i$_hit_test', 'i$_miss_rate': 'i$_miss_rate_test'}, inplace=True)
+        test_icache_path = os.path.join(basedir, r'data/{}/{}.icache.test.txt'.format(test, id))
+        with open(test_icache_path, 'r') as f:
+            print('<< processed {}'.format(r'data/{}/{}.icache.test.log'.format(test, id)))
+            perf_stat_test = read_perf_stat(f)
+        counters['records'] = sum( len(times) for samples in [samples_orig, samples_test] for times in samples.values() )
     
-    assert(r_orig == r_test)
+    assert(set( len(times) for times in samples_orig.values() ) == set( len(times) for times in samples_test.values() ))
+    # counters per round, as -RUN reports them
+    perf_stat_orig = perf_stat_per_round(perf_stat_orig, dict( (w, len(times)) for w, times in samples_orig.items() ))
+    perf_stat_test = perf_stat_per_round(perf_stat_test, dict( (w, len(times)) for w, times in samples_test.items() ))
+    writePerfTestResults(args, test=test, id=id, samples_orig=samples_orig, samples_test=samples_test,
+                         perf_stat_orig=perf_stat_orig, perf_stat_test=perf_stat_test)
+
+# perf/<test>/<id>.ece<N>.r<R>.{parlay,icache,perfstat,stats}.csv out of the
+# orig/test parlaytime samples and perf stat counters, then into the results store
+def writePerfTestResults(args, test=None, id=None, samples_orig=None, samples_test=None, perf_stat_orig=None, perf_stat_test=None):
+    with self_profile.phase('aggregation') as counters:
+        df_orig, r_orig = parlaytime_frame(samples_orig)
+        df_orig.rename(columns={'avg_parlaytime': 'avg_parlaytime_orig', 'std_parlaytime': 'std_parlaytime_orig'}, inplace=True)
+        df_test, r_test = parlaytime_frame(samples_test)
+        df_test.rename(columns={'avg_parlaytime': 'avg_parlaytime_test', 'std_parlaytime': 'std_parlaytime_test'}, inplace=True)
+        r_orig = max(r_orig, r_test)
 
-    # merge compiled control & test group parlaytime results
-    df_merge = df_orig.merge(df_test, on='cilk_workers')
-    icache_merge = icache_orig.merge(icache_test, on='cilk_workers')
+        # merge compiled control & test group parlaytime results
+        df_merge = df_orig.merge(df_test, on='cilk_workers')
+        counters['records'] = len(df_merge)
     # output .perf.csv
     ece_id = int(args.ece)
     parlaytime_out_path = os.path.join(basedir, r'perf/{}/{}.ece{}.r{}.parlay.csv'.format(test, id, ece_id, r_orig))
     print("write performance test results to --> {}".format(parlaytime_out_path))
     df_merge.to_csv(parlaytime_out_path, index=False)
+    out_paths = [parlaytime_out_path]
 
     # output .icache.csv
-    icache_out_path = os.path.join(basedir, r'perf/{}/{}.ece{}.r{}.icache.csv'.format(test, id, ece_id, r_orig))
-    print("write icache results to --> {}".format(icache_out_path))
-    icache_merge.to_csv(icache_out_path, index=False)
+    def has_icache(perf_stat):
+        return perf_stat and all( 'icache.misses' in section and 'icache.hit' in section for section in perf_stat.values() )
+    if has_icache(perf_stat_orig) and has_icache(perf_stat_test):
+        icache_orig = icache_frame(perf_stat_orig)
+        # counts per round, not the per-process totals of older icache csvs
+        icache_orig.rename(columns={'i$_miss': 'i$_miss_per_round_orig', 'i$_hit': 'i$_hit_per_round_orig', 'i$_miss_rate': 'i$_miss_rate_orig'}, inplace=True)
+        icache_test = icache_frame(perf_stat_test)
+        icache_test.rename(columns={'i$_miss': 'i$_miss_per_round_test', 'i$_hit': 'i$_hit_per_round_test', 'i$_miss_rate': 'i$_miss_rate_test'}, inplace=True)
+        icache_merge = icache_orig.merge(icache_test, on='cilk_workers')
+        icache_out_path = os.path.join(basedir, r'perf/{}/{}.ece{}.r{}.icache.csv'.format(test, id, ece_id, r_orig))
+        print("write icache results to --> {}".format(icache_out_path))
+        icache_merge.to_csv(icache_out_path, index=False)
+        out_paths.append(icache_out_path)
+
+    # output .perfstat.csv: every counter and derived metric of both groups
+    if perf_stat_orig and perf_stat_test:
+        perf_stat_merge = perf_stat_frame(perf_stat_orig).merge(perf_stat_frame(perf_stat_test), on='cilk_workers', suffixes=('_orig', '_test'))
+        perf_stat_out_path = os.path.join(basedir, r'perf/{}/{}.ece{}.r{}.perfstat.csv'.format(test, id, ece_id, r_orig))
+        print("write perf stat counters to --> {}".format(perf_stat_out_path))
+        perf_stat_merge.to_csv(perf_stat_out_path, index=False)
+
+    # significance of test vs orig per worker count
+    with self_profile.phase('aggregation') as counters:
+        stats = compare_parlaytime_samples(samples_orig, samples_test, alpha=args.alpha, seed=args.seed)
+        counters['records'] = len(stats)
+    print('\n-- test over orig speedup, {:.0f}% bootstrap ci, Mann-Whitney p:'.format(100 * (1 - args.alpha)))
+    print(stats.to_string(index=False))
+    stats_out_path = os.path.join(basedir, r'perf/{}/{}.ece{}.r{}.stats.csv'.format(test, id, ece_id, r_orig))
+    print("write speedup statistics to --> {}".format(stats_out_path))
+    stats.to_csv(stats_out_path, index=False)
+
+    # keep the results store in step
+    with self_profile.phase('output') as counters:
+        conn = open_store(store_path(args))
+        try:
+            for path in out_paths:
+                store_ingest_csv(conn, path, force=True)
+            conn.commit()
+        finally:
+            conn.close()
+        counters['records'] = len(out_paths)
+
+###############################################################################
+# adaptive performance experiment, in place of prr.sh's fixed -r loop
+###############################################################################
+# For every CILK_WORKERS count, orig and test take turns running a batch of
+# rounds in one process (pinned to the first cilk_workers cpus, optionally under
+# perf stat). The first `warmup` rounds of each process are dropped, and a build
+# stops once the 95% confidence interval of its mean parlaytime is within
+# ci_rel of the mean (after min_runs) or it reaches max_runs. perf stat counts a
+# whole process, so only the kept rounds' share of it is added up, and counters
+# are reported per kept round: orig and test rarely stop after the same number.
+# two-sided 95% quantiles of student's t for 1..30 degrees of freedom
+T95 = [12.706, 4.303, 3.182, 2.776, 2.571, 2.447, 2.365, 2.306, 2.262, 2.228,
+       2.201, 2.179, 2.160, 2.145, 2.131, 2.120, 2.110, 2.101, 2.093, 2.086,
+       2.080, 2.074, 2.069, 2.064, 2.060, 2.056, 2.052, 2.048, 2.045, 2.042]
+
+# 95% confidence interval half width of the mean, relative to the mean
+def mean_ci_rel(times):
+    if len(times) < 2:
+        return float('inf')
+    t = T95[len(times) - 2] if len(times) - 1 <= len(T95) else 1.96
+    return t * np.std(times, ddof=1) / math.sqrt(len(times)) / np.mean(times)
+
+# (parlaytimes, perf stat section) of one process running `rounds` rounds
+def run_benchmark_process(exe, test_data, cilk_workers, rounds, cpus=None, perf_events=None):
+    import subprocess
+    import tempfile
+    cmd = ['./' + os.path.basename(exe), '-r', str(rounds), '-i', test_data]
+    stat_path = None
+    if perf_events:
+        fd, stat_path = tempfile.mkstemp(suffix='.perfstat.txt')
+        os.close(fd)
+        cmd = ['perf', 'stat', '-e', ','.join(perf_events), '-o', stat_path] + cmd
+    env = dict(os.environ, CILK_NWORKERS=str(cilk_workers),
+               LD_LIBRARY_PATH=':'.join(filter(None, [gcc_libdir, os.environ.get('LD_LIBRARY_PATH')])))
+    header = '== CILK_WORKERS = {} ==================================='.format(cilk_workers)
+    try:
+        out = subprocess.check_output(cmd, cwd=os.path.dirname(exe), env=env, universal_newlines=True,
+                                      preexec_fn=(lambda: os.sched_setaffinity(0, cpus)) if cpus else None)
+        times = list(read_parlaytime_samples([header] + out.splitlines()).get(cilk_workers, []))
+        perf_stat = {}
+        if stat_path:
+            with open(stat_path, 'r') as f:
+                perf_stat = read_perf_stat([header] + f.read().splitlines())
+    finally:
+        if stat_path:
+            os.remove(stat_path)
+    return times, perf_stat
+
+# samples and perf stats per build and worker count, plus a summary of every configuration
+def run_adaptive_experiment(exes, test_data, workers, warmup=1, batch=5, min_runs=5, max_runs=20, ci_rel=0.01, pin=True, perf_events=None):
+    cpus_available = sorted(os.sched_getaffinity(0)) if pin and hasattr(os, 'sched_getaffinity') else None
+    samples = dict( (build, {}) for build in exes )
+    perf_stats = dict( (build, {}) for build in exes )
+    configs = []
+    for cilk_workers in workers:
+        cpus = set(cpus_available[:cilk_workers]) if cpus_available else None
+        processes = dict( (build, 0) for build in exes )
+        for build in exes:
+            samples[build][cilk_workers] = array('d')
+        def converged(build):
+            times = samples[build][cilk_workers]
+            return len(times) >= max_runs or (len(times) >= min_runs and mean_ci_rel(times) <= ci_rel)
+        pending = [ build for build in exes ]
+        while pending:
+            for build in pending:
+                rounds = min(batch, max_runs - len(samples[build][cilk_workers]))
+                times, perf_stat = run_benchmark_process(exes[build], test_data, cilk_workers, rounds + warmup, cpus=cpus, perf_events=perf_events)
+                if len(times) != rounds + warmup:
+                    raise RuntimeError('{} printed {} of {} Parlay times with CILK_WORKERS={}'.format(exes[build], len(times), rounds + warmup, cilk_workers))
+                samples[build][cilk_workers].extend(times[warmup:])
+                merge_perf_stat(perf_stats[build], perf_stat_per_round(perf_stat, {cilk_workers: float(rounds + warmup) / rounds}))
+                processes[build] += 1
+            pending = [ build for build in pending if not converged(build) ]
+        for build in exes:
+            times = samples[build][cilk_workers]
+            configs.append({
+                'build': build,
+                'cilk_workers': cilk_workers,
+                'runs': len(times),
+                'processes': processes[build],
+                'ci_rel': float(mean_ci_rel(times)),
+                'converged': bool(mean_ci_rel(times) <= ci_rel)
+            })
+        print('<< CILK_WORKERS = {}: {}'.format(cilk_workers, ', '.join(
+            '{} {} runs +-{:.2%}'.format(c['build'], c['runs'], c['ci_rel']) for c in configs[-len(exes):])))
+    perf_stats = dict( (build, perf_stat_per_round(perf_stats[build], dict( (w, len(times)) for w, times in samples[build].items() )))
+                       for build in exes )
+    return samples, perf_stats, configs
+
+def runPerformanceExperiment(args, test=None, orig_exe=None, test_exe=None, test_data=None):
+    # same experiment id format as prr.sh's DATETIME
+    id = datetime.datetime.utcnow().strftime('%Y-%m-%d.%H:%M:%S')
+    exes = {'orig': orig_exe, 'test': test_exe}
+    for exe in exes.values():
+        if not os.path.isfile(exe):
+            print('Error: {} not built!'.format(exe))
+            exit(1)
+    perf_events = [ e for e in args.perf_events.split(',') if e ] if args.perf_events else None
+    samples, perf_stats, configs = run_adaptive_experiment(
+        exes, test_data, [ int(w) for w in args.workers.split(',') ],
+        warmup=args.warmup, batch=args.batch, min_runs=args.min_runs, max_runs=args.max_runs,
+        ci_rel=args.ci_rel, pin=args.pin, perf_events=perf_events)
+
+    # raw results: every kept sample, perf stat counters and how each configuration ended
+    runs_path = os.path.join(basedir, r'data/{}/{}.runs.json'.format(test, id))
+    print("write experiment runs to --> {}".format(runs_path))
+    with open(runs_path, 'w') as f:
+        json.dump({
+            'test': test,
+            'experiment_id': id,
+            'ece': int(args.ece),
+            'settings': { 'warmup': args.warmup, 'batch': args.batch, 'min_runs': args.min_runs, 'max_runs': args.max_runs,
+                          'ci_rel': args.ci_rel, 'pin': args.pin, 'perf_events': perf_events, 'perf_stat': 'per kept round' },
+            'configs': configs,
+            'samples': dict( (build, dict( (str(w), list(times)) for w, times in samples[build].items() )) for build in exes ),
+            'perf_stat': dict( (build, dict( (str(w), section) for w, section in perf_stats[build].items() )) for build in exes )
+        }, f, indent=2)
+    writePerfTestResults(args, test=test, id=id, samples_orig=samples['orig'], samples_test=samples['test'],
+                         perf_stat_orig=perf_stats['orig'], perf_stat_test=perf_stats['test'])
+    print('\nCheck experiment with id/datetime: {}'.format(id))
 
 def interpretProfilingResults(args, workdir=None, test=None, major_files=None, major_funcs=None):
-    with open(os.path.join(workdir, r'{}-perf.cg.json'.format(test)), 'r') as f:
-        cg_json = json.load(f)
-    cg = { js['func'] : js for js in cg_json}
+    with self_profile.phase('graph build') as counters:
+        cg = CallGraph.load(os.path.join(workdir, r'{}-perf.cg.json'.format(test)),
+                            scc_path=os.path.join(workdir, r'{}-perf.scc.json'.format(test)),
+                            cache=args.cache)
+        # callsites in the benchmark's own source end a call history
+        major_callsites = cg.major_callsites(major_files=major_files, major_funcs=major_funcs)
+        counters['records'] = len(cg)
 
     # print calling history of a callsite
-    def unfold_call_history(func_name, res_limit=10, indent=0):
-        res = set()
-        def traversal(f, callpath, res, visited, early_stop=False):
-            if f not in cg or early_stop:
-                res.add('\n'.join([ '{}{}'.format('\t'*indent, p) for p in callpath ]))
-                return (len(res) < res_limit)
-            ### DEBUG: ###
-            if f in visited:
-                return (len(res) < res_limit)
-            ##############
-            continued = True
-            visited.add(f)
-            js = cg[f]
-            for js_callsite in js['callsites']:
-                # push new path
-                file = normpath(js_callsite['file'])
-                ln = js_callsite['ln']
-                col = js_callsite['col']
-                prr = js_callsite['prr']
-                caller_name = js_callsite['caller_name']
-                link_name = js_callsite['caller_mangled_name']
-                new_path = "-----> {}:{}:{}\tcaller: {}\t{}".format(file, str(ln), str(col), caller_name, link_name)
-                callpath.append(new_path)
-
-                early_stop = early_stop or ((caller_name in major_funcs) or (os.path.basename(file) in major_files))
-                continued &= traversal(js_callsite['caller_mangled_name'], callpath, res, visited, early_stop=early_stop)
-                # backtrack: pop off all callpath added in this iteration
-                callpath.pop()
-                # if reaches result limit, early break
-                if not continued:
-                    break
-
-            # shrink visited set 
-            visited.remove(f)
-            return continued
-            
-        normal_exit = traversal(func_name, [], res, visited=set())
+    def unfold_call_history(func_name, indent=0):
+        def callsite_line(e):
+            return '-----> {}\t{}'.format(cg.callsite_loc(e), cg.caller_mangled_name(e))
+        with self_profile.phase('call history') as counters:
+            res = [ '\n'.join([ '{}{}'.format('\t'*indent, line) for line in format_call_path(call_history, path, callsite_line) ]) for path in call_history.best(func_name) ]
+            counters['records'] = len(res)
 
         res_str = '\n\n'.join(res)
-        if not normal_exit:
-            res_str += '\n\n{}<!> only {} callpaths is shown!'.format('\t'*indent, res_limit)
+        npaths = call_history.count(func_name)
+        if npaths > len(res):
+            res_str += '\n\n{}<!> only {} of {} callpaths is shown!'.format('\t'*indent, len(res), npaths)
         return res_str
     
     def parallel_for_version(version):
@@ -406,87 +2863,58 @@ def interpretProfilingResults(args, workdir=None, test=None, major_files=None, m
         else:
             exit(1)
 
-    def parse_perf_log(line, perfLogsDict=None):
-        # break apart log line
-        line = line.split(',')
-
-        version = int(line[0])
-        tripcount = int(line[1])
-        granularity = int(line[2])
-        depth = int(line[3])
-        src_loc = line[4]
-        src_caller = line[5]
-        inline_loc = line[6]
-        inline_caller = line[7]
-        # check version 
-        perfLogsDict_vers = perfLogsDict[version]
-        if src_caller not in perfLogsDict_vers:
-            perfLogsDict_vers[src_caller] = {
-                'src_caller': src_caller,
-                'src_locs': set(),
-                'inline_locs': set(),
-                'inline_callers': set(),
-                'version': version,
-                'entry': 0,
-                'ef_entry': 0,
-                'dac_entry': 0,
-                'tripcount_sum': 0.0,
-                'granularity_sum': 0.0,
-                'depth_sum': 0.0
-            }
-        # add caller (mangled) name
-        perfLogsDict_vers[src_caller]['inline_locs'].add(inline_loc)
-        perfLogsDict_vers[src_caller]['src_locs'].add(src_loc)
-        perfLogsDict_vers[src_caller]['inline_callers'].add(inline_caller)
-        # update runtime argument distribution
-        perfLogsDict_vers[src_caller]['tripcount_sum'] += tripcount
-        perfLogsDict_vers[src_caller]['granularity_sum'] += granularity
-        perfLogsDict_vers[src_caller]['depth_sum'] += depth
-        # incr entry count
-        perfLogsDict_vers[src_caller]['entry'] += 1 
-        if (depth > 0):
-            perfLogsDict_vers[src_caller]['dac_entry'] += 1
-        else: 
-            perfLogsDict_vers[src_caller]['ef_entry'] += 1
-        
-        return 
+    parser = parse_perf_log_chunk if args.line_parser else parse_perf_log_chunk_columnar
+    perf_log_path = os.path.join(workdir, '{}.perf.log.gz'.format(test))
+    with self_profile.phase('log ingestion') as counters:
+        perfLogs_sorted = None
+        if args.sample:
+            perfLogs_sorted, nsampled, nblocks = sample_perf_log(perf_log_path, args.sample, mode=args.sample_mode, parser=parser, seed=args.seed)
+            if perfLogs_sorted is None:
+                print('<!> none of the {} blocks of {} was sampled, reading all of it'.format(nblocks, perf_log_path))
+            else:
+                print('<!> estimated from {} of {} blocks, +- are 95% confidence intervals (+-? when too few blocks to tell)'.format(nsampled, nblocks))
+        if perfLogs_sorted is None:
+            perfLogs_sorted = update_perf_summary(os.path.join(workdir, '{}.perf.short.json'.format(test)), perf_log_path,
+                                                  jobs=args.jobs, parser=parser)
+        counters['records'] = sum( logs['entry'] for logs in perfLogs_sorted )
 
-    try:
-        with open(os.path.join(workdir, '{}.perf.short.json'.format(test)), 'r') as f: #.backup
-            perfLogs_sorted = json.load(f)
-    except:
-        file_size = os.path.getsize(os.path.join(workdir, '{}.perf.log.gz'.format(test)))
-
-        perfLogsDict = {0: {}, 1: {}, 2: {}}
-        with gzip.open(os.path.join(workdir, '{}.perf.log.gz'.format(test)), 'rt') as f:
-            with tqdm(total=file_size, desc='Processing', unit='B', unit_scale=True, unit_divisor=1024) as pbar:
-                for line in f: 
-                    parse_perf_log(line.strip(), perfLogsDict)
-                    pbar.update(len(line.encode('utf-8')))
-
-        perfLogs = []
-        for _, perfLogs_vers in perfLogsDict.items(): 
-            for log in perfLogs_vers.values():
-                log['inline_locs'] = list(log['inline_locs'])
-                log['inline_callers'] = list(log['inline_callers'])
-                log['src_locs'] = list(log['src_locs'])
-                perfLogs.append(log)
-        perfLogs_sorted = sorted(perfLogs, key=lambda js:js['entry'])
-
-        # save temporary file
-        with open(os.path.join(workdir, '{}.perf.short.json'.format(test)), 'w') as f:
-            json.dump(perfLogs_sorted, f, indent=2)
-
-    perfLogs_EF = [ logs for logs in perfLogs_sorted if logs['version'] == 1 ]
-    perfLogs_DAC = [ logs for logs in perfLogs_sorted if logs['version'] == 2 ]
-    perfLogs_orig = [ logs for logs in perfLogs_sorted if logs['version'] == 0 ]
+    # rank call paths by how often their callers show up in the profile
+    with self_profile.phase('aggregation') as counters:
+        func_weight = None
+        if args.heaviest:
+            func_weight = Counter()
+            for logs in perfLogs_sorted:
+                func_weight[logs['src_caller']] += logs['entry']
+                for inline_caller in logs['inline_callers']:
+                    func_weight[inline_caller] += logs['entry']
+        call_history = CallHistory(cg, k=args.k, stop=major_callsites, weight=func_weight)
+
+        perfLogs_EF = [ logs for logs in perfLogs_sorted if logs['version'] == 1 ]
+        perfLogs_DAC = [ logs for logs in perfLogs_sorted if logs['version'] == 2 ]
+        perfLogs_orig = [ logs for logs in perfLogs_sorted if logs['version'] == 0 ]
+        counters['records'] = len(perfLogs_sorted)
+    # " p50/p90/p99:a/b/c" from the field's sketch; summaries written before sketches have none
+    def percentiles(logs, field):
+        sketch = logs.get(field + '_sketch')
+        if not sketch or sketch['min'] is None:
+            return ''
+        return ' p50/p90/p99:{}'.format('/'.join('{:g}'.format(sketch_quantile(sketch, q)) for q in [0.5, 0.9, 0.99]))
+    # "+-ci" of a --sample estimate, "+-?" when it has no interval
+    def ci(logs, key, fmt='{:.0f}'):
+        if 'sample' not in logs:
+            return ''
+        if math.isinf(logs['sample'][key][1]):
+            return '+-?'
+        return '+-' + fmt.format(logs['sample'][key][1])
     def print_perfLogs(perfLogs=None, indent=0):
         for logs in perfLogs:
             caller = logs['src_caller']
             entry = logs['entry']
-            avg_tc = "{:.2f}".format(logs['tripcount_sum'] / entry)
-            avg_gran = "{:.2f}".format(logs['granularity_sum'] / entry)
-            print("{}<{}> entry:{} ef:{} dac:{} avg.tc:{} avg.gran:{}\tcaller: {}".format('\t'*indent, parallel_for_version(logs['version']), logs['entry'], logs['ef_entry'], logs['dac_entry'], avg_tc, avg_gran, caller))
+            avg_tc = "{:.2f}".format(logs['tripcount_sum'] / entry) + ci(logs, 'tripcount_mean', '{:.2f}')
+            avg_gran = "{:.2f}".format(logs['granularity_sum'] / entry) + ci(logs, 'granularity_mean', '{:.2f}')
+            print("{}<{}> entry:{}{} ef:{}{} dac:{}{} avg.tc:{}{} avg.gran:{}{}\tcaller: {}".format('\t'*indent, parallel_for_version(logs['version']),
+                  logs['entry'], ci(logs, 'entry'), logs['ef_entry'], ci(logs, 'ef_entry'), logs['dac_entry'], ci(logs, 'dac_entry'),
+                  avg_tc, percentiles(logs, 'tripcount'), avg_gran, percentiles(logs, 'granularity'), caller))
             for sloc in logs['src_locs']:
                 print('{}\tsource code at: {}'.format('\t'*indent, sloc))
 
@@ -498,106 +2926,433 @@ def interpretProfilingResults(args, workdir=None, test=None, major_files=None, m
                         print("{}".format(unfold_call_history(caller, indent=2)))
                 print('\n')
 
+    # grain size / ef vs dac recommendations for the -test tree
+    if args.recommend:
+        workers = max(int(w) for w in args.workers.split(','))
+        with self_profile.phase('aggregation') as counters:
+            recs = recommend_grains(perfLogs_sorted, workers, args.spawn_cost)
+            counters['records'] = len(perfLogs_sorted)
+        print('-- recommendations ({} workers, spawn cost {:g}): '.format(workers, args.spawn_cost))
+        for rec in recs:
+            current = '{:.0f}'.format(rec['current_granularity']) if rec['current_time'] is not None else 'default'
+            print('\t<{}> grain:{} (now {}) expected:{:.4g}{} ef/dac:{:.4g}/{:.4g} entry:{} avg.tc:{:.2f} avg.depth:{:.2f}\tcaller: {}'.format(
+                  rec['mode'], rec['granularity'], current, rec['time'],
+                  ' (now {:.4g})'.format(rec['current_time']) if rec['current_time'] is not None else '',
+                  rec['ef_time'], rec['dac_time'], rec['entry'], rec['avg_tripcount'], rec['avg_depth'], rec['src_caller']))
+        with open(os.path.join(workdir, '{}.grain.json'.format(test)), 'w') as f:
+            json.dump({'workers': workers, 'spawn_cost': args.spawn_cost, 'recommendations': recs}, f, indent=2)
+        print("write recommendations to --> {}".format(os.path.join(workdir, '{}.grain.json'.format(test))))
+        write_grain_header(os.path.join(workdir, '{}.grain.h'.format(test)), recs, '{}.perf.short.json'.format(test), workers, args.spawn_cost)
+        print("write recommendations to --> {}".format(os.path.join(workdir, '{}.grain.h'.format(test))))
+
     # print performance profiling results for parallel_for
-    print('-- orig: ')
-    print_perfLogs(perfLogs=perfLogs_orig, indent=1)
+    with self_profile.phase('output') as counters:
+        print('-- orig: ')
+        print_perfLogs(perfLogs=perfLogs_orig, indent=1)
+        counters['records'] = len(perfLogs_orig)
     # print performance profiling results for parallel_for_ef or parallel_for_dac
     # print('-- ef: ')
     # print_perfLogs(perfLogs=perfLogs_EF, indent=1)
     # print('-- dac: ')
     # print_perfLogs(perfLogs=perfLogs_DAC, indent=1)
 
+###############################################################################
+# resident query server: -SERVE and its -Q client
+###############################################################################
+# The server keeps the parsed inputs of one test (call graphs, CallHistory memo,
+# static results, profile summary) in memory, each loaded on its first query.
+# Every client connection gets its own thread; loads are serialized, and the
+# CallHistory tables only ever gain entries that don't depend on who computed them.
+# Requests and responses are one json line each over a unix socket:
+#   {"query": "callers", "args": ["<mangled name>"], "k": 10}
+#   {"ok": true, "text": "...", "result": ...}
+# Queries:
+#   callers <func>     callsites calling func in the -cp call graph
+#   paths <cilkfor ID> call paths to each callsite of a cilkfor (as in the worklist)
+#   profile <caller>   profile records of a src_caller (or of callers containing it)
+#   ir <func> [<block>] IR of a function or block from the indexed <exe>Link-pr.ll
+#   reload             drop everything loaded, e.g. after re-running prr.sh
+#   stop               shut the server down
+
+# default socket of a test's server; AF_UNIX paths must stay short, so not in basedir
+def server_socket_path(args, test):
+    import tempfile
+    return args.socket or os.path.join(tempfile.gettempdir(), 'pbbs_v2.{}.{}.sock'.format(os.getuid(), test))
+
+class QueryState(object):
+    def __init__(self, args, test):
+        import threading
+        self.args, self.test = args, test
+        self.loaded = {}
+        self.lock = threading.RLock()
+
+    def get(self, name, load):
+        loaded = self.loaded
+        if name not in loaded:
+            with self.lock:
+                if name not in loaded:
+                    start = time.time()
+                    loaded[name] = load()
+                    print('<< loaded {} in {:.2f}s'.format(name, time.time() - start))
+        return loaded[name]
+
+    def call_graph(self):
+        workdir = benchmark_dir(self.test, 'cp')
+        return self.get('call graph', lambda: CallGraph.load(os.path.join(workdir, r'{}.cg.json'.format(self.test)),
+                                                             scc_path=os.path.join(workdir, r'{}.scc.json'.format(self.test)),
+                                                             cache=self.args.cache))
+
+    # one memoized CallHistory per number of paths asked for
+    def call_history(self, k):
+        return self.get('call history k={}'.format(k), lambda: CallHistory(self.call_graph(), k=k))
+
+    # {ID: record} of <test>.instr.cilkfor.json (-A output), else of <test>.cilkfor.json
+    def static(self):
+        def load():
+            workdir = benchmark_dir(self.test, 'cp')
+            for path in [ os.path.join(workdir, name.format(self.test)) for name in ['{}.instr.cilkfor.json', '{}.instr.cilkfor.json.gz', '{}.cilkfor.json'] ]:
+                if os.path.exists(path):
+                    break
+            return { js['ID']: js for js in load_json(path, cache=self.args.cache) }
+        return self.get('static results', load)
+
+    def profile(self):
+        return self.get('profile', lambda: load_profile(self.args, benchmark_dir(self.test, 'test'), self.test))
+
+    def ir_index(self):
+        return self.get('IR index', lambda: IRIndex.load(ll_path(self.args, self.test), cache=self.args.cache))
+
+    def callers(self, func_name):
+        cg = self.call_graph()
+        f = cg.lookup(func_name)
+        if f is None:
+            return [], '<!> {} is not in the call graph'.format(func_name)
+        result = [ {'prr': cg.callsite_prr(e), 'loc': cg.callsite_loc(e), 'caller': cg.caller_mangled_name(e)} for e in cg.callsites(f) ]
+        return result, '\n'.join( '{}  {}\t{}'.format(r['prr'], r['loc'], r['caller']) for r in result ) or '{} has no callers'.format(func_name)
+
+    def paths(self, ID, k=None):
+        js = self.static().get(ID)
+        if js is None:
+            return [], '<!> {} is not a static cilkfor result'.format(ID)
+        call_history = self.call_history(k or self.args.k)
+        cg = call_history.cg
+        def callsite_line(e):
+            return '{}  {}\t{}'.format(cg.callsite_prr(e), cg.callsite_loc(e), cg.caller_mangled_name(e))
+        result, lines = [], ['{}\t{}'.format(js['prr'], ID)]
+        for kind in ['caller_EF', 'caller_DAC']:
+            for callsite in js.get(kind) or []:
+                name = callsite['mangled_name']
+                paths = [ '\n'.join( '\t\t' + line for line in format_call_path(call_history, path, callsite_line) ) for path in call_history.best(name) ]
+                npaths = call_history.count(name)
+                result.append({'kind': kind, 'file': normpath(callsite['file']), 'ln': callsite['ln'], 'col': callsite['col'],
+                               'caller': name, 'npaths': npaths, 'paths': paths})
+                lines.append('\t{}\t{}:{}:{}\tcaller: {}'.format(kind, normpath(callsite['file']), callsite['ln'], callsite['col'], callsite['caller']))
+                lines.extend( '\n\t- [ ] --\n' + path for path in paths )
+                if npaths > len(paths):
+                    lines.append('\t<!> only show {} of {} callpaths!'.format(len(paths), npaths))
+        return result, '\n'.join(lines)
+
+    def profile_of(self, src_caller):
+        perfLogs = self.profile()
+        found = [ logs for logs in perfLogs if logs['src_caller'] == src_caller or src_caller in logs['inline_callers'] ]
+        if not found:
+            found = [ logs for logs in perfLogs if src_caller in logs['src_caller'] ]
+        result = []
+        for logs in found:
+            rec = dict( (key, logs[key]) for key in ['version', 'src_caller', 'entry', 'ef_entry', 'dac_entry'] )
+            for field in SKETCH_FIELDS:
+                rec['avg_' + field] = logs[field + '_sum'] / logs['entry'] if logs['entry'] else None
+                sketch = logs.get(field + '_sketch')
+                if sketch and sketch['min'] is not None:
+                    rec['p50/p90/p99_' + field] = [ sketch_quantile(sketch, q) for q in [0.5, 0.9, 0.99] ]
+            rec['src_locs'], rec['inline_locs'] = list(logs['src_locs']), list(logs['inline_locs'])
+            result.append(rec)
+        lines = []
+        for rec in result:
+            lines.append('<v{}> entry:{} ef:{} dac:{} avg.tc:{:.2f} avg.gran:{:.2f} avg.depth:{:.2f}\tcaller: {}'.format(
+                rec['version'], rec['entry'], rec['ef_entry'], rec['dac_entry'], rec['avg_tripcount'] or 0, rec['avg_granularity'] or 0, rec['avg_depth'] or 0, rec['src_caller']))
+            lines.extend( '\tsource code at: {}'.format(loc) for loc in rec['src_locs'] )
+            lines.extend( '\tinlined at: {}'.format(loc) for loc in rec['inline_locs'] )
+        return result, '\n'.join(lines) or 'no profile records of {}'.format(src_caller)
+
+    # IR of a function (e.g. a worklist cilkfor ID), or of one of its blocks
+    def ir(self, func_name, label=None):
+        index = self.ir_index()
+        f = index.lookup(func_name)
+        if f is None:
+            return None, '<!> {} is not defined in {}'.format(func_name, index.path)
+        blocks = [ name for name, _ in index.block_labels(f) ]
+        if label is None:
+            return {'blocks': blocks, 'dbg': index.dbg_ir(f)}, index.function_ir(f)
+        text = index.block_ir(f, label)
+        if text is None:
+            return {'blocks': blocks}, '<!> {} has no block {}'.format(func_name, label)
+        return {'blocks': blocks}, text
+
+    def answer(self, request):
+        query, query_args = request.get('query'), request.get('args') or []
+        if query == 'reload':
+            with self.lock:
+                self.loaded = {}
+            return None, 'reloading on next query'
+        k = request.get('k', self.args.k)
+        handlers = {'callers': self.callers, 'paths': lambda ID: self.paths(ID, k), 'profile': self.profile_of, 'ir': self.ir}
+        if query not in handlers or not (len(query_args) == 1 or (query == 'ir' and len(query_args) == 2)):
+            raise ValueError('usage: callers <func> | paths <cilkfor ID> | profile <src_caller> | ir <func> [<block>] | reload | stop')
+        return handlers[query](*query_args)
+
+def serveQueries(args, test=None):
+    import socketserver
+    import threading
+
+    class QueryHandler(socketserver.StreamRequestHandler):
+        def handle(self):
+            for line in self.rfile:
+                start = time.time()
+                try:
+                    request = json.loads(line)
+                    if request.get('query') == 'stop':
+                        response = {'ok': True, 'text': 'stopping', 'result': None}
+                        # shutdown() waits for serve_forever, which runs on the main thread
+                        threading.Thread(target=self.server.shutdown).start()
+                    else:
+                        result, text = self.server.state.answer(request)
+                        response = {'ok': True, 'text': text, 'result': result}
+                except Exception as e:
+                    response = {'ok': False, 'text': '<!> {}: {}'.format(type(e).__name__, e), 'result': None}
+                response['seconds'] = time.time() - start
+                self.wfile.write((json.dumps(response) + '\n').encode())
+                self.wfile.flush()
+
+    path = server_socket_path(args, test)
+    if os.path.exists(path):
+        os.unlink(path)
+    server = socketserver.ThreadingUnixStreamServer(path, QueryHandler)
+    server.daemon_threads = True
+    server.state = QueryState(args, test)
+    print('-- serving {} queries on {} (stop with -Q stop)'.format(test, path))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        os.unlink(path)
+
+def queryServer(args, test=None, query=None):
+    import socket
+    path = server_socket_path(args, test)
+    client = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        client.connect(path)
+    except (OSError, IOError):
+        print('<!> no server on {} (start one with -T {} -SERVE)'.format(path, test))
+        exit(1)
+    with client, client.makefile('rwb') as f:
+        f.write((json.dumps({'query': query[0], 'args': query[1:], 'k': args.k}) + '\n').encode())
+        f.flush()
+        response = json.loads(f.readline())
+    print(response['text'])
+    if args.v:
+        print('<< answered in {:.1f}ms'.format(response['seconds'] * 1000))
+    if not response['ok']:
+        exit(1)
+
+###############################################################################
+# benchmark driver: -T <test> and -T all
+###############################################################################
+def runBenchmark(args, test=None):
+    bench = BENCHMARKS[test]
+    if args.analysis:
+        compileAnalysisAndInstrumentResults(
+            args,
+            workdir=benchmark_dir(test, 'cp'),
+            test=test,
+            profile_workdir=benchmark_dir(test, 'test'))
+    if args.run:
+        runPerformanceExperiment(
+            args,
+            test=test,
+            orig_exe=os.path.join(benchmark_dir(test, 'cp'), bench['exe']),
+            test_exe=os.path.join(benchmark_dir(test, 'test'), bench['exe']),
+            test_data=bench['test_data'])
+    if args.parlaytime:
+        interpretPerfTestResults(
+            args,
+            test=test,
+            res_dir=parlaytime_result_dir(test),
+            id=args.experiment_id)
+    if args.profile:
+        interpretProfilingResults(
+            args,
+            workdir=benchmark_dir(test, 'test'),
+            test=test,
+            major_files=bench['major_files'],
+            major_funcs=bench['major_funcs'])
+
+# runBenchmark with its output in log_path; a failure (exception or exit(1)) is
+# reported instead of raised, so one test can't take the others down
+def runBenchmarkLogged(args, test=None, log_path=None):
+    start = time.time()
+    status, error = 'ok', None
+    with open(log_path, 'w') as log, contextlib.redirect_stdout(log), contextlib.redirect_stderr(log), self_profile.phase(test):
+        try:
+            runBenchmark(args, test=test)
+        except SystemExit as e:
+            if e.code:
+                status, error = 'failed', 'exit({})'.format(e.code)
+        except Exception as e:
+            import traceback
+            traceback.print_exc()
+            status, error = 'failed', '{}: {}'.format(type(e).__name__, e)
+    # --self-profile phases of a pool worker go back to the main process with the result
+    return {'test': test, 'status': status, 'error': error, 'seconds': time.time() - start, 'log': log_path, 'self_profile': self_profile.take()}
+
+# every registered test: -RUN experiments one test after another (they time the
+# machine), then -A/-PARLAY/-PROFILE post-processing of all tests in a process pool.
+# Logs and the combined summary go to data/all/<dt>.*
+def runAllBenchmarks(args, dt=None):
+    from concurrent.futures import ProcessPoolExecutor
+    log_dir = os.path.join(basedir, 'data/all')
+    if not os.path.exists(log_dir):
+        os.makedirs(log_dir)
+    modes = [ mode for mode in ['analysis', 'run', 'parlaytime', 'profile'] if getattr(args, mode) ]
+    results = []
+    if args.run:
+        run_args = argparse.Namespace(**dict(vars(args), analysis=False, parlaytime=False, profile=False))
+        for test in BENCHMARKS:
+            print('-- {}: run experiment ...'.format(test))
+            results.append(dict(runBenchmarkLogged(run_args, test=test, log_path=os.path.join(log_dir, '{}.{}.run.log'.format(dt, test))), mode='run'))
+    post_args = argparse.Namespace(**dict(vars(args), run=False))
+    if post_args.analysis or post_args.parlaytime or post_args.profile:
+        post_modes = '-'.join( mode for mode in modes if mode != 'run' )
+        with ProcessPoolExecutor(max_workers=min(len(BENCHMARKS), multiprocessing.cpu_count())) as pool:
+            futures = [ pool.submit(runBenchmarkLogged, post_args, test, os.path.join(log_dir, '{}.{}.{}.log'.format(dt, test, post_modes)))
+                        for test in BENCHMARKS ]
+            print('-- {} tests: {} ...'.format(len(futures), post_modes))
+            for future in futures:
+                results.append(dict(future.result(), mode=post_modes))
+
+    for res in results:
+        for rec in res.pop('self_profile'):
+            self_profile.add(rec)
+    print('\n-- summary: ')
+    for res in results:
+        print('\t{:<24}{:<28}{:<8}{:>9.1f}s\t{}{}'.format(res['test'], res['mode'], res['status'], res['seconds'], res['log'],
+              '\n\t\t<!> {}'.format(res['error']) if res['error'] else ''))
+    summary_path = os.path.join(log_dir, '{}.summary.json'.format(dt))
+    with open(summary_path, 'w') as f:
+        json.dump({'datetime': dt, 'modes': modes, 'experiment_id': args.experiment_id, 'ece': args.ece, 'results': results}, f, indent=2)
+    print("write summary to --> {}".format(summary_path))
+    return all( res['status'] == 'ok' for res in results )
+
 if __name__ == "__main__":
     # take current timestamp
     dt = datetime_utcnow_strftime()
     # main runner argument parser
     argParser = argparse.ArgumentParser()
     argParser.add_argument("-v", "--verbose", dest='v', help='', action="store_true")
-    argParser.add_argument("-T", "--test", dest='test', help='')
+    argParser.add_argument("-T", "--test", dest='test', help='registered test ({}) or all'.format(', '.join(BENCHMARKS)))
+    argParser.add_argument('-k', dest='k', type=int, default=10, help='number of call paths shown per callsite')
+    argParser.add_argument('--gzip', dest='gzip', action='store_true', help='gzip the -A worklist and combined json outputs (<output>.gz)')
+    argParser.add_argument('--no-cache', dest='cache', action='store_false', help='ignore and do not write <input>.cache next to parsed json inputs')
+    argParser.add_argument('--heaviest-paths', dest='heaviest', action='store_true', help='show heaviest call paths by profiled entry count instead of shortest (-PROFILE)')
     # prr static analysis result parsing
     argParser.add_argument('-A', '--analysis-and-instrument', dest='analysis', help='parse prr static analysis result and generate parallel_for substitution worklist', action='store_true')
     # parlaytime result parsing
     argParser.add_argument('-PARLAY', '--parlaytime-statistic', dest='parlaytime', help='', action='store_true') 
+    # adaptive performance experiment
+    argParser.add_argument('-RUN', '--run-experiment', dest='run', action='store_true', help='run orig vs test performance experiment until each mean parlaytime is tight enough')
+    argParser.add_argument('--workers', dest='workers', default='1,2,4,8,14,28', help='CILK_WORKERS counts to sweep (-RUN), the largest is modeled by --recommend')
+    argParser.add_argument('--warmup', dest='warmup', type=int, default=1, help='leading rounds discarded per process (-RUN)')
+    argParser.add_argument('--batch', dest='batch', type=int, default=5, help='rounds kept per process (-RUN)')
+    argParser.add_argument('--min-runs', dest='min_runs', type=int, default=5, help='rounds kept per configuration at least (-RUN)')
+    argParser.add_argument('--max-runs', dest='max_runs', type=int, default=20, help='rounds kept per configuration at most (-RUN)')
+    argParser.add_argument('--ci-rel', dest='ci_rel', type=float, default=0.01, help='stop once the 95%% ci of the mean is within this fraction of it (-RUN)')
+    argParser.add_argument('--no-pin', dest='pin', action='store_false', help='do not pin runs to the first CILK_WORKERS cpus (-RUN)')
+    argParser.add_argument('--perf-events', dest='perf_events', default='icache.misses,icache.hit', help='perf stat events recorded per run, empty for none (-RUN)')
     argParser.add_argument('-id', dest='experiment_id', default=None, help='experiment timestamp for result identification')
     argParser.add_argument('-ece', dest='ece', default=None, help='ece cluster machine number')
+    argParser.add_argument('--alpha', dest='alpha', type=float, default=0.05, help='significance level of the orig vs test comparison (-PARLAY)')
+    # results store of all parlaytime/icache experiments
+    argParser.add_argument('--store', dest='store', default=None, help='results sqlite db (default: perf/results.sqlite)')
+    argParser.add_argument('-STORE', '--store-ingest', dest='store_ingest', action='store_true', help='ingest all perf/<test>/*.csv results (of -T test only, if given) into the results store')
+    argParser.add_argument('-SCALE', '--scalability', dest='scalability', action='store_true', help='speedup, efficiency and Karp-Flatt report of -T test across stored runs (on -ece machine only, if given)')
+    argParser.add_argument('-SPEEDUP', '--speedup', dest='speedup', action='store_true', help='speedup of test over orig for -T test across stored runs (on -ece machine only, if given)')
     # performance profiling result parsing
     argParser.add_argument('-PROFILE', '--perf-profiling', dest='profile', help='', action='store_true')
+    argParser.add_argument('--line-parser', dest='line_parser', action='store_true', help='parse <test>.perf.log.gz line by line instead of by columnar blocks')
+    argParser.add_argument('--sample', dest='sample', type=sample_fraction, default=None, help='estimate the profile from this fraction (0, 1] of <test>.perf.log.gz blocks (-PROFILE)')
+    argParser.add_argument('--sample-mode', dest='sample_mode', choices=['stride', 'random'], default='stride', help='every n-th block or independently drawn blocks (--sample)')
+    argParser.add_argument('--seed', dest='seed', type=int, default=None, help='random seed for --sample and bootstrap resampling')
+    argParser.add_argument('--recommend', dest='recommend', action='store_true', help='write grain size and ef/dac recommendations per src_caller to <test>.grain.json and <test>.grain.h (-PROFILE)')
+    argParser.add_argument('--spawn-cost', dest='spawn_cost', type=float, default=50.0, help='cost of a spawn in loop iterations assumed by --recommend')
+    argParser.add_argument('-DIFF', '--profile-diff', dest='diff', nargs=2, metavar=('A', 'B'), default=None, help='diff two <test>.perf.short.json profiles by call site (-k sites per status, -v for all)')
+    # resident query server
+    argParser.add_argument('-SERVE', '--serve', dest='serve', action='store_true', help='keep -T test call graph, static results and profile loaded and answer -Q queries')
+    argParser.add_argument('-Q', '--query', dest='query', nargs='+', default=None, metavar='WORD', help='ask the -SERVE server of -T test: callers <func> | paths <cilkfor ID> | profile <src_caller> | ir <func> [<block>] | reload | stop')
+    argParser.add_argument('--socket', dest='socket', default=None, help='unix socket of -SERVE/-Q (default: <tmp>/pbbs_v2.<uid>.<test>.sock)')
+    # linked IR lookup
+    argParser.add_argument('-IR', '--ir', dest='ir', nargs='+', default=None, metavar=('FUNC', 'BLOCK'), help='print the IR of a function (or of one of its blocks) from -T test <exe>Link-pr.ll')
+    argParser.add_argument('--ir-check', dest='ir_check', action='store_true', help='cross-check the .func/.block/.loop/.ef/.dac/.dbg.csv tables against the indexed IR')
+    argParser.add_argument('--ll', dest='ll', default=None, help='linked IR file of -IR/--ir-check (default: the first <test>-{cp,test}/*/<exe>Link-pr.ll)')
+    argParser.add_argument('-j', '--jobs', dest='jobs', type=int, default=1, help='worker processes parsing <test>.perf.log.gz (0: one per cpu)')
+    argParser.add_argument('--self-profile', dest='self_profile', nargs='?', const='', default=None, metavar='JSON', help='time/memory per phase of this run, reported at exit to JSON (default: data/selfprofile/<dt>.<test>.json)')
     args = argParser.parse_args()
+    if args.jobs <= 0:
+        args.jobs = multiprocessing.cpu_count()
+    # written at exit, however the run ends
+    if args.self_profile is not None:
+        self_profile.start()
+        atexit.register(self_profile.write, args.self_profile or os.path.join(basedir, 'data/selfprofile/{}.{}.json'.format(dt, args.test)),
+                        {'datetime': dt, 'test': args.test, 'argv': sys.argv[1:]})
     # os.walk parameters
     exclude_dirs = ['venv']
 
-    #### parse instrumentation result
-    def parlaytime_result_dir(testname=None):
-        return os.path.join(basedir, 'data/{}'.format(testname))
-
     if args.parlaytime:
         if not args.experiment_id: 
             print("Must supply experiment id (printed at the end of performance experiment)!")
             exit(1)
+    if args.parlaytime or args.run:
         if not args.ece: 
             print("Must supply ece cluster machine id!")
             exit(1)
 
-    if (args.test == "delaunayTriangulation"):
-        if args.analysis:
-            compileAnalysisAndInstrumentResults(
-                args, 
-                workdir=os.path.join(basedir, r'delaunayTriangulation-cp/incrementalDelaunay'),
-                test=args.test)
-        if args.parlaytime: 
-            interpretPerfTestResults(
-                args,
-                test=args.test,
-                res_dir=parlaytime_result_dir('delaunayTriangulation'), 
-                id=args.experiment_id)
-        if args.profile:
-            interpretProfilingResults(
-                args,
-                workdir=os.path.join(basedir, r'delaunayTriangulation-test/incrementalDelaunay'),
-                test=args.test,
-                major_files=['delaunay.C', 'delaunayTime.C'],
-                major_funcs=['delaunay'])
-            
-
-    elif (args.test == "wordCounts"):
-        if args.analysis:
-            compileAnalysisAndInstrumentResults(
-                args, 
-                workdir=os.path.join(basedir, r'wordCounts-cp/histogram'), 
-                test=args.test)
-        if args.parlaytime: 
-            interpretPerfTestResults(
-                args, 
-                test=args.test,
-                res_dir=parlaytime_result_dir('wordCounts'), 
-                id=args.experiment_id)
-        if args.profile:
-            interpretProfilingResults(
-                args,
-                workdir=os.path.join(basedir, r'wordCounts-test/histogram'),
-                test=args.test,
-                major_files=['wc.C', 'wcTime.C'],
-                major_funcs=['wordCounts', 'timeWordCounts'])
- 
-    elif (args.test == "classify"):
-        if args.analysis:
-            compileAnalysisAndInstrumentResults(
-                args,
-                workdir=os.path.join(basedir, r'classify-cp/decisionTree'),
-                test=args.test)
-        if args.parlaytime: 
-            interpretPerfTestResults(
-                args, 
-                test=args.test,
-                res_dir=parlaytime_result_dir('classify'), 
-                id=args.experiment_id)
-        if args.profile:
-            interpretProfilingResults(
-                args,
-                workdir=os.path.join(basedir, r'classify-test/decisionTree'),
-                test=args.test,
-                major_files=['classify.C', 'classifyTime.C'],
-                major_funcs=['classify'])
+    # resident server / its client, before anything else gets loaded
+    if args.serve or args.query:
+        if args.test not in BENCHMARKS:
+            print('Error: wrong test name!')
+            exit(1)
+        if args.query:
+            queryServer(args, test=args.test, query=args.query)
+        else:
+            serveQueries(args, test=args.test)
+        exit(0)
+
+    if args.ir or args.ir_check:
+        if args.test not in BENCHMARKS and not args.ll:
+            print('Error: wrong test name!')
+            exit(1)
+        showIR(args, test=args.test)
+        exit(0)
+
+    report_tests = list(BENCHMARKS) if args.test == 'all' else [args.test]
+    if args.store_ingest or args.speedup:
+        for test in report_tests:
+            queryResultStore(args, test=test)
+    if args.scalability:
+        for test in report_tests:
+            scalabilityReport(args, test=test)
+    if args.diff:
+        diffProfiles(args, *args.diff)
+    if (args.store_ingest or args.speedup or args.scalability or args.diff) and not (args.analysis or args.run or args.parlaytime or args.profile):
+        exit(0)
+
+    if args.test == 'all':
+        if not runAllBenchmarks(args, dt=dt):
+            exit(1)
+    elif args.test in BENCHMARKS:
+        runBenchmark(args, test=args.test)
     else:
         print('Error: wrong test name!')
         exit(1)
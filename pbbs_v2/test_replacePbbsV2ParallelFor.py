@@ -0,0 +1,989 @@
+import os
+import sys
+import gzip
+import json
+import random
+import shutil
+import sqlite3
+import argparse
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import replacePbbsV2ParallelFor as pv
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+def analysis_args(**overrides):
+    options = dict(v=False, k=10, cache=False, gzip=False, jobs=1)
+    options.update(overrides)
+    return argparse.Namespace(**options)
+
+###############################################################################
+# binary cache
+###############################################################################
+# a changed input is re-read; a touched but unchanged one keeps its cache
+def test_load_json_cache_invalidation(tmp_path):
+    path = str(tmp_path / 'a.cilkfor.json')
+    with open(path, 'w') as f:
+        json.dump([{'ID': 'x', 'prr': 'defef'}], f)
+    assert pv.load_json(path) == [{'ID': 'x', 'prr': 'defef'}]
+    assert pv.read_cache(path, [path]) is not None
+    os.utime(path, ns=(1, 1))
+    assert pv.read_cache(path, [path]) is not None
+    with open(path, 'w') as f:
+        json.dump([{'ID': 'y', 'prr': 'defef'}], f)
+    os.utime(path, ns=(1, 1))
+    assert pv.read_cache(path, [path]) is None
+    assert pv.load_json(path) == [{'ID': 'y', 'prr': 'defef'}]
+    assert pv.read_cache(path, [path]) is not None
+
+def call_graph_summary(cg):
+    return ([ [ (cg.caller_mangled_name(e), cg.callsite_loc(e), cg.callsite_prr(e)) for e in cg.callsites(f) ] for f in range(len(cg.funcs)) ],
+            list(cg.comp), [ list(cg.comp_callsites(c)) for c in range(cg.ncomp) ])
+
+# a warm call graph load is the cold one, and a new .scc.json invalidates it
+def test_call_graph_cache(tmp_path):
+    for ext in ['cg', 'scc']:
+        shutil.copy(os.path.join(HERE, 'wordCounts-cp/histogram/wordCounts.{}.json'.format(ext)), str(tmp_path))
+    cg_path, scc_path = str(tmp_path / 'wordCounts.cg.json'), str(tmp_path / 'wordCounts.scc.json')
+    cold = pv.CallGraph.load(cg_path, scc_path=scc_path)
+    assert pv.read_cache(cg_path, [cg_path, scc_path]) is not None
+    assert call_graph_summary(pv.CallGraph.load(cg_path, scc_path=scc_path)) == call_graph_summary(cold)
+    names = [ cold.funcs.strings[f] for f in range(2) ]
+    with open(scc_path, 'w') as f:
+        json.dump([{'scc': [ {'id': name} for name in names ]}], f)
+    assert pv.read_cache(cg_path, [cg_path, scc_path]) is None
+    warm = pv.CallGraph.load(cg_path, scc_path=scc_path)
+    assert warm.comp[warm.lookup(names[0])] == warm.comp[warm.lookup(names[1])]
+
+###############################################################################
+# streamed outputs
+###############################################################################
+# element by element, the same text as json.dump of the whole list
+def test_json_list_writer(tmp_path):
+    lists = [ [], [{}], [[]], [1, 'a\nb', None], [{'ID': 'x', 'caller_EF': [{'ln': 1, 'file': 'f'}], 'caller_DAC': None}, {'ID': 'y', 'caller_EF': []}] ]
+    for js in lists:
+        for indent in [None, 2, 4]:
+            path = str(tmp_path / 'out.json')
+            with pv.open_output(path, indent == 4) as f:
+                writer = pv.JsonListWriter(f, indent=indent)
+                for item in js:
+                    writer.append(item)
+                writer.close()
+            with (gzip.open(path + '.gz', 'rt') if indent == 4 else open(path)) as f:
+                assert f.read() == json.dumps(js, indent=indent)
+
+# each caller's call history is built once however many cilkfors share it, and
+# --gzip writes the same text compressed
+def test_analysis_shared_call_histories(tmp_path, monkeypatch):
+    cp = tmp_path / 'cp'
+    cp.mkdir()
+    for ext in ['cg', 'cilkfor', 'instr', 'scc']:
+        shutil.copy(os.path.join(HERE, 'wordCounts-cp/histogram/wordCounts.{}.json'.format(ext)), str(cp))
+    best = pv.CallHistory.best
+    queried = []
+    def counted_best(self, func_name):
+        queried.append(func_name)
+        return best(self, func_name)
+    monkeypatch.setattr(pv.CallHistory, 'best', counted_best)
+    pv.compileAnalysisAndInstrumentResults(analysis_args(), workdir=str(cp), test='wordCounts')
+    combined_callers = [ site['mangled_name'] for js in json.load(open(str(cp / 'wordCounts.instr.cilkfor.json')))
+                         for site in (js['caller_EF'] or []) + (js['caller_DAC'] or []) ]
+    assert len(queried) == len(set(queried)) < len(combined_callers)
+
+    pv.compileAnalysisAndInstrumentResults(analysis_args(gzip=True), workdir=str(cp), test='wordCounts')
+    for name in ['worklist.txt', 'worklist.json', 'instr.cilkfor.json']:
+        path = str(cp / 'wordCounts.{}'.format(name))
+        with open(path) as f, gzip.open(path + '.gz', 'rt') as fgz:
+            assert f.read() == fgz.read()
+    with open(str(cp / 'wordCounts.instr.cilkfor.json')) as f:
+        text = f.read()
+    assert text == json.dumps(json.loads(text), indent=4)
+
+###############################################################################
+# self-profile
+###############################################################################
+def test_self_profile_disabled():
+    profile = pv.SelfProfile()
+    with profile.phase('json load') as counters:
+        counters['records'] = 5
+    assert profile.take() == []
+
+# nested phases report by path, repeats add up, and a phase's peak covers its children
+def test_self_profile_phases(tmp_path, capsys):
+    import tracemalloc
+    profile = pv.SelfProfile()
+    profile.start()
+    try:
+        with profile.phase('output') as counters:
+            counters['records'] = 2
+            for _ in range(3):
+                with profile.phase('call history') as inner:
+                    block = bytearray(1 << 22)
+                    inner['records'] += 10
+                    del block
+            with profile.phase('json') as inner:
+                inner['records'] = 1
+        with profile.phase('aggregation'):
+            pass
+        with profile.phase('json load'):
+            pass
+        path = str(tmp_path / 'profile' / 'run.json')
+        profile.write(path, {'test': 't'})
+    finally:
+        tracemalloc.stop()
+    out = capsys.readouterr().out
+    assert '\toutput ' in out and '\t  call history ' in out
+
+    report = json.load(open(path))
+    assert report['test'] == 't' and report['wall'] >= 0 and report['max_rss'] > 0
+    phases = dict( (rec['phase'], rec) for rec in report['phases'] )
+    assert [ rec['phase'] for rec in report['phases'] ] == ['output', 'output/call history', 'output/json', 'aggregation', 'json load']
+    assert (phases['output/call history']['calls'], phases['output/call history']['records']) == (3, 30)
+    assert phases['output']['records'] == 2 and phases['output']['calls'] == 1
+    assert phases['output/call history']['peak_traced'] >= 1 << 22
+    assert phases['output']['peak_traced'] >= phases['output/call history']['peak_traced']
+    assert phases['aggregation']['peak_traced'] < 1 << 22
+    assert phases['output']['wall'] >= phases['output/call history']['wall'] + phases['output/json']['wall']
+
+    # records of a worker process are taken from it and added to the main one
+    taken = profile.take()
+    assert profile.take() == [] and len(taken) == 5
+    for rec in taken + taken:
+        profile.add(rec)
+    assert dict( (rec['phase'], rec['calls']) for rec in profile.tree() )['output/call history'] == 6
+
+###############################################################################
+# call graph
+###############################################################################
+def cg_callsite(caller, ln, prr='defef', file='t-cp/d/a.h', inlineHistory=''):
+    return {'caller_mangled_name': caller, 'caller_name': caller.lstrip('_Z0123456789'), 'col': 3, 'file': file,
+            'inlineHistory': inlineHistory, 'ln': ln, 'prr': prr}
+
+# the CSR graph holds what the old {func: json} dict did: per defined function its
+# callsites in .cg.json order, the last entry of a duplicated func, no callsites
+# for functions that only ever appear as callers
+def test_call_graph_csr():
+    cg_json = [
+        {'func': '_Z1fv', 'callsites': [cg_callsite('_Z1gv', 1), cg_callsite('_Z1hv', 2, 'both')]},
+        {'func': '_Z1gv', 'callsites': [cg_callsite('_Z1hv', 3)]},
+        {'func': '_Z1fv', 'callsites': [cg_callsite('_Z1hv', 4, 'defdac', 't-cp/d/x/../b.h'), cg_callsite('_Z1hv', 4, 'defdac', 't-cp/d/b.h', 'i'),
+                                        cg_callsite('_Z1gv', 5)]},
+    ]
+    cg = pv.CallGraph(cg_json)
+    f, g, h = [ cg.lookup(name) for name in ['_Z1fv', '_Z1gv', '_Z1hv'] ]
+    assert cg.lookup('_Z1xv') is None and len(cg) == 3
+    assert [ (cg.caller_mangled_name(e), cg.callsite_prr(e), cg.callsite_loc(e)) for e in cg.callsites(f) ] == [
+        ('_Z1hv', 'defdac', 't-cp/d/b.h:4:3\tcaller: hv'), ('_Z1gv', 'defef', 't-cp/d/a.h:5:3\tcaller: gv')]
+    assert [ cg.caller_mangled_name(e) for e in cg.callsites(g) ] == ['_Z1hv'] and list(cg.callsites(h)) == []
+
+# the committed wordCounts graph, edge for edge against its json
+def test_call_graph_matches_json():
+    path = os.path.join(HERE, 'wordCounts-cp/histogram/wordCounts.cg.json')
+    cg_json = json.load(open(path))
+    cg = pv.CallGraph(cg_json)
+    by_func = dict( (js['func'], js) for js in cg_json )
+    for func, js in by_func.items():
+        expected = []
+        for c in js['callsites']:
+            site = (c['caller_mangled_name'], '{}:{}:{}\tcaller: {}'.format(pv.normpath(c['file']), c['ln'], c['col'], c['caller_name']), c['prr'])
+            if site not in expected:
+                expected.append(site)
+        assert [ (cg.caller_mangled_name(e), cg.callsite_loc(e), cg.callsite_prr(e)) for e in cg.callsites(cg.lookup(func)) ] == expected
+
+###############################################################################
+# call history
+###############################################################################
+# random graph over _Z2f<i>v: mostly calls from lower to higher i, some back to
+# build cycles, and an .scc.json style ring
+def random_call_graph(rng, n):
+    name = lambda i: '_Z2f{}v'.format(i)
+    cg_json = []
+    for i in range(n):
+        callers = [ rng.randrange(i) for _ in range(rng.randint(0, 3)) ] if i else []
+        if rng.random() < 0.1:
+            callers.append(rng.randrange(i, n))
+        cg_json.append({'func': name(i), 'callsites': [ cg_callsite(name(c), 10 + j) for j, c in enumerate(callers) ]})
+    ring = [ name(i) for i in rng.sample(range(n), 3) ]
+    return pv.CallGraph(cg_json).condense([ring]), [ name(i) for i in range(n) ], ring
+
+# every call path over the condensed graph, with its cost
+def brute_force_paths(cg, c, cost, stop):
+    edges = cg.comp_callsites(c)
+    if not len(edges):
+        return [((), (0, 0))]
+    paths = []
+    for e in edges:
+        tails = [((), (0, 0))] if stop[e] else brute_force_paths(cg, cg.comp[cg.callers[e]], cost, stop)
+        for tail, tail_cost in tails:
+            paths.append(((e,) + tail, (cost(e)[0] + tail_cost[0], cost(e)[1] + tail_cost[1])))
+    return paths
+
+# components are the mutually reachable functions plus the forced ring
+def test_condense_components():
+    rng = random.Random(1)
+    for _ in range(20):
+        cg, names, ring = random_call_graph(rng, 25)
+        n = len(cg.funcs)
+        succ = [ set(cg.callers[e] for e in cg.callsites(f)) for f in range(n) ]
+        ids = [ cg.lookup(name) for name in ring ]
+        for a, b in zip(ids, ids[1:] + ids[:1]):
+            succ[a].add(b)
+        reach = []
+        for f in range(n):
+            seen, work = {f}, [f]
+            while work:
+                for g in succ[work.pop()] - seen:
+                    seen.add(g)
+                    work.append(g)
+            reach.append(seen)
+        for f in range(n):
+            assert set( g for g in range(n) if cg.comp[g] == cg.comp[f] ) == set( g for g in reach[f] if f in reach[g] )
+
+# DP path counts and k best paths (shortest, heaviest, with stop callsites) agree
+# with enumerating every path
+def test_call_history_against_brute_force():
+    rng = random.Random(2)
+    for trial in range(30):
+        cg, names, _ = random_call_graph(rng, 14)
+        weight = dict( (name, rng.randrange(5)) for name in names ) if trial % 2 else None
+        stop = bytearray( rng.random() < 0.15 for _ in range(len(cg.callers)) ) if trial % 3 == 0 else None
+        k = rng.randint(1, 6)
+        call_history = pv.CallHistory(cg, k=k, stop=stop, weight=weight)
+        for name in names:
+            expected = brute_force_paths(cg, cg.comp[cg.lookup(name)], call_history.edge_cost, stop or bytearray(len(cg.callers)))
+            assert call_history.count(name) == len(expected)
+            best = call_history.best(name)
+            costs = dict(expected)
+            assert len(set(best)) == len(best) == min(k, len(expected)) and all( path in costs for path in best )
+            assert [ costs[path] for path in best ] == sorted( cost for _, cost in expected )[:len(best)]
+
+###############################################################################
+# perf log parsing
+###############################################################################
+def perf_logs_by_line(chunk):
+    perfLogsDict = pv.new_perf_logs()
+    for line in chunk.decode('utf-8').split('\n'):
+        if line.strip():
+            pv.parse_perf_log(line.strip(), perfLogsDict)
+    return pv.flatten_perf_logs(perfLogsDict)
+
+PERF_LOG_LINES = [
+    '0,273,10,0,t/p.h:51:5,_Z6pfor1v,t/f1.h:335:9,_Z5f1v',
+    '0,1,59,0,t/p.h:51:5,_Z6pfor1v,t/f2.h:12:9,_Z5f2v',
+    '1,123456789012,2048,3,t/p.h:297:27,_Z6pdac1v,t/f3.h:97:24,_Z5f3v',
+    '2,40,0,17,t/p.h:72:16,_Z6pfor1v,t/' + 'long/' * 30 + 'f4.h:1:1,_Z5f4v',
+    '0,0,1,0,t/p.h:51:5,_Z6pfor1v,t/f1.h:335:9,_Z5f1v',
+]
+
+# the columnar parser, the line parser and parse_perf_log line by line agree,
+# also on blocks the columnar parser hands to the line parser
+def test_perf_log_chunk_parsers_agree():
+    blocks = [
+        '\n'.join(PERF_LOG_LINES * 3) + '\n',
+        '\n'.join(PERF_LOG_LINES),                  # no trailing newline
+        '\r\n'.join(PERF_LOG_LINES) + '\r\n',
+        '\n'.join(PERF_LOG_LINES[:2] + [''] + PERF_LOG_LINES[2:]) + '\n',
+        '0,5,1,0,x,_Z1av,y,_Z1bv\n' + '\n'.join(PERF_LOG_LINES) + '\n',
+        # fields the columnar parser doesn't read itself
+        '\n'.join(PERF_LOG_LINES + ['0,+5,1,0,x,_Z1av,y,_Z1bv']) + '\n',
+        '\n'.join(PERF_LOG_LINES + ['0,-5,1,0,x,_Z1av,y,_Z1bv']) + '\n',
+        '\n'.join(PERF_LOG_LINES + ['0, 5,1,0,x,_Z1av,y,_Z1bv']) + '\n',
+        '\n'.join(PERF_LOG_LINES + ['0,1234567890123456789,1,0,x,_Z1av,y,_Z1bv']) + '\n',
+        '\n'.join(PERF_LOG_LINES + ['0,5,1,' + '0' * 40 + ',x,_Z1av,y,_Z1bv']) + '\n',
+    ]
+    for block in blocks:
+        chunk = block.encode('utf-8')
+        expected = perf_logs_by_line(chunk)
+        assert pv.flatten_perf_logs(pv.parse_perf_log_chunk(chunk)) == expected
+        assert pv.flatten_perf_logs(pv.parse_perf_log_chunk_columnar(chunk)) == expected
+    assert pv.flatten_perf_logs(pv.parse_perf_log_chunk_columnar(b'')) == []
+
+# random 8-field perf log lines over a few dozen (version, tail) groups
+def random_perf_log(rng, nlines):
+    tails = [ 't/p.h:{}:5,_Z5pfor{}v,t/f{}.h:{}:9,_Z2f{}v'.format(rng.randrange(900), rng.randrange(8), i % 5, rng.randrange(900), i % 7)
+              for i in range(40) ]
+    lines = [ '{},{},{},{},{}'.format(rng.choice([0, 0, 1, 2]), int(2 ** (rng.random() * 20)), rng.randrange(65), rng.randrange(4),
+                                      tails[int(rng.paretovariate(1.2)) % len(tails)]) for _ in range(nlines) ]
+    return ('\n'.join(lines) + '\n').encode('utf-8')
+
+def write_perf_log(path, data):
+    with gzip.open(path, 'wb') as f:
+        f.write(data)
+
+# -j workers merge back to exactly the serial result (and to parse_perf_log line by line)
+def test_parallel_ingest_matches_serial(tmp_path):
+    data = random_perf_log(random.Random(3), 20000)
+    path = str(tmp_path / 't.perf.log.gz')
+    write_perf_log(path, data)
+    expected = perf_logs_by_line(data)
+    for parser in [pv.parse_perf_log_chunk, pv.parse_perf_log_chunk_columnar]:
+        for jobs in [1, 3, 4]:
+            perfLogsDict, offset = pv.ingest_perf_log(path, jobs=jobs, chunk_size=1 << 14, parser=parser)
+            assert offset == len(data)
+            assert pv.flatten_perf_logs(perfLogsDict) == expected
+
+###############################################################################
+# runtime-argument sketches
+
+SKETCH_VALUES = list(range(70)) + [ 2 ** e + d for e in range(5, 62) for d in [-1, 0, 1, 3] ] + [ 2 ** 63 - 1 ]
+
+# every value falls inside its bin's range, and the vectorized binning agrees
+def test_sketch_bins_cover_values():
+    for value in SKETCH_VALUES:
+        lo, hi = pv.sketch_bin_range(pv.sketch_bin(value))
+        assert lo <= value <= hi
+    assert pv.sketch_bins(pv.np.array(SKETCH_VALUES, dtype=pv.np.int64)).tolist() == [ pv.sketch_bin(v) for v in SKETCH_VALUES ]
+    # bins stay logarithmic: at most 2**SKETCH_BITS per power of two
+    assert len({ pv.sketch_bin(v) for v in range(1 << 20) }) <= (20 - pv.SKETCH_BITS + 2) << (pv.SKETCH_BITS - 1)
+
+def sketch_of(values):
+    sketch = pv.new_sketch()
+    for value in values:
+        pv.sketch_add(sketch, value)
+    return sketch
+
+# merging sketches of two halves equals sketching the whole
+def test_merge_sketch():
+    rng = random.Random(6)
+    values = [ int(rng.paretovariate(0.8)) for _ in range(5000) ]
+    assert pv.merge_sketch(sketch_of(values[:1234]), sketch_of(values[1234:])) == sketch_of(values)
+    assert pv.merge_sketch(pv.new_sketch(), sketch_of(values)) == sketch_of(values)
+    assert pv.merge_sketch(sketch_of(values), pv.new_sketch()) == sketch_of(values)
+
+# quantiles land in the bin of the exact quantile, within [min, max]
+def test_sketch_quantile():
+    rng = random.Random(7)
+    values = [ int(rng.paretovariate(0.8)) for _ in range(5000) ]
+    sketch = sketch_of(values)
+    for q in [0.0, 0.5, 0.9, 0.99, 1.0]:
+        exact = sorted(values)[max(1, int(pv.np.ceil(q * len(values)))) - 1]
+        lo, hi = pv.sketch_bin_range(pv.sketch_bin(exact))
+        estimate = pv.sketch_quantile(sketch, q)
+        assert lo <= estimate <= hi
+        assert min(values) <= estimate <= max(values)
+    # the .perf.short.json list form gives the same answer
+    listed = dict(sketch, hist=sorted(map(list, sketch['hist'].items())))
+    assert pv.sketch_quantile(listed, 0.9) == pv.sketch_quantile(sketch, 0.9)
+    assert pv.sketch_quantile(sketch_of([1000]), 0.5) == 1000
+    assert pv.sketch_quantile(pv.new_sketch(), 0.5) is None
+
+# the flattened summary carries one sketch per field, counting every entry
+def test_perf_log_sketches():
+    for log in perf_logs_by_line('\n'.join(PERF_LOG_LINES).encode('utf-8')):
+        for field in pv.SKETCH_FIELDS:
+            sketch = log[field + '_sketch']
+            assert sum(n for _, n in sketch['hist']) == log['entry']
+            assert sketch['min'] <= log[field + '_sum'] / log['entry'] <= sketch['max']
+
+###############################################################################
+# incremental perf log summaries
+
+# appending a gzip member resumes from the recorded offset and matches a full rebuild;
+# an untouched log is reused as is, and a rewritten one is rebuilt
+def test_update_perf_summary(tmp_path, capsys, monkeypatch):
+    rng = random.Random(8)
+    head, tail = random_perf_log(rng, 3000), random_perf_log(rng, 2000)
+    log_path, summary_path = str(tmp_path / 't.perf.log.gz'), str(tmp_path / 't.perf.short.json')
+    full_log_path, full_summary_path = str(tmp_path / 'full.perf.log.gz'), str(tmp_path / 'full.perf.short.json')
+
+    write_perf_log(log_path, head)
+    assert pv.update_perf_summary(summary_path, log_path) == pv.update_perf_summary(full_summary_path, log_path)
+    assert pv.read_perf_summary(summary_path)['source']['offset'] == len(head)
+    assert capsys.readouterr().out == ''
+
+    with gzip.open(log_path, 'ab') as f:
+        f.write(tail)
+    resumed = pv.update_perf_summary(summary_path, log_path, jobs=3)
+    assert 'grew by' in capsys.readouterr().out
+    write_perf_log(full_log_path, head + tail)
+    assert resumed == pv.update_perf_summary(full_summary_path, full_log_path)
+    assert pv.read_perf_summary(summary_path)['perfLogs'] == pv.read_perf_summary(full_summary_path)['perfLogs']
+    assert pv.read_perf_summary(summary_path)['source']['offset'] == len(head + tail)
+
+    def no_ingest(*args, **kwargs):
+        raise AssertionError('fresh summary was re-parsed')
+    with monkeypatch.context() as m:
+        m.setattr(pv, 'ingest_perf_log', no_ingest)
+        assert pv.update_perf_summary(summary_path, log_path) == resumed
+        # without the log, the summary is all there is
+        assert pv.update_perf_summary(summary_path, str(tmp_path / 'missing.perf.log.gz')) == resumed
+
+    write_perf_log(log_path, tail)
+    assert pv.update_perf_summary(summary_path, log_path) == pv.update_perf_summary(str(tmp_path / 'tail.perf.short.json'), log_path)
+    assert 'out of date' in capsys.readouterr().out
+
+    # a pre-schema summary (bare list) is rebuilt with a source
+    with open(summary_path, 'w') as f:
+        json.dump(resumed, f)
+    pv.update_perf_summary(summary_path, log_path)
+    assert pv.read_perf_summary(summary_path)['schema'] == pv.PERF_SUMMARY_SCHEMA
+
+###############################################################################
+# sampled perf log estimates
+###############################################################################
+def test_sample_fraction_bounds():
+    assert pv.sample_fraction('0.25') == 0.25 and pv.sample_fraction('1') == 1.0
+    for text in ['0', '-0.5', '1.5']:
+        with pytest.raises(argparse.ArgumentTypeError):
+            pv.sample_fraction(text)
+    with pytest.raises(ValueError):
+        pv.sample_perf_log('unused.perf.log.gz', 0)
+
+# a caller seen in one sampled block has zero residuals, its ratio interval is unknown
+def test_sample_ratio_single_block(tmp_path):
+    lines = [ '0,{},1,0,t/p.h:1:1,_Z1av,t/f.h:1:1,_Z1fv'.format(tc) for tc in [10, 20, 30, 40] ]
+    lines.insert(2, '0,7,1,0,t/p.h:2:1,_Z1bv,t/f.h:2:1,_Z1fv')
+    path = str(tmp_path / 'test.perf.log.gz')
+    with gzip.open(path, 'wt') as f:
+        f.write('\n'.join(lines) + '\n')
+    perfLogs, nsampled, nblocks = pv.sample_perf_log(path, 1.0, chunk_size=1)
+    assert nsampled == nblocks == 5
+    sample = dict( (log['src_caller'], log['sample']) for log in perfLogs )
+    assert sample['_Z1bv']['tripcount_mean'] == [7.0, float('inf')]
+    assert sample['_Z1av']['tripcount_mean'][0] == 25.0
+    assert sample['_Z1av']['tripcount_mean'][1] < float('inf')
+
+###############################################################################
+# profile-weighted worklist
+###############################################################################
+# the committed wordCounts -test summary predates src_caller: -A must still write
+# the worklist, in the static order, with a warning
+def test_analysis_with_legacy_profile_summary(tmp_path, capsys):
+    cp, test = tmp_path / 'cp', tmp_path / 'test'
+    cp.mkdir()
+    test.mkdir()
+    for ext in ['cg', 'cilkfor', 'instr', 'scc']:
+        shutil.copy(os.path.join(HERE, 'wordCounts-cp/histogram/wordCounts.{}.json'.format(ext)), str(cp))
+    shutil.copy(os.path.join(HERE, 'wordCounts-test/histogram/wordCounts.perf.short.json'), str(test))
+
+    pv.compileAnalysisAndInstrumentResults(analysis_args(), workdir=str(cp), test='wordCounts', profile_workdir=str(test))
+
+    assert '<!> skipped 4 of 4 records' in capsys.readouterr().out
+    worklist = json.load(open(str(cp / 'wordCounts.worklist.json')))
+    combined = json.load(open(str(cp / 'wordCounts.instr.cilkfor.json')))
+    assert [ item['ID'] for item in worklist ] == [ js['ID'] for js in combined if js['prr'] in ['defef', 'defdac'] ]
+    assert all( not item['profile'] for item in worklist )
+
+def perf_record(src_caller, line, entry, tripcount, granularity):
+    return {'version': 0, 'src_caller': src_caller, 'src_locs': ['t-test/d/parlay/primitives.h:{}:5'.format(line)],
+            'inline_callers': [], 'inline_locs': [], 'entry': entry, 'ef_entry': entry, 'dac_entry': 0,
+            'tripcount_sum': entry * tripcount, 'granularity_sum': entry * granularity, 'depth_sum': 0}
+
+def worklist_item(ID, line):
+    return {'ID': ID, 'prr': 'defef', 'caller_DAC': None,
+            'caller_EF': [{'mangled_name': '_Z6callerv', 'file': 't-cp/d/parlay/primitives.h', 'ln': line}]}
+
+def ranked_ids(worklist, perfLogs):
+    profile = pv.ProfileIndex(perfLogs, [ js['ID'] for js in worklist ])
+    return [ item['ID'] for item in pv.rank_worklist(worklist, profile, pv.load_static_tables([], 'none')) ]
+
+# default granularity 0 must not make a hot loop look cold
+def test_rank_worklist_default_granularity():
+    worklist = [ worklist_item('_Z4coldv', 10), worklist_item('_Z3hotv', 20), worklist_item('_Z9unmatchedv', 30) ]
+    perfLogs = [ perf_record('_Z4coldv', 10, 3, 10, 8), perf_record('_Z3hotv', 20, 3, 38000, 0) ]
+    assert ranked_ids(worklist, perfLogs) == ['_Z3hotv', '_Z4coldv', '_Z9unmatchedv']
+
+# a grain above the tripcount must not inflate a single-iteration loop
+def test_rank_worklist_grain_above_tripcount():
+    worklist = [ worklist_item('_Z4tinyv', 10), worklist_item('_Z4busyv', 20) ]
+    perfLogs = [ perf_record('_Z4tinyv', 10, 100, 1, 8193), perf_record('_Z4busyv', 20, 100, 1000, 64) ]
+    assert ranked_ids(worklist, perfLogs) == ['_Z4busyv', '_Z4tinyv']
+
+# same entries and tripcounts: the coarser grain costs more
+def test_rank_worklist_granularity():
+    worklist = [ worklist_item('_Z4finev', 10), worklist_item('_Z6coarsev', 20) ]
+    perfLogs = [ perf_record('_Z4finev', 10, 50, 4096, 1), perf_record('_Z6coarsev', 20, 50, 4096, 512) ]
+    assert ranked_ids(worklist, perfLogs) == ['_Z6coarsev', '_Z4finev']
+
+# a callsite list of null must not stop the worklist from being written
+def test_analysis_null_callsites(tmp_path):
+    cp = tmp_path / 'cp'
+    cp.mkdir()
+    for ext in ['cg', 'cilkfor', 'instr', 'scc']:
+        shutil.copy(os.path.join(HERE, 'wordCounts-cp/histogram/wordCounts.{}.json'.format(ext)), str(cp))
+    path = str(cp / 'wordCounts.instr.json')
+    instr = json.load(open(path))
+    for js in instr:
+        js['caller_EF'] = js['caller_DAC'] = None
+    json.dump(instr, open(path, 'w'))
+    pv.compileAnalysisAndInstrumentResults(analysis_args(), workdir=str(cp), test='wordCounts')
+    assert os.path.exists(str(cp / 'wordCounts.worklist.txt'))
+
+# profiled items come first even when their cost is 0
+def test_rank_worklist_profiled_first():
+    worklist = [ worklist_item('_Z9unmatchedv', 30), worklist_item('_Z4zerov', 10) ]
+    perfLogs = [ perf_record('_Z4zerov', 10, 2, 0, 0) ]
+    assert ranked_ids(worklist, perfLogs) == ['_Z4zerov', '_Z9unmatchedv']
+
+###############################################################################
+# grain recommendations
+###############################################################################
+def sketched_record(src_caller, version, tripcounts, depths):
+    record = perf_record(src_caller, 1, len(tripcounts), 0, 0)
+    record.update(version=version, tripcount_sum=float(sum(tripcounts)), depth_sum=float(sum(depths)),
+                  tripcount_sketch=sketch_of(tripcounts), depth_sketch=sketch_of(depths), granularity_sketch=sketch_of([0] * len(tripcounts)))
+    return record
+
+# a wide top-level loop is split, binary splitting wins over forking every chunk,
+# and the chosen pair is the cheapest grain of the model
+def test_recommend_grain_wide_loop():
+    rec = pv.recommend_grain(sketched_record('_Z4widev', 0, [1 << 20] * 4, [0] * 4), 32, 50.0)
+    assert rec['mode'] == 'dac' and 1 < rec['granularity'] < 1 << 20
+    assert rec['time'] == rec['dac_time'] < rec['ef_time']
+    n, g, s = float(1 << 20), float(rec['granularity']), 50.0
+    assert rec['time'] == pytest.approx((n + 2 * s * pv.np.ceil(n / g)) / 32 + g + s * pv.np.log2(pv.np.ceil(n / g)))
+    for grain in [g / 2, g * 2]:
+        assert pv.expected_loop_time(pv.np.array([n]), pv.np.ones(1), pv.np.zeros(1), pv.np.ones(1), pv.np.array([grain]), 32, s, True)[0] > rec['time']
+    assert rec['current_time'] is None
+
+# the deeper a loop is nested into a dac recursion, the fewer workers it has and
+# the coarser its grain; past log2(workers) it runs on one, where forking every
+# chunk costs less than splitting: n + 2s*ceil(n/g) + g at g = 512
+def test_recommend_grain_nested_loop():
+    recs = [ pv.recommend_grain(sketched_record('_Z6nestedv', 0, [5000] * 4, [depth] * 4), 32, 50.0) for depth in [0, 2, 4, 6] ]
+    assert [ rec['granularity'] for rec in recs ] == [128, 256, 512, 512]
+    assert [ rec['mode'] for rec in recs ] == ['dac', 'dac', 'dac', 'ef']
+    rec = recs[-1]
+    assert rec['time'] == 5000 + 2 * 50 * 10 + 512
+    # without sketches the averages stand in for the distributions
+    record = perf_record('_Z6nestedv', 1, 4, 5000, 64)
+    record['depth_sum'] = 24.0
+    assert pv.recommend_grain(record, 32, 50.0)['granularity'] == rec['granularity']
+    assert pv.recommend_grain(record, 32, 50.0)['current_granularity'] == 64
+
+# versions of a src_caller are pooled (sketches merged), never-entered ones dropped
+def test_recommend_grains(tmp_path):
+    perfLogs = [ sketched_record('_Z1av', 0, [100] * 3, [0] * 3), sketched_record('_Z1bv', 0, [1 << 16] * 2, [0] * 2),
+                 sketched_record('_Z1bv', 2, [1 << 16] * 5, [0] * 5), sketched_record('_Z1cv', 0, [], []) ]
+    recs = pv.recommend_grains(perfLogs, 32, 50.0)
+    assert [ (rec['src_caller'], rec['versions'], rec['entry']) for rec in recs ] == [('_Z1bv', [0, 2], 7), ('_Z1av', [0], 3)]
+    assert recs[0]['granularity'] == pv.recommend_grain(sketched_record('_Z1bv', 0, [1 << 16] * 7, [0] * 7), 32, 50.0)['granularity']
+
+    path = str(tmp_path / 't.grain.h')
+    pv.write_grain_header(path, recs, 't.perf.short.json', 32, 50.0)
+    with open(path) as f:
+        header = f.read()
+    assert '#pragma once' in header and 'from t.perf.short.json' in header
+    assert '  {{"_Z1bv", {}, {}}},\n'.format(recs[0]['granularity'], 'true' if recs[0]['mode'] == 'dac' else 'false') in header
+    assert '  {{"_Z1av", {}, '.format(recs[1]['granularity']) in header
+    assert 'inline constexpr size_t size = 2;' in header
+
+###############################################################################
+# profile diff
+###############################################################################
+def diff_record(version, src_caller, sites, entry):
+    return {'version': version, 'src_caller': src_caller, 'src_locs': [], 'inline_callers': [],
+            'inline_locs': [ 't-cp/d/parlay/{}:9'.format(site) for site in sites ], 'entry': entry,
+            'ef_entry': entry if version == 1 else 0, 'dac_entry': entry if version == 2 else 0,
+            'tripcount_sum': 4.0 * entry, 'granularity_sum': 0.0, 'depth_sum': 0.0}
+
+# a loop is matched across versions by its body and all its call sites; the same
+# body at another set of call sites is a different loop
+def test_diff_perf_logs_matching(monkeypatch):
+    monkeypatch.setattr(pv, 'demangle', lambda names: dict( (name, name) for name in names ))
+    body = 'void parlay::parallel_for{}<f()::{{lambda(unsigned long)#1}}>(unsigned long, unsigned long, f()::{{lambda(unsigned long)#1}}, long, bool)'
+    perfLogs_a = [ diff_record(0, body.format(''), ['x.h:1', 'y.h:2'], 10), diff_record(0, body.format(''), ['x.h:1'], 5),
+                   diff_record(0, '_Z4gonev', ['z.h:3'], 7) ]
+    perfLogs_b = [ diff_record(1, body.format('_ef'), ['y.h:2', 'x.h:1'], 10), diff_record(0, body.format(''), ['x.h:1'], 8),
+                   diff_record(0, '_Z3newv', ['z.h:3'], 2) ]
+    diffs = dict( ((diff['loop'], diff['callsite']), diff) for diff in pv.diff_perf_logs(perfLogs_a, perfLogs_b) )
+    loop = 'f()::{lambda(unsigned long)#1}'
+    assert sorted( (k, diff['status'], diff['entry_delta']) for k, diff in diffs.items() ) == [
+        (('_Z3newv', 'parlay/z.h:3'), 'added', 2), (('_Z4gonev', 'parlay/z.h:3'), 'removed', -7),
+        ((loop, 'parlay/x.h:1'), 'matched', 3), ((loop, 'parlay/x.h:1 parlay/y.h:2'), 'moved', 0)]
+    assert diffs[(loop, 'parlay/x.h:1 parlay/y.h:2')]['b']['version_entry'] == {'1': 10}
+
+###############################################################################
+# parlaytime / perf stat logs
+###############################################################################
+# what the split("\n\n") / split('== ') parsers made of a single-round log
+def parlaytime_rows_by_block(text):
+    rows = []
+    for block in text.split('\n\n'):
+        lines = block.split('\n')
+        header = [ ln for ln in lines if ln.startswith('== CILK_WORKERS = ') ]
+        if header:
+            times = pv.pd.Series([ float(pv.re.findall(r'\d+.\d+', ln)[0]) for ln in lines if ln.startswith('Parlay time: ') ])
+            rows.append([int(pv.re.findall(r'\d+', header[0])[0]), times.mean(), times.std()])
+    return rows
+
+def icache_rows_by_section(text):
+    rows = []
+    for section in [ sec.strip() for sec in text.split('== ') if sec.strip() ]:
+        misses = int(pv.re.search(r'([\d,]+)\s+icache\.misses:u', section).group(1).replace(',', ''))
+        hits = int(pv.re.search(r'([\d,]+)\s+icache\.hit:u', section).group(1).replace(',', ''))
+        rows.append([int(pv.re.search(r'CILK_WORKERS\s*=\s*(\d+)', section).group(1)), misses, hits, misses / float(misses + hits)])
+    return rows
+
+def test_parlaytime_logs_match_block_parser():
+    paths = [ os.path.join(root, name) for root, _, names in os.walk(HERE) for name in names if name.endswith(('.parlaytime.orig.log', '.parlaytime.test.log')) ]
+    assert paths
+    for path in paths:
+        with open(path) as f:
+            text = f.read()
+        samples = pv.read_parlaytime_samples(text.splitlines())
+        df, r = pv.parlaytime_frame(samples)
+        pv.np.testing.assert_allclose(df.values, parlaytime_rows_by_block(text))
+        assert r == max( len(times) for times in samples.values() )
+
+def test_icache_txt_match_section_parser():
+    paths = [ os.path.join(root, name) for root, _, names in os.walk(os.path.join(HERE, 'data')) for name in names if '.icache.' in name and name.endswith('.txt') ]
+    assert paths
+    for path in paths:
+        with open(path) as f:
+            text = f.read()
+        df = pv.icache_frame(pv.read_perf_stat(text.splitlines()))
+        assert [ [w, int(m), int(h), rate] for w, m, h, rate in df.values.tolist() ] == icache_rows_by_section(text)
+
+# a multi-round log pools samples per worker count, and perf stat counts add up
+def test_multi_round_logs():
+    round_text = '== CILK_WORKERS = 2 ===\nParlay time: 1.5\nParlay time: 2.5\n\n== CILK_WORKERS = 4 ===\nx = 1\nParlay time: 1.0\n\n'
+    samples = pv.read_parlaytime_samples((round_text + round_text.replace('2.5', '3.5')).splitlines())
+    assert dict( (w, list(times)) for w, times in samples.items() ) == {2: [1.5, 2.5, 1.5, 3.5], 4: [1.0, 1.0]}
+    df, r = pv.parlaytime_frame(samples)
+    assert r == 4 and df['avg_parlaytime'].tolist() == [2.25, 1.0]
+    assert pv.parlaytime_frame({}) [1] == 0
+
+    stat_text = ('== CILK_WORKERS = 8 ===\n     1,000      icache.misses:u     (50.00%)\n   <not counted>      icache.hit:u\n'
+                 '     2.5 seconds time elapsed\n\n')
+    stats = pv.read_perf_stat((stat_text + stat_text.replace('50.00', '75.00')).splitlines())
+    assert stats[8]['icache.misses'] == [2000.0, 50.0]
+    assert pv.np.isnan(stats[8]['icache.hit'][0])
+    assert stats[8]['seconds_time_elapsed'] == [5.0, 100.0]
+
+###############################################################################
+# orig vs test statistics
+###############################################################################
+# normal approximation with continuity and tie correction, worked by hand
+def test_mann_whitney_p():
+    a, b = pv.np.array([1.0, 2, 3]), pv.np.array([4.0, 5, 6])
+    # U = 0, var = 9 / 12 * 7, z = 4 / sqrt(5.25)
+    assert pv.mann_whitney_p(a, b) == pytest.approx(0.080856, abs=1e-6)
+    assert pv.mann_whitney_p(b, a) == pv.mann_whitney_p(a, b)
+    # three tied pairs: U = 4.5, var = 30 / 12 * (12 - 18 / 110)
+    assert pv.mann_whitney_p(pv.np.array([1.0, 2, 3, 4, 5]), pv.np.array([3.0, 4, 5, 6, 7, 8])) == pytest.approx(0.066015, abs=1e-6)
+    assert pv.mann_whitney_p(a, a) == 1.0
+    assert pv.mann_whitney_p(pv.np.ones(4), pv.np.ones(3)) == 1.0
+
+def test_bootstrap_speedup():
+    rng = pv.np.random.RandomState(11)
+    orig, test = rng.normal(2.0, 0.1, 30), rng.normal(1.0, 0.05, 30)
+    lo, hi = pv.bootstrap_speedup(orig, test, rng=pv.np.random.RandomState(1))
+    assert lo < orig.mean() / test.mean() < hi
+    assert (lo, hi) == pv.bootstrap_speedup(orig, test, rng=pv.np.random.RandomState(1))
+    # same resamples, narrower interval
+    lo50, hi50 = pv.bootstrap_speedup(orig, test, confidence=0.5, rng=pv.np.random.RandomState(1))
+    assert lo < lo50 < hi50 < hi
+    assert pv.bootstrap_speedup(pv.np.full(5, 3.0), pv.np.full(7, 2.0), rounds=100) == (1.5, 1.5)
+
+# clear wins and losses are flagged, 1% shifts within the noise are not, and
+# outliers are dropped before either
+def test_compare_parlaytime_samples():
+    rng = pv.np.random.RandomState(12)
+    noisy = lambda mean, n=20: list(rng.normal(mean, 0.05 * mean, n))
+    samples_orig = {1: noisy(10.0), 2: noisy(5.0), 4: noisy(2.5) + [25.0], 8: noisy(1.0), 16: noisy(1.0)}
+    samples_test = {1: noisy(8.0), 2: noisy(6.0), 4: noisy(2.5 * 0.99), 8: noisy(1.0, 1), 32: noisy(1.0)}
+    df = pv.compare_parlaytime_samples(samples_orig, samples_test, seed=0)
+    assert df['cilk_workers'].tolist() == [1, 2, 4, 8]
+    assert df['verdict'].tolist() == ['win', 'loss', 'noise', 'noise']
+    assert df['outliers_orig'].tolist() == [0, 0, 1, 0] and df['n_orig'].tolist() == [20, 20, 20, 20]
+    assert pv.np.isnan(df['speedup'][3]) and df['n_test'][3] == 1
+    assert (df['speedup_lo'] < df['speedup'])[:3].all() and (df['speedup'] < df['speedup_hi'])[:3].all()
+    assert df.equals(pv.compare_parlaytime_samples(samples_orig, samples_test, seed=0))
+
+###############################################################################
+# adaptive performance experiment
+###############################################################################
+# perf stat counts whole processes, warmup included: builds that stop after a
+# different number of runs must still report the same counters per round
+def test_adaptive_experiment_perf_stat_per_round(monkeypatch):
+    def fake_process(exe, test_data, cilk_workers, rounds, cpus=None, perf_events=None):
+        times = [1.0] * rounds if exe == 'steady' else [ 1.0 + 0.5 * (i % 2) for i in range(rounds) ]
+        return times, {cilk_workers: {'icache.misses': [1000.0 * rounds, 100.0]}}
+    monkeypatch.setattr(pv, 'run_benchmark_process', fake_process)
+    samples, perf_stats, configs = pv.run_adaptive_experiment({'orig': 'steady', 'test': 'noisy'}, None, [4], warmup=2, batch=5,
+                                                              min_runs=5, max_runs=20, pin=False)
+    assert len(samples['orig'][4]) == 5 and len(samples['test'][4]) == 20
+    assert perf_stats['orig'][4]['icache.misses'][0] == perf_stats['test'][4]['icache.misses'][0] == 1000.0
+
+# per-round counters are fractional and <not counted> ones NaN
+def test_icache_frame_missing_counter():
+    df = pv.icache_frame({4: {'icache.misses': [1234.6, 100.0], 'icache.hit': [float('nan'), 100.0]},
+                          8: {'icache.misses': [10.0, 100.0], 'icache.hit': [30.0, 100.0]}})
+    assert df['i$_miss'].tolist() == [1235, 10]
+    assert df['i$_hit'].isna().tolist() == [True, False] and df['i$_hit'][1] == 30
+    assert df['i$_miss_rate'].isna()[0] and df['i$_miss_rate'][1] == 0.25
+
+###############################################################################
+# results store
+###############################################################################
+# a <not counted> counter (empty cell of the icache csv) is stored as NULL
+def test_store_ingest_icache_missing_counter(tmp_path):
+    test_dir = tmp_path / 'perf' / 'wordCounts'
+    test_dir.mkdir(parents=True)
+    path = test_dir / 'exp1.ece3.r5.icache.csv'
+    path.write_text('cilk_workers,i$_miss_per_round_orig,i$_hit_per_round_orig,i$_miss_rate_orig,'
+                    'i$_miss_per_round_test,i$_hit_per_round_test,i$_miss_rate_test\n'
+                    '1,100,,,80,920,0.08\n')
+    conn = pv.open_store(':memory:')
+    assert pv.store_ingest_csv(conn, str(path))
+    rows = conn.execute('SELECT build, icache_misses, icache_hits, icache_miss_rate, unit FROM icache ORDER BY build').fetchall()
+    assert rows == [('orig', 100, None, None, 'round'), ('test', 80, 920, 0.08, 'round')]
+
+# older icache csvs hold per-process totals; a store from before units re-ingests them
+def test_store_icache_units(tmp_path):
+    test_dir = tmp_path / 'perf' / 'wordCounts'
+    test_dir.mkdir(parents=True)
+    path = test_dir / 'exp0.ece3.r20.icache.csv'
+    path.write_text('cilk_workers,i$_miss_orig,i$_hit_orig,i$_miss_rate_orig,i$_miss_test,i$_hit_test,i$_miss_rate_test\n'
+                    '1.0,63926721.0,18577776205.0,0.0034,58916154.0,31041591329.0,0.0019\n')
+    store = str(tmp_path / 'results.sqlite')
+    conn = sqlite3.connect(store)
+    conn.executescript(pv.STORE_SCHEMA.replace(', unit TEXT', ''))
+    conn.execute("INSERT INTO icache VALUES ('wordCounts', 'exp0', 3, 'orig', 1, 1, 1, 0.5, ?)", (str(path),))
+    conn.execute('INSERT INTO sources VALUES (?, 0, 0)', (str(path),))
+    conn.commit()
+    conn.close()
+    conn = pv.open_store(store)
+    assert pv.store_ingest_all(conn, str(tmp_path)) == (1, 1)
+    rows = conn.execute('SELECT build, icache_misses, unit FROM icache ORDER BY build').fetchall()
+    assert rows == [('orig', 63926721, 'process'), ('test', 58916154, 'process')]
+
+PARLAY_CSV = ('cilk_workers,avg_parlaytime_orig,std_parlaytime_orig,avg_parlaytime_test,std_parlaytime_test\n'
+              '1.0,2.0,0.1,1.0,0.1\n4.0,0.8,0.1,0.4,0.1\n')
+
+# rows come back as written, unchanged files are skipped and changed ones replaced
+def test_store_round_trip(tmp_path):
+    test_dir = tmp_path / 'perf' / 'wordCounts'
+    test_dir.mkdir(parents=True)
+    path = test_dir / 'exp1.ece3.r5.perf.csv'
+    path.write_text(PARLAY_CSV)
+    conn = pv.open_store(':memory:')
+    assert pv.store_ingest_all(conn, str(tmp_path)) == (1, 1)
+    df = pv.store_speedup(conn, 'wordCounts')
+    assert df[['experiment_id', 'ece', 'cilk_workers', 'repeats', 'speedup']].values.tolist() == [['exp1', 3, 1, 5, 2.0], ['exp1', 3, 4, 5, 2.0]]
+    assert pv.store_ingest_all(conn, str(tmp_path)) == (0, 1)
+    path.write_text(PARLAY_CSV.replace('0.8,0.1,0.4', '0.9,0.1,0.3'))
+    os.utime(str(path), ns=(1, 1))
+    assert pv.store_ingest_all(conn, str(tmp_path)) == (1, 1)
+    assert pv.store_speedup(conn, 'wordCounts')['speedup'].tolist() == [2.0, 3.0]
+    assert pv.store_speedup(conn, 'wordCounts', ece=4).empty
+
+# top-level copies of a run are ingested once: the geomean must not count it twice
+def test_store_legacy_duplicates(tmp_path, capsys):
+    test_dir = tmp_path / 'perf' / 'wordCounts'
+    test_dir.mkdir(parents=True)
+    (test_dir / 'exp1.ece3.r5.perf.csv').write_text(PARLAY_CSV)
+    legacy = PARLAY_CSV.replace(',0.1', '').replace(',std_parlaytime_orig', '').replace(',std_parlaytime_test', '')
+    (tmp_path / 'wordCounts.perf.csv').write_text(legacy)
+    (tmp_path / 'wordCounts.perf-1-16-32.csv').write_text(legacy)
+    other = legacy.replace('0.8,0.4', '0.8,0.2')
+    (tmp_path / 'classify.perf.csv').write_text(other)
+    (tmp_path / 'classify.perf.1-16-32.csv').write_text(other)
+    conn = pv.open_store(':memory:')
+    assert pv.store_ingest_all(conn, str(tmp_path)) == (2, 5)
+    out = capsys.readouterr().out
+    assert 'wordCounts.perf.csv: same' in out and 'wordCounts.perf-1-16-32.csv: same' in out and 'classify.perf.csv: same' in out
+    assert pv.store_speedup(conn, 'wordCounts')['experiment_id'].tolist() == ['exp1', 'exp1']
+    assert pv.store_speedup(conn, 'classify')['experiment_id'].tolist() == ['perf.1-16-32', 'perf.1-16-32']
+
+###############################################################################
+# scalability report
+###############################################################################
+# Amdahl timings T(p) = T(1) * (f + (1 - f) / p), whose Karp-Flatt fraction is f
+def amdahl_csv(workers, t1_orig, f_orig, t1_test, f_test):
+    rows = [ '{},{},0.1,{},0.1'.format(p, t1_orig * (f_orig + (1 - f_orig) / p), t1_test * (f_test + (1 - f_test) / p)) for p in workers ]
+    return PARLAY_CSV.splitlines()[0] + '\n' + '\n'.join(rows) + '\n'
+
+def test_scaling_metrics(tmp_path):
+    workers = [1, 2, 4, 8, 16, 32]
+    test_dir = tmp_path / 'perf' / 'wordCounts'
+    test_dir.mkdir(parents=True)
+    (test_dir / 'exp1.ece3.r5.perf.csv').write_text(amdahl_csv(workers, 10.0, 0.1, 8.0, 0.05))
+    (test_dir / 'exp1.ece3.r5.icache.csv').write_text(
+        'cilk_workers,i$_miss_per_round_orig,i$_hit_per_round_orig,i$_miss_rate_orig,'
+        'i$_miss_per_round_test,i$_hit_per_round_test,i$_miss_rate_test\n' +
+        ''.join( '{},{},{},{},,,\n'.format(p, 10 * p, 1000 - 10 * p, p / 100.0) for p in workers ))
+    conn = pv.open_store(':memory:')
+    pv.store_ingest_all(conn, str(tmp_path))
+    runs = pv.store_scaling_runs(conn, 'wordCounts')
+    assert len(runs) == 12 and pv.store_scaling_runs(conn, 'wordCounts', ece=4).empty
+
+    run = pv.scaling_metrics(runs)
+    orig, test = run[run['build'] == 'orig'], run[run['build'] == 'test']
+    assert orig['speedup_self'].tolist() == pytest.approx([ 1 / (0.1 + 0.9 / p) for p in workers ])
+    assert test['speedup_orig'].tolist() == pytest.approx([ 10.0 / (8.0 * (0.05 + 0.95 / p)) for p in workers ])
+    assert test['efficiency'].tolist() == pytest.approx([ 1 / (0.05 + 0.95 / p) / p for p in workers ])
+    assert pv.np.isnan(orig['karp_flatt'].iloc[0]) and orig['karp_flatt'].iloc[1:].tolist() == pytest.approx([0.1] * 5)
+    assert test['karp_flatt'].iloc[1:].tolist() == pytest.approx([0.05] * 5)
+
+    # S(16)/S(8) = 1.36 < 16/8 ** 0.5 for orig; test keeps up until 32
+    assert pv.flattening_point(orig) == 16 and pv.flattening_point(test) == 32
+    assert pv.flattening_point(orig.iloc[:3]) is None
+    # miss rate rises with workers as efficiency falls; test has no icache counts
+    assert pv.column_corr(orig, 'icache_miss_rate', 'efficiency') < -0.8
+    assert pv.np.isnan(pv.column_corr(test, 'icache_miss_rate', 'efficiency'))
+
+###############################################################################
+# static vs instrumentation consistency
+###############################################################################
+def instr_record(ID, ef, dac, tag=None):
+    return {'ID': ID, 'ef': ef, 'dac': dac, 'tag': tag}
+
+# every inconsistency is reported at once instead of stopping at the first
+def test_join_static_instr_classes():
+    static = [ {'ID': 'a', 'prr': 'defef'}, {'ID': 'b', 'prr': 'defdac'}, {'ID': 'c', 'prr': 'both'},
+               {'ID': 'd', 'prr': 'untouched'} ]
+    instr = [ instr_record('a', 1, 2), instr_record('b', 3, 0), instr_record('c', 1, 0), instr_record('x', 1, 0) ]
+    combined, report = pv.join_static_instr(static, instr)
+    assert [ js['ID'] for js in combined ] == ['a', 'b', 'c']
+    assert report['classes']['mismatch-defef-dac'] == ['a'] and report['classes']['mismatch-defdac-ef'] == ['b']
+    assert report['classes']['overconservative-ef'] == ['c'] and report['classes']['instr-only'] == ['x']
+    assert report['classes']['static-only'] == ['d'] and report['errors'] == 3
+
+# a duplicated ID keeps its first place and its last entry, and is reported
+def test_join_static_instr_duplicates_last_wins():
+    static = [ {'ID': 'a', 'prr': 'defef'}, {'ID': 'b', 'prr': 'both'}, {'ID': 'a', 'prr': 'defdac'} ]
+    instr = [ instr_record('a', 0, 1, 'first'), instr_record('b', 1, 1), instr_record('a', 0, 2, 'last') ]
+    combined, report = pv.join_static_instr(static, instr)
+    assert [ (js['ID'], js['prr'], js['tag']) for js in combined ] == [('a', 'defdac', 'last'), ('b', 'both', None)]
+    assert report['static'] == {'defdac': 1, 'both': 1} and report['classes']['accurate-dac'] == ['a']
+    assert report['duplicates'] == {'static': ['a'], 'instr': ['a']} and report['errors'] == 2
+
+###############################################################################
+# IR index
+###############################################################################
+LL_TEXT = '''define dso_local void @_Z1fv() #0 {
+entry:
+  br label %for.body
+
+for.body:
+  ret void
+}
+
+define dso_local void @_Z1gv() #0 {
+entry:
+  ret void
+}
+'''
+
+# the last block stops before the function's closing brace
+def test_block_ir_stops_before_closing_brace(tmp_path):
+    path = tmp_path / 'test.ll'
+    path.write_text(LL_TEXT)
+    index = pv.IRIndex(str(path))
+    f, g = index.lookup('_Z1fv'), index.lookup('_Z1gv')
+    assert index.block_ir(f, 'entry') == 'entry:\n  br label %for.body\n\n'
+    assert index.block_ir(f, 'for.body') == 'for.body:\n  ret void\n'
+    assert index.block_ir(g, 'entry') == 'entry:\n  ret void\n'
+    assert index.function_ir(f).endswith('  ret void\n}\n')
+
+# the .ll and its tables live in a variant dir (wordCounts-cp/histogramStar),
+# not in BENCHMARKS' dir (histogram)
+def test_ll_path_default(monkeypatch, capsys):
+    monkeypatch.setattr(pv, 'basedir', HERE)
+    path = pv.ll_path(argparse.Namespace(ll=None), 'wordCounts')
+    assert path == os.path.join(HERE, 'wordCounts-cp', 'histogramStar', 'wcLink-pr.ll')
+    assert 'wordCounts-cp/serial/wcLink-pr.ll' in capsys.readouterr().out
+    assert pv.ll_path(argparse.Namespace(ll='x.ll'), 'wordCounts') == 'x.ll'
+
+# pfor.cond/pfor.body of the pre-lowering tables are lowered away, not missing;
+# the .dbg.csv rows are checked too
+def test_check_ir_tables_lowered_blocks():
+    workdir = os.path.join(HERE, 'wordCounts-cp', 'serial')
+    report = pv.check_ir_tables(pv.IRIndex.load(os.path.join(workdir, 'wcLink-pr.ll'), cache=False), workdir)
+    assert all( miss['reason'] == 'no define' for kind in ['block', 'loop'] for miss in report[kind]['missing'] )
+    assert any( low['label'].startswith('pfor.') for low in report['loop']['lowered'] )
+    assert report['dbg']['rows'] > 0 and len(report['dbg']['missing']) + len(report['dbg']['no_dbg']) <= report['dbg']['rows']
+
+###############################################################################
+# resident query server
+###############################################################################
+def query_line(f, request):
+    f.write((json.dumps(request) + '\n').encode())
+    f.flush()
+    return json.loads(f.readline())
+
+# a client that keeps its connection open doesn't lock the others out
+def test_serve_concurrent_clients(tmp_path, monkeypatch):
+    import socket
+    import threading
+    monkeypatch.setattr(pv, 'basedir', HERE)
+    args = argparse.Namespace(k=3, cache=False, socket=str(tmp_path / 's.sock'), jobs=1)
+    server = threading.Thread(target=pv.serveQueries, args=(args, 'wordCounts'))
+    server.start()
+    try:
+        for _ in range(100):
+            if os.path.exists(args.socket):
+                break
+            server.join(0.05)
+        idle, busy = socket.socket(socket.AF_UNIX), socket.socket(socket.AF_UNIX)
+        idle.connect(args.socket)
+        busy.connect(args.socket)
+        busy.settimeout(30)
+        with idle, busy, idle.makefile('rwb') as f_idle, busy.makefile('rwb') as f_busy:
+            ID = json.load(open(os.path.join(HERE, 'wordCounts-cp/histogram/wordCounts.cilkfor.json')))[0]['ID']
+            response = query_line(f_busy, {'query': 'paths', 'args': [ID], 'k': 2})
+            assert response['ok'] and response['result'] is not None
+            assert query_line(f_idle, {'query': 'callers', 'args': ['_Z10wordCountsRKN6parlay8sequenceIcNS_9allocatorIcEELb1EEEb']})['ok']
+            assert query_line(f_busy, {'query': 'stop'})['ok']
+    finally:
+        server.join(10)
+    assert not server.is_alive() and not os.path.exists(args.socket)
+
+###############################################################################
+# benchmark driver
+###############################################################################
+# every registered benchmark has its orig and substituted trees in the repo
+def test_benchmark_registry(monkeypatch):
+    monkeypatch.setattr(pv, 'basedir', HERE)
+    assert list(pv.BENCHMARKS) == ['delaunayTriangulation', 'wordCounts', 'classify']
+    for test, bench in pv.BENCHMARKS.items():
+        assert set(bench) == {'dir', 'exe', 'test_data', 'major_files', 'major_funcs'}
+        for tree in ['cp', 'test']:
+            assert os.path.isdir(pv.benchmark_dir(test, tree))
+
+# -T all: a test that raises or exits doesn't stop the others, each gets its own
+# log, and the summary records every (test, mode)
+def test_run_all_benchmarks_isolates_failures(tmp_path, monkeypatch, capsys):
+    def fake_run(args, test=None):
+        print('{} analysis={} run={}'.format(test, args.analysis, args.run))
+        if test == 'wordCounts':
+            raise ValueError('no ' + test)
+        if test == 'classify' and args.analysis:
+            exit(1)
+    monkeypatch.setattr(pv, 'basedir', str(tmp_path))
+    monkeypatch.setattr(pv, 'runBenchmark', fake_run)
+    args = argparse.Namespace(analysis=True, run=True, parlaytime=False, profile=False, experiment_id=None, ece=None)
+    assert not pv.runAllBenchmarks(args, dt='dt')
+
+    with open(str(tmp_path / 'data' / 'all' / 'dt.summary.json')) as f:
+        summary = json.load(f)
+    assert summary['modes'] == ['analysis', 'run']
+    assert [ (res['test'], res['mode'], res['status']) for res in summary['results'] ] == [
+        ('delaunayTriangulation', 'run', 'ok'), ('wordCounts', 'run', 'failed'), ('classify', 'run', 'ok'),
+        ('delaunayTriangulation', 'analysis', 'ok'), ('wordCounts', 'analysis', 'failed'), ('classify', 'analysis', 'failed')]
+    assert summary['results'][4]['error'] == 'ValueError: no wordCounts' and summary['results'][5]['error'] == 'exit(1)'
+    with open(summary['results'][3]['log']) as f:
+        assert f.read() == 'delaunayTriangulation analysis=True run=False\n'
+    with open(summary['results'][4]['log']) as f:
+        assert 'Traceback' in f.read()
+    assert 'ValueError' in capsys.readouterr().out
+
+###############################################################################
+# synthetic inputs
+###############################################################################
+# every src_caller of the synthetic perf log is a function of the -test call
+# graph, so -PROFILE -v unfolds its call history
+def test_synthetic_perf_log_callers_in_call_graph(tmp_path, monkeypatch, capsys):
+    import benchReplacePbbsV2ParallelFor as bench
+    bench.generate(str(tmp_path), callsites=500, records=2000, rounds=2, ncallers=50)
+    test_dir = os.path.join(str(tmp_path), 'synth-test', 'bench')
+    funcs = set( js['func'] for js in json.load(open(os.path.join(test_dir, 'synth-perf.cg.json'))) )
+    with gzip.open(os.path.join(test_dir, 'synth.perf.log.gz'), 'rt') as f:
+        src_callers = set( line.split(',')[5] for line in f )
+    assert src_callers and src_callers <= funcs
+    monkeypatch.setattr(pv, 'basedir', str(tmp_path))
+    pv.interpretProfilingResults(argparse.Namespace(**bench.mode_options(v=True)), workdir=test_dir, test='synth', major_files=[], major_funcs=[])
+    assert '-----> synth-test/bench/src/' in capsys.readouterr().out